@@ -0,0 +1,25 @@
+"""
+Timing statistics shared by the benchmark and load test harnesses
+"""
+
+import statistics
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def timing_summary(samples_seconds, prefix=''):
+    """Mean/p50/p95/max of timing samples in milliseconds"""
+    samples = [sample * 1000 for sample in samples_seconds]
+    return {
+        f"{prefix}mean_ms": round(statistics.fmean(samples), 3) if samples else None,
+        f"{prefix}p50_ms": round(percentile(samples, 0.50), 3) if samples else None,
+        f"{prefix}p95_ms": round(percentile(samples, 0.95), 3) if samples else None,
+        f"{prefix}max_ms": round(max(samples), 3) if samples else None,
+    }
@@ -0,0 +1,207 @@
+"""
+Local MQTT broker stand-in for offline benchmarks
+Implements the MQTT 3.1.1 subset paho uses with the gateway: CONNECT,
+PUBLISH (QoS 0/1, retain), SUBSCRIBE/UNSUBSCRIBE with wildcards, PINGREQ and
+DISCONNECT. Every received publish is recorded with its arrival time.
+"""
+
+import time
+import socket
+import struct
+import threading
+import socketserver
+
+
+def topic_matches(pattern, topic):
+    """MQTT topic filter match with + and # wildcards"""
+    pattern_parts = pattern.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(pattern_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts):
+            return False
+        if part != '+' and part != topic_parts[index]:
+            return False
+    return len(pattern_parts) == len(topic_parts)
+
+
+def _encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        encoded.append(byte)
+        if not length:
+            return bytes(encoded)
+
+
+def _encode_publish(topic, payload, retain=False):
+    topic_bytes = topic.encode('utf-8')
+    body = struct.pack('!H', len(topic_bytes)) + topic_bytes + payload
+    return bytes([0x30 | (1 if retain else 0)]) + _encode_length(len(body)) + body
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    """One connected MQTT client"""
+
+    def _read_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("client closed connection")
+            data += chunk
+        return data
+
+    def _read_packet(self):
+        header = self._read_exact(1)[0]
+        multiplier, length = 1, 0
+        while True:
+            byte = self._read_exact(1)[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        return header, self._read_exact(length) if length else b''
+
+    def send(self, data):
+        with self.send_lock:
+            self.request.sendall(data)
+
+    def handle(self):
+        broker = self.server.broker
+        self.subscriptions = set()
+        self.send_lock = threading.Lock()
+        broker._add_client(self)
+        try:
+            while True:
+                header, body = self._read_packet()
+                packet_type = header >> 4
+                if packet_type == 1:  # CONNECT
+                    self.send(b'\x20\x02\x00\x00')
+                elif packet_type == 3:  # PUBLISH
+                    qos = (header >> 1) & 0x03
+                    retain = bool(header & 0x01)
+                    topic_length = struct.unpack('!H', body[:2])[0]
+                    topic = body[2:2 + topic_length].decode('utf-8')
+                    offset = 2 + topic_length
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        self.send(b'\x40\x02' + packet_id)
+                    broker._route(topic, body[offset:], retain)
+                elif packet_type == 8:  # SUBSCRIBE
+                    packet_id = body[:2]
+                    offset, granted, filters = 2, bytearray(), []
+                    while offset < len(body):
+                        length = struct.unpack('!H', body[offset:offset + 2])[0]
+                        topic_filter = body[offset + 2:offset + 2 + length].decode('utf-8')
+                        offset += 3 + length
+                        filters.append(topic_filter)
+                        granted.append(0)
+                    self.subscriptions.update(filters)
+                    self.send(b'\x90' + _encode_length(2 + len(granted)) + packet_id + bytes(granted))
+                    for topic, payload in broker._retained_matching(filters):
+                        self.send(_encode_publish(topic, payload, retain=True))
+                elif packet_type == 10:  # UNSUBSCRIBE
+                    self.send(b'\xb0\x02' + body[:2])
+                elif packet_type == 12:  # PINGREQ
+                    self.send(b'\xd0\x00')
+                elif packet_type == 14:  # DISCONNECT
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            broker._remove_client(self)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeBroker:
+    """In-process MQTT broker recording every publish"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = _Server((host, port), _ClientHandler)
+        self._server.broker = self
+        self.host, self.port = self._server.server_address
+        self.published = []  # (arrival time, topic, payload bytes)
+        self.retained = {}
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            for client in list(self._clients):
+                try:
+                    client.request.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def _add_client(self, client):
+        with self._lock:
+            self._clients.add(client)
+
+    def _remove_client(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def _retained_matching(self, filters):
+        with self._lock:
+            return [(topic, payload) for topic, payload in self.retained.items()
+                    if any(topic_matches(f, topic) for f in filters)]
+
+    def _route(self, topic, payload, retain=False):
+        with self._condition:
+            self.published.append((time.monotonic(), topic, payload))
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)
+            subscribers = [client for client in self._clients
+                           if any(topic_matches(f, topic) for f in client.subscriptions)]
+            self._condition.notify_all()
+        packet = _encode_publish(topic, payload)
+        for client in subscribers:
+            try:
+                client.send(packet)
+            except OSError:
+                pass
+
+    def publish(self, topic, payload):
+        """Inject a message as if published by another client (e.g. Home Assistant)"""
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self._route(topic, payload)
+
+    def count(self, topic_filter='#'):
+        with self._lock:
+            return sum(1 for _, topic, _ in self.published if topic_matches(topic_filter, topic))
+
+    def wait_for(self, topic_filter, count, timeout=10.0):
+        """Block until `count` publishes matching filter arrived, returns arrival time of the last one"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                matching = [arrived for arrived, topic, _ in self.published if topic_matches(topic_filter, topic)]
+                if len(matching) >= count:
+                    return matching[count - 1]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
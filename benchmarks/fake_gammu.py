@@ -0,0 +1,259 @@
+"""
+Simulated python-gammu module for offline benchmarks
+Provides a StateMachine with configurable per-command latency, inbox size and
+error injection, plus the module level helpers the gateway uses
+(LinkSMS, DecodeSMS, EncodeSMS, GSMNetworks, ERR_* exceptions)
+"""
+
+import sys
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+# Latency (seconds) of each simulated AT operation, roughly a USB GSM stick
+DEFAULT_LATENCY = {
+    "Init": 0.5,
+    "GetSecurityStatus": 0.02,
+    "GetSMSStatus": 0.02,
+    "GetNextSMS": 0.03,
+    "DeleteSMS": 0.04,
+    "SendSMS": 0.8,
+    "GetSignalQuality": 0.02,
+    "GetNetworkInfo": 0.04,
+    "Reset": 1.0,
+}
+
+GSMNetworks = {"230 01": "T-Mobile CZ", "230 02": "O2 CZ", "230 03": "Vodafone CZ"}
+
+LOG_DEBUG = 4
+
+
+class GSMError(Exception):
+    """Base of simulated gammu errors (args[0] is the gammu error dict)"""
+
+
+_ERROR_CODES = {
+    "ERR_TIMEOUT": 14,
+    "ERR_EMPTY": 22,
+    "ERR_UNKNOWN": 27,
+    "ERR_NOSIM": 49,
+    "ERR_GETTING_SMSC": 69,
+    "ERR_DEVICEBUSY": 5,
+    "ERR_INVALIDLOCATION": 24,
+}
+
+for _name, _code in _ERROR_CODES.items():
+    globals()[_name] = type(_name, (GSMError,), {"Code": _code})
+
+
+def make_error(name, where="Simulated"):
+    """Build simulated gammu exception with the usual error dict argument"""
+    cls = globals()[name]
+    return cls({"Text": name, "Where": where, "Code": _ERROR_CODES[name]})
+
+
+class StateMachine:
+    """In-memory modem: inbox on 'SIM', counters per operation"""
+
+    def __init__(self, latency=None, latency_scale=1.0, errors=None, sim_size=50, seed=1):
+        self.latency = dict(DEFAULT_LATENCY if latency is None else latency)
+        self.latency_scale = latency_scale
+        # operation -> (probability, error name)
+        self.errors = dict(errors or {})
+        self.sim_size = sim_size
+        self.calls = {}
+        self.inbox = []  # list of stored SMS dicts ordered by Location
+        self.sent = deque(maxlen=100)  # Last sent messages, bounded for long runs
+        self._next_location = 1
+        self._reference = 0
+        self._random = random.Random(seed)
+        self._port_lock = threading.Lock()  # Serial port: one command at a time
+        self._lock = threading.Lock()  # Guards simulated storage
+
+    def _command(self, name):
+        """Account call, sleep simulated latency and maybe inject error"""
+        with self._port_lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            delay = self.latency.get(name, 0) * self.latency_scale
+            if delay:
+                time.sleep(delay)
+            probability, error_name = self.errors.get(name, (0, None))
+            if probability and self._random.random() < probability:
+                raise make_error(error_name, name)
+
+    # Configuration / init
+    def ReadConfig(self, Section=0, Configuration=None, Filename=None):
+        pass
+
+    def SetDebugFile(self, File, Global=False):
+        pass
+
+    def SetDebugLevel(self, Level):
+        pass
+
+    def Init(self, Replies=3):
+        self._command("Init")
+
+    def Terminate(self):
+        pass
+
+    def GetSecurityStatus(self):
+        self._command("GetSecurityStatus")
+        return None
+
+    def EnterSecurityCode(self, Type, Code, NewPIN=None):
+        pass
+
+    # Status
+    def GetSignalQuality(self):
+        self._command("GetSignalQuality")
+        percent = self._random.randint(40, 90)
+        return {"SignalStrength": -113 + percent * 63 // 100, "SignalPercent": percent, "BitErrorRate": -1}
+
+    def GetNetworkInfo(self):
+        self._command("GetNetworkInfo")
+        return {"NetworkCode": "230 01", "State": "HomeNetwork", "LAC": "1A2B", "CID": "00C0FFEE",
+                "NetworkName": "", "GPRS": "Attached", "PacketLAC": "", "PacketCID": "", "PacketState": ""}
+
+    def GetIMEI(self):
+        return "356789012345678"
+
+    def GetManufacturer(self):
+        return "Simulated"
+
+    def Reset(self, Hard):
+        self._command("Reset")
+
+    # SMS storage
+    def GetSMSStatus(self):
+        self._command("GetSMSStatus")
+        return {"SIMUnRead": sum(1 for sms in self.inbox if sms["State"] == "UnRead"),
+                "SIMUsed": len(self.inbox), "SIMSize": self.sim_size,
+                "PhoneUnRead": 0, "PhoneUsed": 0, "PhoneSize": 0,
+                "TemplatesUsed": 0}
+
+    def GetNextSMS(self, Folder=0, Start=False, Location=None):
+        self._command("GetNextSMS")
+        with self._lock:
+            if Start:
+                candidates = self.inbox
+            else:
+                candidates = [sms for sms in self.inbox if sms["Location"] > Location]
+            if not candidates:
+                raise make_error("ERR_EMPTY", "GetNextSMS")
+            return [dict(candidates[0])]
+
+    def DeleteSMS(self, Folder, Location):
+        self._command("DeleteSMS")
+        with self._lock:
+            before = len(self.inbox)
+            self.inbox = [sms for sms in self.inbox if sms["Location"] != Location]
+            if len(self.inbox) == before:
+                raise make_error("ERR_INVALIDLOCATION", "DeleteSMS")
+
+    def SendSMS(self, Value):
+        self._command("SendSMS")
+        with self._lock:
+            self._reference = (self._reference + 1) % 256
+            self.sent.append(dict(Value))
+            return self._reference
+
+    # Helpers for benchmark scenarios
+    def deliver(self, number, text, state="UnRead", when=None, parts=1, reference=None):
+        """Store incoming SMS on simulated SIM, split into `parts` concatenated parts"""
+        when = when or datetime.now().replace(microsecond=0)
+        chunk = max(1, -(-len(text) // parts))
+        reference = reference if reference is not None else self._random.randint(0, 255)
+        with self._lock:
+            for index in range(parts):
+                udh = {"Type": "NoUDH", "Text": b"", "ID8bit": -1, "ID16bit": -1, "PartNumber": -1, "AllParts": 0}
+                if parts > 1:
+                    udh = {"Type": "ConcatenatedMessages", "Text": b"", "ID8bit": reference, "ID16bit": -1,
+                           "PartNumber": index + 1, "AllParts": parts}
+                self.inbox.append({
+                    "Location": self._next_location,
+                    "Folder": 0,
+                    "Number": number,
+                    "DateTime": when,
+                    "SMSCDateTime": when,
+                    "State": state,
+                    "Text": text[index * chunk:(index + 1) * chunk],
+                    "UDH": udh,
+                    "Type": "Deliver",
+                    "Coding": "Default_No_Compression",
+                    "Class": -1,
+                    "MessageReference": 0,
+                    "DeliveryStatus": 0,
+                })
+                self._next_location += 1
+
+    def populate_inbox(self, count, multipart_every=0, text_length=120):
+        """Fill inbox with `count` messages, every Nth message as 3-part SMS"""
+        start = datetime(2025, 1, 1, 8, 0, 0)
+        for index in range(count):
+            parts = 3 if multipart_every and index % multipart_every == 0 else 1
+            text = (f"Message {index} " * 40)[:text_length * parts]
+            self.deliver(f"+42060000{index % 10000:04d}", text, state="Read",
+                         when=start + timedelta(minutes=index), parts=parts, reference=index % 256)
+
+
+def LinkSMS(Messages, EMS=True):
+    """Group concatenated parts (by sender and UDH reference) like gammu.LinkSMS"""
+    linked = []
+    groups = {}
+    for message in Messages:
+        sms = message[0]
+        udh = sms.get("UDH") or {}
+        if udh.get("AllParts", 0) > 1:
+            key = (sms["Number"], udh.get("ID8bit"), udh.get("ID16bit"), udh.get("AllParts"))
+            if key not in groups:
+                groups[key] = []
+                linked.append(groups[key])
+            groups[key].append(sms)
+        else:
+            linked.append([sms])
+    for group in linked:
+        group.sort(key=lambda sms: (sms.get("UDH") or {}).get("PartNumber", 0))
+    return linked
+
+
+def DecodeSMS(Messages, EMS=True):
+    """Decode multipart message into entries, None for single part SMS"""
+    if len(Messages) < 2:
+        return None
+    return {"Class": -1, "Unicode": False, "Entries": [
+        {"ID": "ConcatenatedTextLong", "Buffer": "".join(sms["Text"] for sms in Messages)}
+    ]}
+
+
+def EncodeSMS(MessageInfo):
+    """Split text into 153/67 character parts like gammu.EncodeSMS"""
+    text = "".join(entry.get("Buffer") or "" for entry in MessageInfo["Entries"])
+    unicode_mode = MessageInfo.get("Unicode", False)
+    single, multi = (70, 67) if unicode_mode else (160, 153)
+    if len(text) <= single:
+        chunks = [text]
+    else:
+        chunks = [text[i:i + multi] for i in range(0, len(text), multi)]
+    reference = random.randint(0, 255)
+    messages = []
+    for index, chunk in enumerate(chunks):
+        udh = {"Type": "NoUDH", "AllParts": 0, "PartNumber": -1}
+        if len(chunks) > 1:
+            udh = {"Type": "ConcatenatedMessages", "ID8bit": reference, "AllParts": len(chunks),
+                   "PartNumber": index + 1}
+        messages.append({"Text": chunk, "UDH": udh, "Class": MessageInfo.get("Class", -1),
+                         "Coding": "Unicode_No_Compression" if unicode_mode else "Default_No_Compression"})
+    return messages
+
+
+def install():
+    """Register this module as `gammu` so gateway modules import the simulation"""
+    module = sys.modules[__name__]
+    sys.modules["gammu"] = module
+    return module
+
+
+__all__ = ["StateMachine", "LinkSMS", "DecodeSMS", "EncodeSMS", "GSMNetworks", "GSMError", "install"]
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of SMS Gammu Gateway on gammu's dummy driver
+Starts run.py as a subprocess in test mode (connection: dummy), with the
+dummy driver keeping SMS as files in a temporary directory, and a local MQTT
+broker stand-in. Then it:
+
+  * drops inbound SMS files into the dummy inbox and waits for each one to be
+    published on MQTT by the monitor loop (latency, lost, duplicated),
+  * drives REST `POST /sms` load with Idempotency-Key retries,
+  * drives MQTT `send` commands with repeated ids,
+
+and reports throughput, latency and correctness as JSON. Exit code is 1 when
+any message was lost or duplicated.
+
+Requires real python-gammu (libgammu ships the dummy driver) and the
+gateway's Python requirements.
+
+Usage:
+    python3 benchmarks/loadtest_dummy.py --inbound 200 --rest 100 --mqtt 100
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import socket
+import shutil
+import argparse
+import importlib.util
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'sms-gammu-gateway')
+sys.path.insert(0, BENCH_DIR)
+
+from fake_broker import FakeBroker  # noqa: E402
+from bench_stats import timing_summary  # noqa: E402
+
+TOPIC_PREFIX = 'loadtest/sms_gateway'
+USERNAME = 'loadtest'
+PASSWORD = 'loadtest'
+INBOX_FOLDER = 1
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _ucs2_hex(text):
+    return text.encode('utf-16-be').hex().upper()
+
+
+def sms_backup_file(number, text, when):
+    """Single inbox SMS in gammu backup format, as read by the dummy driver"""
+    return "\n".join([
+        "; This file format was designed for Gammu and is compatible with Gammu+",
+        "[SMSBackup000]",
+        'SMSC = "+420603052000"',
+        f"SMSCUnicode = {_ucs2_hex('+420603052000')}",
+        f"Sent = {when.strftime('%Y%m%dT%H%M%S')}",
+        "State = UnRead",
+        f'Number = "{number}"',
+        f"NumberUnicode = {_ucs2_hex(number)}",
+        'Name = ""',
+        "NameUnicode = ",
+        f"Text00 = {_ucs2_hex(text)}",
+        "Coding = Default",
+        f"Folder = {INBOX_FOLDER}",
+        f"Length = {len(text)}",
+        "Class = -1",
+        "ReplySMSC = False",
+        "RejectDuplicates = False",
+        "ReplaceMessage = 0",
+        "MessageReference = 0",
+        "",
+    ])
+
+
+class GatewayProcess:
+    """run.py subprocess in dummy-driver test mode"""
+
+    def __init__(self, dummy_dir, broker, http_port, check_interval, log_path):
+        self.dummy_dir = dummy_dir
+        self.http_port = http_port
+        self.log_path = log_path
+        self.options_path = os.path.join(dummy_dir, 'options.json')
+        options = {
+            'device_path': dummy_dir,
+            'connection': 'dummy',
+            'pin': '',
+            'port': http_port,
+            'ssl': False,
+            'username': USERNAME,
+            'password': PASSWORD,
+            'mqtt_enabled': True,
+            'mqtt_host': broker.host,
+            'mqtt_port': broker.port,
+            'mqtt_username': '',
+            'mqtt_password': '',
+            'mqtt_topic_prefix': TOPIC_PREFIX,
+            'sms_monitoring_enabled': True,
+            'sms_check_interval': check_interval,
+            'debug': False,
+        }
+        with open(self.options_path, 'w', encoding='utf-8') as options_file:
+            json.dump(options, options_file)
+        self.process = None
+
+    def start(self, timeout=60):
+        env = dict(os.environ, GATEWAY_OPTIONS_FILE=self.options_path, PYTHONUNBUFFERED='1')
+        self._log = open(self.log_path, 'w', encoding='utf-8')
+        self.process = subprocess.Popen([sys.executable, 'run.py'], cwd=GATEWAY_DIR, env=env,
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Gateway exited with {self.process.returncode}, see {self.log_path}")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.http_port}/status/signal", timeout=2).read()
+                return
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.2)
+        raise RuntimeError(f"Gateway did not answer within {timeout}s, see {self.log_path}")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self._log.close()
+
+
+def run_inbound(dummy_dir, broker, count, rate, timeout):
+    """Drop inbound SMS files and match them against MQTT sms/state publishes"""
+    inbox_dir = os.path.join(dummy_dir, 'sms', str(INBOX_FOLDER))
+    state_topic = f'{TOPIC_PREFIX}/sms/state'
+    published_before = len(broker.published)
+    dropped = {}
+    started = time.monotonic()
+    for index in range(count):
+        token = f"LT-IN-{index:06d}"
+        when = datetime.now().replace(microsecond=0)
+        path = os.path.join(inbox_dir, str(index + 1))
+        # Written next to the inbox and renamed, so the driver never sees half a file
+        tmp_path = os.path.join(dummy_dir, f'incoming-{index + 1}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as sms_file:
+            sms_file.write(sms_backup_file(f"+42070000{index % 10000:04d}", f"{token} inbound load test", when))
+        os.replace(tmp_path, path)
+        dropped[token] = time.monotonic()
+        if rate:
+            time.sleep(1.0 / rate)
+    drop_seconds = time.monotonic() - started
+
+    deadline = time.monotonic() + timeout
+    while True:
+        seen = {}
+        for arrived, topic, payload in broker.published[published_before:]:
+            if topic != state_topic:
+                continue
+            try:
+                text = json.loads(payload.decode('utf-8')).get('Text', '')
+            except ValueError:
+                continue
+            token = text.split(' ', 1)[0]
+            if token in dropped:
+                seen.setdefault(token, []).append(arrived)
+        if len(seen) >= count or time.monotonic() >= deadline:
+            break
+        time.sleep(0.5)
+
+    latencies = [arrivals[0] - dropped[token] for token, arrivals in seen.items()]
+    result = {
+        "dropped": count,
+        "drop_seconds": round(drop_seconds, 3),
+        "published": sum(len(arrivals) for arrivals in seen.values()),
+        "lost": sorted(set(dropped) - set(seen)),
+        "duplicated": sorted(token for token, arrivals in seen.items() if len(arrivals) > 1),
+        "left_in_inbox": len(os.listdir(inbox_dir)),
+    }
+    if latencies:
+        span = max(arrivals[0] for arrivals in seen.values()) - min(dropped.values())
+        result["published_per_second"] = round(len(latencies) / span, 2) if span > 0 else None
+    result.update(timing_summary(latencies, prefix="delivery_"))
+    return result
+
+
+def run_rest(http_port, count, concurrency, retry_every):
+    """REST POST /sms load; every Nth send is retried with the same Idempotency-Key"""
+    auth = 'Basic ' + base64.b64encode(f"{USERNAME}:{PASSWORD}".encode()).decode()
+    url = f"http://127.0.0.1:{http_port}/sms"
+    latencies, statuses, replays = [], {}, []
+    lock = threading.Lock()
+
+    def post(index, key):
+        body = json.dumps({"number": f"+42077700{index % 10000:04d}", "text": f"LT-REST-{index:06d}"}).encode()
+        request = urllib.request.Request(url, data=body, method='POST', headers={
+            'Content-Type': 'application/json', 'Authorization': auth, 'Idempotency-Key': key})
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                status, replayed = response.status, response.headers.get('Idempotent-Replayed')
+        except urllib.error.HTTPError as error:
+            status, replayed = error.code, None
+        return time.monotonic() - started, status, replayed
+
+    def worker(indexes):
+        for index in indexes:
+            key = f"LT-REST-{index:06d}"
+            elapsed, status, _ = post(index, key)
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+            if retry_every and index % retry_every == 0:
+                _, retry_status, replayed = post(index, key)
+                with lock:
+                    replays.append((retry_status, replayed))
+
+    chunks = [list(range(worker_id, count, concurrency)) for worker_id in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.monotonic() - started
+
+    result = {
+        "sends": count,
+        "concurrency": concurrency,
+        "sends_per_second": round(count / total, 2) if total else None,
+        "status_codes": {str(code): number for code, number in statuses.items()},
+        "retries": len(replays),
+        "retries_not_replayed": sum(1 for status, replayed in replays if status == 200 and replayed != 'true'),
+    }
+    result.update(timing_summary(latencies, prefix="request_"))
+    return result
+
+
+def run_mqtt(broker, count, rate, retry_every, timeout):
+    """MQTT send commands; every Nth command is published twice with the same id"""
+    status_topic = f'{TOPIC_PREFIX}/send_status'
+    published_before = len(broker.published)
+    sent_at = {}
+    started = time.monotonic()
+    for index in range(count):
+        request_id = f"LT-MQTT-{index:06d}"
+        payload = json.dumps({"number": f"+42078800{index % 10000:04d}", "text": request_id, "id": request_id})
+        sent_at[request_id] = time.monotonic()
+        broker.publish(f'{TOPIC_PREFIX}/send', payload)
+        if retry_every and index % retry_every == 0:
+            broker.publish(f'{TOPIC_PREFIX}/send', payload)
+        if rate:
+            time.sleep(1.0 / rate)
+
+    deadline = time.monotonic() + timeout
+    results = {}
+    while time.monotonic() < deadline:
+        results = {}
+        for arrived, topic, payload in broker.published[published_before:]:
+            if topic != status_topic:
+                continue
+            try:
+                data = json.loads(payload.decode('utf-8'))
+            except ValueError:
+                continue
+            if data.get('id') in sent_at:
+                results.setdefault(data['id'], []).append((arrived, data.get('status')))
+        if all(any(status == 'success' for _, status in results.get(key, [])) for key in sent_at):
+            break
+        time.sleep(0.5)
+    total = time.monotonic() - started
+
+    latencies = []
+    for request_id, events in results.items():
+        successes = [arrived for arrived, status in events if status == 'success']
+        if successes:
+            latencies.append(successes[0] - sent_at[request_id])
+    result = {
+        "commands": count,
+        "sends_per_second": round(len(latencies) / total, 2) if total else None,
+        "succeeded": len(latencies),
+        "lost": sorted(key for key in sent_at if key not in results),
+        "sent_twice": sorted(key for key, events in results.items()
+                             if sum(1 for _, status in events if status == 'success') > 1),
+        "duplicates_detected": sum(1 for events in results.values() for _, status in events
+                                   if status in ('duplicate', 'in_progress')),
+    }
+    result.update(timing_summary(latencies, prefix="send_"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--inbound', type=int, default=100, help='Inbound SMS files to drop')
+    parser.add_argument('--inbound-rate', type=float, default=20, help='Inbound SMS per second (0 = burst)')
+    parser.add_argument('--rest', type=int, default=50, help='REST sends')
+    parser.add_argument('--rest-concurrency', type=int, default=4)
+    parser.add_argument('--mqtt', type=int, default=50, help='MQTT send commands')
+    parser.add_argument('--mqtt-rate', type=float, default=20, help='MQTT commands per second (0 = burst)')
+    parser.add_argument('--retry-every', type=int, default=10, help='Repeat every Nth REST/MQTT send with the same key')
+    parser.add_argument('--check-interval', type=int, default=2, help='Gateway SMS monitor interval (seconds)')
+    parser.add_argument('--timeout', type=float, default=120, help='Seconds to wait for results of each phase')
+    parser.add_argument('--keep', action='store_true', help='Keep dummy directory and gateway log')
+    parser.add_argument('--output', help='Write JSON report to file (default: stdout)')
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("gammu") is None:
+        parser.error("python-gammu is required (the dummy driver is part of libgammu)")
+
+    dummy_dir = tempfile.mkdtemp(prefix='sms-gateway-dummy-')
+    log_path = os.path.join(dummy_dir, 'gateway.log')
+    broker = FakeBroker().start()
+    gateway = GatewayProcess(dummy_dir, broker, free_port(), args.check_interval, log_path)
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "dummy_dir": dummy_dir,
+                       "check_interval_s": args.check_interval}}
+    try:
+        started = time.monotonic()
+        gateway.start()
+        report["meta"]["startup_seconds"] = round(time.monotonic() - started, 3)
+
+        # Run all phases concurrently, as they would hit a real gateway
+        phases = {}
+        threads = [
+            threading.Thread(target=lambda: phases.__setitem__(
+                "inbound", run_inbound(dummy_dir, broker, args.inbound, args.inbound_rate, args.timeout))),
+            threading.Thread(target=lambda: phases.__setitem__(
+                "rest_send", run_rest(gateway.http_port, args.rest, args.rest_concurrency, args.retry_every))),
+            threading.Thread(target=lambda: phases.__setitem__(
+                "mqtt_send", run_mqtt(broker, args.mqtt, args.mqtt_rate, args.retry_every, args.timeout))),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report["results"] = phases
+    finally:
+        gateway.stop()
+        broker.stop()
+
+    inbound, rest, mqtt_send = phases.get("inbound", {}), phases.get("rest_send", {}), phases.get("mqtt_send", {})
+    failures = (len(inbound.get("lost", [])) + len(inbound.get("duplicated", []))
+                + len(mqtt_send.get("lost", [])) + len(mqtt_send.get("sent_twice", []))
+                + rest.get("retries_not_replayed", 0)
+                + sum(number for code, number in rest.get("status_codes", {}).items() if code != '200'))
+    report["passed"] = failures == 0
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    if not args.keep and report["passed"]:
+        shutil.rmtree(dummy_dir, ignore_errors=True)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Summarize and replay gammu traces recorded by the gateway
+A trace is written with the add-on option `gammu_trace_mode: record`
+(default file /data/gammu-trace.jsonl.gz).
+
+    python3 benchmarks/replay_trace.py gammu-trace.jsonl.gz
+    python3 benchmarks/replay_trace.py gammu-trace.jsonl.gz --replay --speed 20
+
+The summary reports operation counts, recorded modem time per operation,
+errors by type and inbox size over time. With --replay the trace is served to
+the gateway (gammu_trace_mode: replay) and the recorded traffic pattern is
+driven through the REST API at the recorded pace scaled by --speed, reporting
+gateway latency per endpoint. Output is JSON.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import logging
+import argparse
+import tempfile
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'sms-gammu-gateway')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, GATEWAY_DIR)
+
+from bench_stats import timing_summary  # noqa: E402
+from gammu_trace import load_trace  # noqa: E402
+
+AUTH_HEADERS = {'Authorization': 'Basic ' + base64.b64encode(b'admin:password').decode()}
+
+# Trace operation -> REST request that makes the gateway perform it
+REPLAY_REQUESTS = {
+    "retrieveAllSms": ('GET', '/sms'),
+    "SendSMS": ('POST', '/sms'),
+    "GetSignalQuality": ('GET', '/status/signal'),
+    "GetNetworkInfo": ('GET', '/status/network'),
+}
+
+
+def summarize(records):
+    """Operation counts, recorded durations, errors and inbox growth"""
+    operations = {}
+    inbox = []
+    for entry in records:
+        stats = operations.setdefault(entry["op"], {"calls": 0, "errors": {}, "durations": []})
+        stats["calls"] += 1
+        stats["durations"].append(entry.get("d", 0))
+        if "e" in entry:
+            error_type = entry["e"].get("type", "unknown")
+            stats["errors"][error_type] = stats["errors"].get(error_type, 0) + 1
+        elif entry["op"] == "retrieveAllSms" and isinstance(entry.get("r"), list):
+            messages = entry["r"]
+            multipart = sum(1 for sms in messages if len(sms.get("Locations", [])) > 1)
+            inbox.append({"t": entry["t"], "messages": len(messages), "multipart": multipart})
+
+    summary = {}
+    for name, stats in sorted(operations.items()):
+        item = {"calls": stats["calls"], "errors": stats["errors"]}
+        item.update(timing_summary(stats["durations"], prefix="modem_"))
+        summary[name] = item
+    return {
+        "operations": len(records),
+        "duration_s": round(records[-1]["t"] - records[0]["t"], 3) if records else 0,
+        "by_operation": summary,
+        "inbox": {
+            "samples": len(inbox),
+            "max_messages": max((sample["messages"] for sample in inbox), default=0),
+            "max_multipart": max((sample["multipart"] for sample in inbox), default=0),
+            "timeline": inbox[:: max(1, len(inbox) // 50)],
+        },
+    }
+
+
+def replay(trace_path, records, speed):
+    """Drive recorded traffic through the gateway REST API with the trace as modem"""
+    import fake_gammu
+    fake_gammu.install()  # gateway imports gammu, the trace replaces the modem anyway
+
+    options = {
+        'gammu_trace_mode': 'replay',
+        'gammu_trace_file': os.path.abspath(trace_path),
+        'gammu_replay_speed': speed,
+        'mqtt_enabled': False,
+    }
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as options_file:
+        json.dump(options, options_file)
+    os.environ['GATEWAY_OPTIONS_FILE'] = options_file.name
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            import run
+    finally:
+        os.unlink(options_file.name)
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('mqtt_publisher').setLevel(logging.WARNING)
+    run.idempotency_store.path = None
+    run.delivery_tracker.path = None
+    run.init_modem()
+
+    client = run.app.test_client()
+    latencies = {}
+    statuses = {}
+    replay_started = time.monotonic()
+    for entry in records:
+        request = REPLAY_REQUESTS.get(entry["op"])
+        if request is None:
+            # Operations without own endpoint (deleteSms, Reset...) are consumed directly
+            try:
+                run.mqtt_publisher.track_gammu_operation(entry["op"], lambda: None)
+            except Exception:
+                pass
+            continue
+        if speed:
+            delay = entry["t"] / speed - (time.monotonic() - replay_started)
+            if delay > 0:
+                time.sleep(delay)
+        method, path = request
+        started = time.perf_counter()
+        if method == 'POST':
+            response = client.post(path, headers=AUTH_HEADERS, json={"number": "+420600000000", "text": "replay"})
+        else:
+            response = client.get(path, headers=AUTH_HEADERS)
+        latencies.setdefault(f"{method} {path}", []).append(time.perf_counter() - started)
+        key = f"{method} {path} {response.status_code}"
+        statuses[key] = statuses.get(key, 0) + 1
+    elapsed = time.monotonic() - replay_started
+
+    result = {"speed": speed, "seconds": round(elapsed, 3), "status_codes": statuses, "endpoints": {}}
+    for endpoint, samples in latencies.items():
+        item = {"requests": len(samples), "requests_per_second": round(len(samples) / elapsed, 2) if elapsed else None}
+        item.update(timing_summary(samples, prefix="gateway_"))
+        result["endpoints"][endpoint] = item
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('trace', help='Trace file recorded by the gateway (.jsonl.gz)')
+    parser.add_argument('--replay', action='store_true', help='Replay trace through the gateway REST API')
+    parser.add_argument('--speed', type=float, default=10.0,
+                        help='Replay speed: 1 = recorded pace, 10 = ten times faster, 0 = no delays')
+    parser.add_argument('--output', help='Write JSON report to file (default: stdout)')
+    args = parser.parse_args()
+
+    records = load_trace(args.trace)
+    report = {"trace": args.trace, "summary": summarize(records)}
+    if args.replay:
+        report["replay"] = replay(args.trace, records, args.speed)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for SMS Gammu Gateway
+Runs the gateway modules (run.py, support.py, mqtt_publisher.py) against a
+simulated gammu StateMachine and a local MQTT broker stand-in, no modem needed.
+
+Usage:
+    python3 benchmarks/run_benchmarks.py --output results.json
+    python3 benchmarks/run_benchmarks.py --quick --baseline results.json
+
+Results are written as JSON. With --baseline, metrics ending in `_per_second`
+(higher is better) and `_ms`/`_kib` (lower is better) are compared and the
+exit code is 1 when any of them regressed by more than --tolerance.
+"""
+
+import os
+import sys
+import gc
+import json
+import time
+import base64
+import logging
+import argparse
+import contextlib
+import platform
+import threading
+import statistics
+import subprocess
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GATEWAY_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'sms-gammu-gateway')
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, GATEWAY_DIR)
+
+import fake_gammu  # noqa: E402
+from fake_broker import FakeBroker  # noqa: E402
+from webhook_receiver import WebhookReceiver  # noqa: E402
+from bench_stats import timing_summary  # noqa: E402
+
+fake_gammu.install()
+
+AUTH_HEADERS = {'Authorization': 'Basic ' + base64.b64encode(b'admin:password').decode()}
+
+
+def load_gateway():
+    """Import run.py against the simulated modem (MQTT disabled, nothing written to /data)"""
+    # Gateway startup prints go to stderr so stdout stays valid JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        import run
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('mqtt_publisher').setLevel(logging.WARNING)
+    run.idempotency_store.path = None
+    run.delivery_tracker.path = None
+    run.send_scheduler.path = None
+    run.message_store.path = None
+    run.sms_router.queue_dir = None
+    if run.signal_history is not None:
+        run.signal_history.path = None
+    if run.gammu_debug_capture is not None:
+        run.gammu_debug_capture.dump_dir = None
+    return run
+
+
+def new_machine(gateway, latency_scale=1.0, **kwargs):
+    """Fresh simulated modem wired into the gateway"""
+    machine = fake_gammu.StateMachine(latency_scale=latency_scale, **kwargs)
+    gateway.attach_machine(machine)
+    return machine
+
+
+def bench_rest_send(gateway, sends, concurrency, latency_scale):
+    """Throughput of POST /sms through Flask, retries and the simulated modem"""
+    machine = new_machine(gateway, latency_scale=latency_scale)
+    per_thread = max(1, sends // concurrency)
+    durations = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        client = gateway.app.test_client()
+        for index in range(per_thread):
+            started = time.perf_counter()
+            response = client.post('/sms', headers=AUTH_HEADERS, json={
+                'number': f'+42060000{worker_id:02d}{index:02d}',
+                'text': f'Benchmark message {worker_id}/{index}',
+            })
+            elapsed = time.perf_counter() - started
+            if response.status_code != 200:
+                raise RuntimeError(f"POST /sms returned {response.status_code}: {response.get_data(as_text=True)}")
+            with lock:
+                durations.append(elapsed)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - started
+
+    result = {
+        "sends": len(durations),
+        "concurrency": concurrency,
+        "send_latency_ms_simulated": round(fake_gammu.DEFAULT_LATENCY["SendSMS"] * latency_scale * 1000, 3),
+        "seconds": round(total, 3),
+        "sends_per_second": round(len(durations) / total, 2),
+        "modem_sends": machine.calls.get("SendSMS", 0),
+    }
+    result.update(timing_summary(durations, prefix="request_"))
+    return result
+
+
+def bench_retrieve_all_sms(gateway, sizes, repeats, latency_scale):
+    """Cost of retrieveAllSms against inbox size (CPU only and with simulated AT latency)"""
+    from support import retrieveAllSms
+    results = {}
+    for size in sizes:
+        entry = {}
+        for label, scale in (("cpu", 0.0), ("modem", latency_scale)):
+            machine = fake_gammu.StateMachine(latency_scale=scale, sim_size=max(size * 3, 50))
+            machine.populate_inbox(size, multipart_every=5)
+            samples = []
+            runs = repeats if scale == 0 else 1
+            for _ in range(runs):
+                started = time.perf_counter()
+                messages = retrieveAllSms(machine)
+                samples.append(time.perf_counter() - started)
+            entry[f"{label}_mean_ms"] = round(statistics.fmean(samples) * 1000, 3)
+            entry[f"{label}_per_message_ms"] = round(statistics.fmean(samples) * 1000 / max(1, size), 4)
+            entry["messages"] = len(messages)
+            entry["locations"] = machine.calls.get("GetNextSMS", 0) // runs
+        results[str(size)] = entry
+    return results
+
+
+def _connected_publisher(broker, **config_overrides):
+    """MQTTPublisher connected to the local broker stand-in"""
+    from mqtt_publisher import MQTTPublisher
+    config = {
+        'mqtt_enabled': True,
+        'mqtt_host': broker.host,
+        'mqtt_port': broker.port,
+        'mqtt_topic_prefix': 'bench/sms_gateway',
+        'sms_monitoring_enabled': True,
+    }
+    config.update(config_overrides)
+    publisher = MQTTPublisher(config)
+    deadline = time.monotonic() + 10
+    while not publisher.connected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if not publisher.connected:
+        raise RuntimeError("MQTT publisher did not connect to local broker")
+    return publisher
+
+
+def bench_monitor_latency(messages, check_interval, latency_scale):
+    """Delay from SMS arriving on the SIM to its MQTT publish by the monitor loop"""
+    broker = FakeBroker().start()
+    publisher = _connected_publisher(broker)
+    try:
+        machine = fake_gammu.StateMachine(latency_scale=latency_scale)
+        publisher.set_gammu_machine(machine)
+        # Discovery publishes an empty retained state first, wait for it to settle
+        time.sleep(2.0)
+        baseline = broker.count('bench/sms_gateway/sms/state')
+        publisher.start_sms_monitoring(machine, check_interval=check_interval)
+
+        delays = []
+        for index in range(messages):
+            arrived = time.monotonic()
+            machine.deliver(f'+4206000000{index:02d}', f'Monitor benchmark {index}')
+            published = broker.wait_for('bench/sms_gateway/sms/state', baseline + index + 1,
+                                        timeout=check_interval * 4 + 5)
+            if published is None:
+                raise RuntimeError(f"SMS {index} was not published by the monitor loop")
+            delays.append(published - arrived)
+            # Arrivals land at random points of the polling cycle
+            time.sleep((index % 4) * check_interval / 4)
+
+        result = {
+            "messages": messages,
+            "check_interval_s": check_interval,
+            "left_on_sim": len(machine.inbox),
+        }
+        result.update(timing_summary(delays, prefix="delivery_"))
+        return result
+    finally:
+        publisher.disconnect()
+        broker.stop()
+
+
+def bench_mqtt_publish_rate(count):
+    """Rate of publish_sms_received to the local broker"""
+    broker = FakeBroker().start()
+    publisher = _connected_publisher(broker)
+    try:
+        time.sleep(2.0)
+        baseline = broker.count('bench/sms_gateway/sms/state')
+        sms = {"Date": "2025-01-01 08:00:00", "Number": "+420600000000", "State": "UnRead",
+               "Text": "Příliš žluťoučký kůň úpěl ďábelské ódy " * 3}
+        started = time.perf_counter()
+        for _ in range(count):
+            publisher.publish_sms_received(dict(sms))
+        queued = time.perf_counter() - started
+        arrived = broker.wait_for('bench/sms_gateway/sms/state', baseline + count, timeout=60)
+        total = time.perf_counter() - started
+        return {
+            "messages": count,
+            "publish_calls_per_second": round(count / queued, 1),
+            "delivered_per_second": round(count / total, 1) if arrived else None,
+            "delivered": broker.count('bench/sms_gateway/sms/state') - baseline,
+        }
+    finally:
+        publisher.disconnect()
+        broker.stop()
+
+
+def bench_webhooks(events, batch_size):
+    """Webhook delivery rate to a local receiver, connection reuse and retry recovery"""
+    from webhooks import WebhookDispatcher
+    from retry_policy import RetryPolicy
+    sms = {"Date": "2025-01-01 08:00:00", "Number": "+420600000000", "State": "UnRead", "Text": "Webhook benchmark"}
+    results = {}
+    for label, size in (("single", 1), (f"batch_{batch_size}", batch_size)):
+        receiver = WebhookReceiver(secret='bench').start()
+        dispatcher = WebhookDispatcher([receiver.url], secret='bench', batch_size=size, batch_interval=0.05,
+                                       queue_path=None)
+        dispatcher.start()
+        try:
+            started = time.perf_counter()
+            for _ in range(events):
+                dispatcher.emit("sms_received", dict(sms))
+            delivered = receiver.wait_for_events(events, timeout=60)
+            elapsed = time.perf_counter() - started
+            results[label] = {
+                "events": events,
+                "events_per_second": round(events / elapsed, 1) if delivered else None,
+                "requests": receiver.requests,
+                "tcp_connections": receiver.connections,
+                "invalid_signatures": sum(1 for delivery in receiver.deliveries if not delivery["signature_valid"]),
+            }
+        finally:
+            dispatcher.stop()
+            receiver.stop()
+
+    # Receiver answers 503 three times, the retry queue must still deliver
+    receiver = WebhookReceiver(fail_first=3).start()
+    dispatcher = WebhookDispatcher([receiver.url], policy=RetryPolicy(max_attempts=5, base_delay=0.05, max_delay=0.2),
+                                   queue_path=None)
+    dispatcher.start()
+    try:
+        started = time.perf_counter()
+        dispatcher.emit("sms_received", dict(sms))
+        delivered = receiver.wait_for_events(1, timeout=10)
+        results["retry"] = {
+            "delivered": delivered,
+            "requests": receiver.requests,
+            "retries": dispatcher.stats["retries"],
+            "recovery_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+    finally:
+        dispatcher.stop()
+        receiver.stop()
+    return results
+
+
+def bench_serialization(gateway, size, repeats):
+    """GET /sms response encoding: marshal() + json against Projection + shared serializer"""
+    from flask_restx import marshal
+    from support import retrieveAllSms
+    from serialization import dumps_bytes, JSON_BACKEND
+    machine = fake_gammu.StateMachine(latency_scale=0.0, sim_size=max(size * 3, 50))
+    machine.populate_inbox(size, multipart_every=5)
+    records = retrieveAllSms(machine)
+
+    def timed(encode):
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            encode()
+            samples.append(time.perf_counter() - started)
+        return round(statistics.fmean(samples) * 1000, 3)
+
+    gateway.attach_machine(machine)
+    client = gateway.app.test_client()
+    return {
+        "messages": len(records),
+        "backend": JSON_BACKEND,
+        "marshal_json_ms": timed(lambda: json.dumps(marshal(records, gateway.sms_response), ensure_ascii=False)),
+        "projection_ms": timed(lambda: dumps_bytes(gateway.sms_projection.many(records))),
+        "rest_list_ms": timed(lambda: client.get('/sms', headers=AUTH_HEADERS)),
+    }
+
+
+def bench_memory(gateway, iterations):
+    """Python heap over a long mixed send/receive run (tracemalloc)"""
+    from support import retrieveAllSms, deleteSms
+    machine = new_machine(gateway, latency_scale=0.0)
+    publisher = gateway.mqtt_publisher
+
+    def cycle(index):
+        machine.deliver(f'+42060000{index % 1000:04d}', f'Memory benchmark inbound {index}')
+        for sms in publisher.process_status_reports(machine, retrieveAllSms(machine)):
+            deleteSms(machine, sms)
+        # Fresh test client per cycle, Werkzeug's client keeps per-request state
+        client = gateway.app.test_client()
+        client.post('/sms', headers=AUTH_HEADERS, json={'number': '+420600000000', 'text': f'Outbound {index}'})
+        client.get('/status/signal')
+
+    # Warm up caches and lazy imports before measuring
+    for index in range(min(200, iterations)):
+        cycle(index)
+    gc.collect()
+    tracemalloc.start()
+    start_current, _ = tracemalloc.get_traced_memory()
+    samples = []
+    started = time.perf_counter()
+    step = max(1, iterations // 10)
+    for index in range(iterations):
+        cycle(index)
+        if index % step == 0:
+            samples.append(tracemalloc.get_traced_memory()[0])
+    gc.collect()
+    end_current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "cycles_per_second": round(iterations / elapsed, 1),
+        "start_kib": round(start_current / 1024, 1),
+        "end_kib": round(end_current / 1024, 1),
+        "peak_kib": round(peak / 1024, 1),
+        "growth_per_1k_iterations_kib": round((end_current - start_current) / 1024 / iterations * 1000, 2),
+        "samples_kib": [round(sample / 1024, 1) for sample in samples],
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def _flatten(prefix, value, into):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, item, into)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        into[prefix] = value
+    return into
+
+
+def compare(results, baseline, tolerance):
+    """List metrics that regressed beyond tolerance against baseline results"""
+    current = _flatten('', results["results"], {})
+    previous = _flatten('', baseline.get("results", {}), {})
+    regressions = []
+    for key, value in current.items():
+        old = previous.get(key)
+        if not old:
+            continue
+        if key.endswith('_per_second'):
+            change = (old - value) / old
+        elif key.endswith('_ms') or key.endswith('_kib'):
+            change = (value - old) / old
+        else:
+            continue
+        if change > tolerance:
+            regressions.append({"metric": key, "baseline": old, "current": value,
+                                "regression_percent": round(change * 100, 1)})
+    return regressions
+
+
+SCENARIOS = ("rest_send", "retrieve_all_sms", "monitor_latency", "mqtt_publish", "webhooks", "serialization", "memory")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Comma separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--quick', action='store_true', help='Smaller workloads for CI smoke runs')
+    parser.add_argument('--latency-scale', type=float, default=0.1,
+                        help='Multiplier for simulated AT command latency (1.0 = realistic USB modem)')
+    parser.add_argument('--output', help='Write JSON results to file (default: stdout)')
+    parser.add_argument('--baseline', help='Previous JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression (default 0.25)')
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    quick = args.quick
+    gateway = load_gateway()
+    results = {}
+    if "rest_send" in selected:
+        results["rest_send"] = {
+            "serial": bench_rest_send(gateway, 20 if quick else 100, 1, args.latency_scale),
+            "concurrent_4": bench_rest_send(gateway, 20 if quick else 100, 4, args.latency_scale),
+        }
+    if "retrieve_all_sms" in selected:
+        sizes = (10, 50) if quick else (10, 50, 100, 250)
+        results["retrieve_all_sms"] = bench_retrieve_all_sms(gateway, sizes, 3 if quick else 10, args.latency_scale)
+    if "monitor_latency" in selected:
+        results["monitor_latency"] = bench_monitor_latency(3 if quick else 10, 1.0, args.latency_scale)
+    if "mqtt_publish" in selected:
+        results["mqtt_publish"] = bench_mqtt_publish_rate(500 if quick else 5000)
+    if "webhooks" in selected:
+        results["webhooks"] = bench_webhooks(200 if quick else 2000, 20)
+    if "serialization" in selected:
+        results["serialization"] = bench_serialization(gateway, 100 if quick else 250, 5 if quick else 20)
+    if "memory" in selected:
+        results["memory"] = bench_memory(gateway, 500 if quick else 5000)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+            "latency_scale": args.latency_scale,
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            report["regressions"] = compare(report, json.load(baseline_file), args.tolerance)
+        exit_code = 1 if report["regressions"] else 0
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
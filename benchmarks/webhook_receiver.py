@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Local HTTP stand-in for a webhook receiver
+Accepts the gateway's webhook POSTs on 127.0.0.1, verifies signatures,
+records every delivery and counts TCP connections (to check connection
+reuse). Failures can be injected to exercise the retry queue.
+
+    python3 benchmarks/webhook_receiver.py --port 8099 --secret s3cret
+
+prints received events as JSON lines; point `webhook_urls` at
+http://127.0.0.1:8099/hook.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sms-gammu-gateway'))
+
+from webhooks import verify_signature, SIGNATURE_HEADER, TIMESTAMP_HEADER, DELIVERY_HEADER  # noqa: E402
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, the gateway reuses connections
+
+    def setup(self):
+        super().setup()
+        with self.server.receiver._lock:
+            self.server.receiver.connections += 1
+
+    def do_POST(self):
+        receiver = self.server.receiver
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with receiver._lock:
+            receiver.requests += 1
+            fail = receiver.requests <= receiver.fail_first
+        if receiver.delay:
+            time.sleep(receiver.delay)
+        if fail:
+            self._reply(receiver.fail_status)
+            return
+        valid = None
+        if receiver.secret:
+            valid = verify_signature(receiver.secret, self.headers.get(TIMESTAMP_HEADER),
+                                     body, self.headers.get(SIGNATURE_HEADER))
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            self._reply(400)
+            return
+        with receiver._condition:
+            receiver.deliveries.append({
+                "received": time.monotonic(),
+                "delivery_id": self.headers.get(DELIVERY_HEADER),
+                "signature_valid": valid,
+                "payload": payload,
+            })
+            receiver._condition.notify_all()
+        if receiver.on_delivery:
+            receiver.on_delivery(payload, valid)
+        self._reply(401 if valid is False else 204)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookReceiver:
+    """In-process webhook endpoint; fail_first requests are answered with fail_status"""
+
+    def __init__(self, secret='', fail_first=0, fail_status=503, delay=0.0, port=0, on_delivery=None):
+        self.secret = secret
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.delay = delay
+        self.on_delivery = on_delivery
+        self.deliveries = []
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._server.daemon_threads = True
+        self._server.receiver = self
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/hook"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def events(self):
+        """All received events in arrival order (duplicates from retries included)"""
+        with self._lock:
+            return [event for delivery in self.deliveries for event in delivery["payload"].get("events", [])]
+
+    def wait_for_events(self, count, timeout=10):
+        """Wait until `count` distinct events arrived, returns True on success"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                ids = {event["id"] for delivery in self.deliveries for event in delivery["payload"].get("events", [])}
+                if len(ids) >= count:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--secret', default='', help='webhook_secret configured in the gateway')
+    parser.add_argument('--fail-first', type=int, default=0, help='Answer the first N requests with --fail-status')
+    parser.add_argument('--fail-status', type=int, default=503)
+    args = parser.parse_args()
+
+    def show(payload, valid):
+        for event in payload.get("events", []):
+            print(json.dumps({"signature_valid": valid, **event}, ensure_ascii=False), flush=True)
+
+    receiver = WebhookReceiver(secret=args.secret, fail_first=args.fail_first, fail_status=args.fail_status,
+                               port=args.port, on_delivery=show).start()
+    print(f"Listening on {receiver.url}", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        receiver.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,464 @@
+"""
+asyncio runtime for SMS Gammu Gateway
+Optional way to serve the gateway from one event loop (runtime: asyncio):
+/events streams and /sms/getsms long polls wait on the loop instead of holding
+a server thread each, the rest of the REST API runs the Flask app through an
+ASGI bridge, paho's socket is driven by the loop and gammu calls go through a
+single modem worker thread.
+"""
+
+import io
+import sys
+import json
+import time
+import asyncio
+import logging
+import threading
+import importlib.util
+import importlib.metadata
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode
+
+from event_stream import format_sse, parse_last_event_id, KEEPALIVE_SECONDS, RECONNECT_MS
+from serialization import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_THREADED = 'threaded'
+RUNTIME_ASYNCIO = 'asyncio'
+HTTP_WORKERS = 16  # Threads running Flask requests; streams and long polls don't take one while waiting
+GRACEFUL_SHUTDOWN = 5  # Seconds open event streams get before uvicorn closes them on stop
+MQTT_MISC_INTERVAL = 1.0  # paho keepalive/retry housekeeping
+MQTT_RECONNECT_MIN = 1
+MQTT_RECONNECT_MAX = 120
+SOCKET_CLOSE_TIMEOUT = 5
+UVICORN_MIN_VERSION = (0, 22)  # timeout_graceful_shutdown
+
+
+def asyncio_runtime_available():
+    """uvicorn is installed in a version serve() works with (only needed for runtime: asyncio)"""
+    if importlib.util.find_spec("uvicorn") is None:
+        return False
+    try:
+        version = importlib.metadata.version("uvicorn")
+        return tuple(int(part) for part in version.split(".")[:2]) >= UVICORN_MIN_VERSION
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return True  # Installed without metadata or an odd version string, let serve() try
+
+
+def _waker(loop, event):
+    """Thread-safe, non-blocking callable setting an asyncio.Event (for broadcaster/queue wakers)"""
+    def wake():
+        try:
+            loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # Loop already closed at shutdown
+    return wake
+
+
+class ModemWorker:
+    """The one thread all tracked gammu calls run on, so the modem is never used from two threads at once"""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="modem")
+        self._ident = self._executor.submit(threading.get_ident).result()
+
+    def call(self, func, *args, **kwargs):
+        """Run func on the modem thread and wait for its result (inline when already on it)"""
+        if threading.get_ident() == self._ident:
+            return func(*args, **kwargs)
+        return self._executor.submit(func, *args, **kwargs).result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class AsyncMqttRunner:
+    """Drives a paho client from the event loop instead of paho's network thread.
+
+    The socket is watched with add_reader/add_writer, keepalives run from a
+    periodic task and (re)connects, which block on DNS and TCP, run in an
+    executor with backoff. Incoming messages are already handed to the
+    publisher's command thread by its on_message callback.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._client = None
+        self._loop_ident = None
+        self._backoff = MQTT_RECONNECT_MIN
+        self._reconnecting = False
+
+    def attach(self, client):
+        """Take over a client after connect_async() (paho's own loop must not be running); thread-safe"""
+        self.loop.call_soon_threadsafe(self._attach, client)
+
+    def _attach(self, client):
+        self._loop_ident = threading.get_ident()
+        self._client = client
+        self._backoff = MQTT_RECONNECT_MIN
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_register_write
+        client.on_socket_unregister_write = self._on_unregister_write
+        on_connect, on_disconnect = client.on_connect, client.on_disconnect
+
+        def connected(client, userdata, flags, rc):
+            if rc == 0:
+                self._backoff = MQTT_RECONNECT_MIN
+            on_connect(client, userdata, flags, rc)
+
+        def disconnected(client, userdata, rc):
+            on_disconnect(client, userdata, rc)
+            if rc != 0:
+                # Unexpected (broker gone, keepalive timeout); disconnect() gives rc 0
+                self._schedule_reconnect(client)
+
+        client.on_connect = connected
+        client.on_disconnect = disconnected
+        sock = client.socket()
+        if sock is None:
+            self._schedule_reconnect(client, delay=0)
+        else:
+            # Connected by paho's thread before the loop took over
+            self.loop.add_reader(sock.fileno(), client.loop_read)
+            if client.want_write():
+                self.loop.add_writer(sock.fileno(), client.loop_write)
+        self.loop.create_task(self._housekeeping(client))
+
+    # paho calls these from whichever thread touches the socket, the loop is only changed from its own thread
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.call_soon_threadsafe(self.loop.add_reader, sock.fileno(), client.loop_read)
+
+    def _on_socket_close(self, client, userdata, sock):
+        # paho closes the socket right after this returns, the selector must let go of it first
+        fd = sock.fileno()
+        if threading.get_ident() == self._loop_ident:
+            self._forget(fd)
+            return
+        done = threading.Event()
+
+        def forget():
+            try:
+                self._forget(fd)
+            finally:
+                done.set()
+
+        try:
+            self.loop.call_soon_threadsafe(forget)
+        except RuntimeError:
+            return  # Loop closed, nothing is watching the socket anymore
+        done.wait(SOCKET_CLOSE_TIMEOUT)
+
+    def _forget(self, fd):
+        self.loop.remove_writer(fd)
+        self.loop.remove_reader(fd)
+
+    def _on_register_write(self, client, userdata, sock):
+        self.loop.call_soon_threadsafe(self.loop.add_writer, sock.fileno(), client.loop_write)
+
+    def _on_unregister_write(self, client, userdata, sock):
+        self.loop.call_soon_threadsafe(self.loop.remove_writer, sock.fileno())
+
+    def _schedule_reconnect(self, client, delay=None):
+        if self._reconnecting or client is not self._client:
+            return
+        self._reconnecting = True
+        delay = self._backoff if delay is None else delay
+        self.loop.call_soon_threadsafe(lambda: self.loop.create_task(self._reconnect(client, delay)))
+
+    async def _reconnect(self, client, delay):
+        try:
+            while client is self._client:
+                await asyncio.sleep(delay)
+                try:
+                    await self.loop.run_in_executor(None, client.reconnect)
+                    return
+                except Exception as e:
+                    delay = self._backoff
+                    self._backoff = min(self._backoff * 2, MQTT_RECONNECT_MAX)
+                    logger.debug(f"MQTT connect failed, retrying in {delay}s: {e}")
+        finally:
+            self._reconnecting = False
+
+    async def _housekeeping(self, client):
+        while client is self._client:
+            await asyncio.sleep(MQTT_MISC_INTERVAL)
+            if client.socket() is not None:
+                client.loop_misc()
+
+    def detach(self):
+        """Stop driving the current client, flushing what disconnect() queued"""
+        client, self._client = self._client, None
+        if client is not None and client.socket() is not None and client.want_write():
+            client.loop_write()
+
+    def stop(self):
+        self.detach()
+
+
+class AsgiGateway:
+    """ASGI app: /events and /sms/getsms long polls wait on the event loop, other requests run the WSGI app.
+
+    authorize(header) decides whether an Authorization header is valid;
+    unauthorized requests are answered by the WSGI app so they get the same
+    401. getsms_wait(value) turns the wait parameter into seconds (ValueError
+    when invalid) and render_sms(sms, environ) builds the (status, headers,
+    body) response for an SMS taken from the inbox queue.
+    """
+
+    def __init__(self, wsgi_app, broadcaster, inbox_queue, authorize, getsms_wait, render_sms,
+                 on_startup=None, on_shutdown=None, workers=HTTP_WORKERS):
+        self.wsgi_app = wsgi_app
+        self.broadcaster = broadcaster
+        self.inbox_queue = inbox_queue
+        self.authorize = authorize
+        self.getsms_wait = getsms_wait
+        self.render_sms = render_sms
+        self.on_startup = on_startup  # callable(loop), runs on the loop before serving
+        self.on_shutdown = on_shutdown  # callable(), blocking cleanup, runs in an executor
+        self._http = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="http")
+        self._closing = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        body = await self._read_body(receive)
+        if scope["method"] == "GET" and scope["path"] == "/events":
+            return await self._events(scope, receive, send, body)
+        if scope["method"] == "GET" and scope["path"] == "/sms/getsms":
+            return await self._getsms(scope, send, body)
+        await self._send(send, *await self._call_wsgi(self._environ(scope, body)))
+
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._closing = asyncio.Event()
+                try:
+                    if self.on_startup is not None:
+                        self.on_startup(loop)
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self._closing.set()
+                if self.on_shutdown is not None:
+                    # Off the loop: thread joins block, MQTT still needs the loop to send its disconnect
+                    await loop.run_in_executor(None, self.on_shutdown)
+                self._http.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    @staticmethod
+    async def _read_body(receive):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    @staticmethod
+    def _environ(scope, body, query_string=None):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1") if query_string is None else query_string,
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_LENGTH":
+                continue
+            key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _run_wsgi(self, environ):
+        """Complete WSGI response as (status, headers, body), runs on an HTTP worker thread"""
+        started = {}
+        chunks = []
+
+        def start_response(status, headers, exc_info=None):
+            started["status"], started["headers"] = status, headers
+            return chunks.append
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            for chunk in result:
+                chunks.append(chunk)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return int(started["status"].split(" ", 1)[0]), started["headers"], b"".join(chunks)
+
+    async def _call_wsgi(self, environ):
+        return await asyncio.get_running_loop().run_in_executor(self._http, self._run_wsgi, environ)
+
+    @staticmethod
+    async def _send(send, status, headers, body):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_json(self, send, status, data, headers=()):
+        body = dumps_bytes(data) + b"\n"
+        await self._send(send, status, [("Content-Type", "application/json"),
+                                        ("Content-Length", str(len(body)))] + list(headers), body)
+
+    @staticmethod
+    def _header(scope, name):
+        for key, value in scope["headers"]:
+            if key.decode("latin-1").lower() == name:
+                return value.decode("latin-1")
+        return None
+
+    @staticmethod
+    def _empty_sms(status, content):
+        """Response is the empty SMS /sms/getsms answers when nothing is there"""
+        try:
+            return status == 200 and json.loads(content).get("Number") == ""
+        except (ValueError, AttributeError):
+            return False  # Compressed or not an object, an actual SMS
+
+    async def _getsms(self, scope, send, body):
+        """GET /sms/getsms: the immediate part runs in Flask, the wait for the monitor loop on the event loop"""
+        query = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        try:
+            wait = self.getsms_wait(dict(reversed(query)).get("wait", 0))  # First value wins, like Flask
+        except ValueError:
+            wait = 0  # Flask answers 400
+        if not wait or not self.authorize(self._header(scope, "authorization")):
+            return await self._send(send, *await self._call_wsgi(self._environ(scope, body)))
+        # Queue first, then the SIM, exactly like wait=0
+        environ = self._environ(scope, body, urlencode([(key, value) for key, value in query if key != "wait"]))
+        status, headers, content = await self._call_wsgi(environ)
+        if not self._empty_sms(status, content):
+            return await self._send(send, status, headers, content)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        woken = asyncio.Event()
+        wake = _waker(loop, woken)
+        self.inbox_queue.add_waker(wake)
+        try:
+            while not self._closing.is_set():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(woken.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                woken.clear()
+                sms = self.inbox_queue.get()
+                if sms is not None:
+                    return await self._send(send, *await loop.run_in_executor(
+                        self._http, self.render_sms, sms, environ))
+                # Another client took it, keep waiting
+        finally:
+            self.inbox_queue.remove_waker(wake)
+        await self._send(send, status, headers, content)
+
+    async def _events(self, scope, receive, send, body):
+        """GET /events: same stream as EventBroadcaster.stream, one coroutine per subscriber"""
+        if not self.authorize(self._header(scope, "authorization")):
+            return await self._send(send, *await self._call_wsgi(self._environ(scope, body)))
+        query = dict(reversed(parse_qsl(scope["query_string"].decode("latin-1"))))
+        header = self._header(scope, "last-event-id")
+        last_event_id = parse_last_event_id(header if header is not None else query.get("last_event_id"))
+        if not self.broadcaster.try_subscribe():
+            return await self._send_json(send, 503, {"status": 503, "message": "Too many event stream clients"},
+                                         [("Retry-After", "30")])
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        wake = _waker(loop, woken)
+        gone = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+            gone.set()
+            woken.set()
+
+        watcher = loop.create_task(watch_disconnect())
+        self.broadcaster.add_waker(wake)
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/event-stream; charset=utf-8"),
+                            (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")],
+            })
+            backlog, missed, position = self.broadcaster.read(last_event_id)
+            chunks = [f"retry: {RECONNECT_MS}\n\n"]
+            if missed:
+                chunks.append(format_sse(None, "gap", {"missed_events": missed}))
+            chunks.extend(backlog)
+            while not gone.is_set() and not self._closing.is_set():
+                await send({"type": "http.response.body", "body": "".join(chunks).encode("utf-8"),
+                            "more_body": True})
+                woken.clear()
+                new, missed, sequence = self.broadcaster.read(position)
+                if sequence == position:
+                    try:
+                        await asyncio.wait_for(woken.wait(), KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    new, missed, sequence = self.broadcaster.read(position)
+                position = sequence
+                chunks = []
+                if missed:
+                    chunks.append(format_sse(None, "gap", {"missed_events": missed}))
+                chunks.extend(new)
+                if not chunks:
+                    # Comment line keeps proxies from closing an idle stream
+                    chunks.append(f": keepalive {int(time.time())}\n\n")
+        except OSError:
+            pass  # Client went away mid-send
+        finally:
+            self.broadcaster.remove_waker(wake)
+            self.broadcaster.unsubscribe()
+            watcher.cancel()
+        if not gone.is_set():
+            try:
+                await send({"type": "http.response.body", "body": b""})
+            except OSError:
+                pass
+
+
+def serve(gateway, port, ssl_context=None):
+    """Serve the ASGI gateway with uvicorn until SIGTERM/SIGINT (lifespan shutdown runs the cleanup)"""
+    import uvicorn  # Optional dependency, checked with asyncio_runtime_available()
+
+    options = {}
+    if ssl_context:
+        options.update(ssl_certfile=ssl_context[0], ssl_keyfile=ssl_context[1])
+    uvicorn.run(gateway, host="0.0.0.0", port=port, lifespan="on", log_config=None, access_log=False,
+                timeout_graceful_shutdown=GRACEFUL_SHUTDOWN, **options)
@@ -0,0 +1,86 @@
+"""
+Live configuration reload for SMS Gammu Gateway
+Watches the add-on options and secrets files (or reloads on request), works
+out which settings changed and hands them to the gateway to apply while it
+keeps running. Settings that can't change at runtime are reported instead.
+"""
+
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONFIG_WATCH_INTERVAL = 5
+
+# Changing these re-initializes the modem, nothing else does
+MODEM_KEYS = ('device_path', 'pin', 'connection')
+# Listening socket, trace files and webhook workers are only set up at start
+RESTART_KEYS = ('port', 'ssl', 'gammu_trace_mode', 'gammu_trace_file', 'gammu_trace_max_mb',
+                'gammu_replay_speed', 'gammu_replay_loop', 'webhook_urls', 'webhook_secret',
+                'webhook_batch_size', 'webhook_batch_interval', 'webhook_max_attempts', 'gammu_debug_buffer_mb',
+                'signal_history_enabled', 'runtime')
+
+
+def changed_keys(old, new):
+    """Settings added, removed or changed between two configurations"""
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+class ConfigReloader:
+    """Loads configuration with load() and applies changes with apply(old, new, changed) one reload at a time"""
+
+    def __init__(self, current, load, apply, watch_paths=(), interval=CONFIG_WATCH_INTERVAL):
+        self.current = current
+        self.load = load
+        self.apply = apply
+        self.watch_paths = tuple(watch_paths)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._mtimes = self._read_mtimes()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _read_mtimes(self):
+        mtimes = {}
+        for path in self.watch_paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def reload(self, reason="request"):
+        """Load and apply the configuration, returns what changed (raises when it can't be loaded)"""
+        with self._lock:
+            self._mtimes = self._read_mtimes()
+            new = self.load()
+            changed = changed_keys(self.current, new)
+            if not changed:
+                logger.info(f"Configuration reload ({reason}): no changes")
+                return {"changed": [], "restart_required": [], "modem_reinit": False}
+            # Names only, values may be passwords
+            logger.info(f"🔄 Configuration reload ({reason}): {', '.join(changed)}")
+            result = self.apply(self.current, new, changed)
+            self.current = new
+            return dict(result, changed=changed)
+
+    def start(self):
+        """Watch the files for changes in a background thread"""
+        if self._thread is not None or not self.watch_paths:
+            return
+        self._thread = threading.Thread(target=self._watch, name="config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            if self._read_mtimes() == self._mtimes:
+                continue
+            try:
+                self.reload(reason="file changed")
+            except Exception as e:
+                # Half-written file or YAML error, the next change retries
+                logger.error(f"Configuration reload failed, keeping current settings: {e}")
@@ -0,0 +1,202 @@
+"""
+Delivery report tracking for SMS Gammu Gateway
+Correlates incoming SMS status reports with sent messages by message reference
+and tracks delivered/failed/expired state with submit-to-delivery latency
+"""
+
+import os
+import json
+import time
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_REPORTS_FILE = '/data/delivery_reports.json'
+
+STATE_PENDING = "pending"
+STATE_DELIVERED = "delivered"
+STATE_FAILED = "failed"
+STATE_EXPIRED = "expired"
+
+# TP-Status value for "SM Validity Period Expired" (3GPP TS 23.040)
+TP_STATUS_VALIDITY_EXPIRED = 0x46
+
+
+def delivery_state_from_status(status):
+    """Map TP-Status of a status report to a delivery state"""
+    if status is None:
+        return STATE_PENDING
+    status = int(status)
+    if status < 0x20:
+        return STATE_DELIVERED
+    if status < 0x40:
+        # SC is still trying to deliver, report is only intermediate
+        return STATE_PENDING
+    if status == TP_STATUS_VALIDITY_EXPIRED:
+        return STATE_EXPIRED
+    return STATE_FAILED
+
+
+def _number_digits(number):
+    """Digits of phone number for loose matching (+420123... vs 00420123...)"""
+    digits = ''.join(ch for ch in str(number or '') if ch.isdigit())
+    return digits[-9:]
+
+
+def _copy(jobs):
+    """Deep copy for callers, the tracker keeps changing its own job dicts"""
+    return json.loads(json.dumps(jobs))
+
+
+def _parse_date(value):
+    """Parse 'YYYY-MM-DD HH:MM:SS' string from retrieveAllSms, None if unusable"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class DeliveryReportTracker:
+    """Bounded, TTL-expiring registry of sent SMS awaiting status reports"""
+
+    def __init__(self, path=DELIVERY_REPORTS_FILE, ttl_seconds=7 * 86400, max_jobs=2000):
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()  # job_id -> job dict
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Load tracked jobs from disk"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as jobs_file:
+                data = json.load(jobs_file)
+        except Exception as e:
+            logger.warning(f"Could not load delivery reports from {self.path}: {e}")
+            return
+        for job in sorted(data.values(), key=lambda job: job.get('submitted', 0)):
+            self._jobs[job['id']] = job
+        self._expire()
+
+    def _save(self):
+        """Persist jobs atomically (caller holds the lock)"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as jobs_file:
+                json.dump(self._jobs, jobs_file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not persist delivery reports to {self.path}: {e}")
+
+    def _expire(self):
+        """Drop old jobs and keep within max_jobs (caller holds the lock)"""
+        cutoff = time.time() - self.ttl
+        while self._jobs:
+            job = next(iter(self._jobs.values()))
+            if job.get('submitted', 0) >= cutoff and len(self._jobs) <= self.max_jobs:
+                break
+            self._jobs.popitem(last=False)
+
+    def register(self, number, references, job_id=None):
+        """Start tracking a sent message (all its parts), returns job id"""
+        job_id = job_id or secrets.token_hex(8)
+        now = time.time()
+        job = {
+            "id": job_id,
+            "number": number,
+            "state": STATE_PENDING,
+            "submitted": now,
+            "submitted_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            "parts": [
+                {"reference": reference, "state": STATE_PENDING, "status": None,
+                 "delivered_at": None, "latency_seconds": None}
+                for reference in references
+            ],
+            "latency_seconds": None,
+        }
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._jobs[job_id] = job
+            self._expire()
+            self._save()
+        return job_id
+
+    def _find_part(self, reference, number):
+        """Find most recent pending part with reference, preferring matching number (caller holds the lock)"""
+        digits = _number_digits(number)
+        fallback = None
+        for job in reversed(self._jobs.values()):
+            for part in job["parts"]:
+                if part["reference"] != reference or part["state"] != STATE_PENDING:
+                    continue
+                if not digits or _number_digits(job["number"]) == digits:
+                    return job, part
+                if fallback is None:
+                    fallback = (job, part)
+        return fallback if fallback else (None, None)
+
+    def process_report(self, report):
+        """Apply status report (from retrieveAllSms) to its job.
+
+        Returns copy of the updated job, or None when no job matches.
+        """
+        reference = report.get("MessageReference")
+        state = delivery_state_from_status(report.get("DeliveryStatus"))
+        with self._lock:
+            job, part = self._find_part(reference, report.get("Number"))
+            if job is None:
+                logger.info(f"Status report for unknown message reference {reference}, ignoring")
+                return None
+            if state == STATE_PENDING:
+                # Intermediate report, SC keeps trying
+                part["status"] = report.get("DeliveryStatus")
+                self._save()
+                return _copy(job)
+
+            now = time.time()
+            part["state"] = state
+            part["status"] = report.get("DeliveryStatus")
+            part["delivered_at"] = report.get("Date") or time.strftime("%Y-%m-%d %H:%M:%S")
+
+            # Prefer SMSC timestamps (submit vs. discharge), fall back to local clock
+            submitted = _parse_date(report.get("SMSCDate"))
+            discharged = _parse_date(report.get("Date"))
+            if submitted and discharged and discharged >= submitted:
+                part["latency_seconds"] = (discharged - submitted).total_seconds()
+            else:
+                part["latency_seconds"] = round(now - job["submitted"], 3)
+
+            states = [p["state"] for p in job["parts"]]
+            if STATE_FAILED in states:
+                job["state"] = STATE_FAILED
+            elif STATE_EXPIRED in states:
+                job["state"] = STATE_EXPIRED
+            elif all(s == STATE_DELIVERED for s in states):
+                job["state"] = STATE_DELIVERED
+            if job["state"] != STATE_PENDING:
+                job["latency_seconds"] = max(p["latency_seconds"] or 0 for p in job["parts"])
+            self._save()
+            return _copy(job)
+
+    def get(self, job_id):
+        """Get copy of tracked job, None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return _copy(job) if job else None
+
+    def recent(self, limit=50):
+        """Most recent jobs, newest first"""
+        with self._lock:
+            jobs = list(self._jobs.values())[-limit:]
+            return _copy(list(reversed(jobs)))
@@ -0,0 +1,130 @@
+"""
+Server-Sent Events for SMS Gammu Gateway
+Fans gateway events out to any number of HTTP subscribers from a bounded
+in-memory ring buffer; each event has a sequence id so clients resume with
+Last-Event-ID after a reconnect
+"""
+
+import time
+import threading
+from collections import deque
+
+from serialization import dumps
+
+KEEPALIVE_SECONDS = 15
+RECONNECT_MS = 3000
+
+
+def format_sse(event_id, event_type, data):
+    """Encode one event in text/event-stream format (event_id None keeps the client's last id)"""
+    payload = dumps(data)
+    id_line = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{id_line}event: {event_type}\ndata: {payload}\n\n"
+
+
+class EventBroadcaster:
+    """Ring buffer of recent events with blocking subscribers"""
+
+    def __init__(self, max_events=1000, max_subscribers=50):
+        self.max_subscribers = max_subscribers
+        self._events = deque(maxlen=max_events)
+        self._sequence = 0
+        self._subscribers = 0
+        self._wakers = []  # Non-blocking callables for subscribers that don't wait on the condition (asyncio)
+        self._condition = threading.Condition()
+
+    def publish(self, event_type, data):
+        """Add event and wake subscribers (usable as MQTTPublisher event listener)"""
+        with self._condition:
+            self._sequence += 1
+            # Serialized once here, not once per subscriber
+            self._events.append((self._sequence, format_sse(self._sequence, event_type, data)))
+            self._condition.notify_all()
+            for wake in self._wakers:
+                wake()
+
+    def has_subscribers(self):
+        return self._subscribers > 0
+
+    @property
+    def subscriber_count(self):
+        return self._subscribers
+
+    def try_subscribe(self):
+        """Reserve a subscriber slot, False when max_subscribers are connected"""
+        with self._condition:
+            if self._subscribers >= self.max_subscribers:
+                return False
+            self._subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self._subscribers = max(0, self._subscribers - 1)
+
+    def add_waker(self, wake):
+        """Call wake() (with the lock held, must not block) whenever an event is published"""
+        with self._condition:
+            self._wakers.append(wake)
+
+    def remove_waker(self, wake):
+        with self._condition:
+            self._wakers.remove(wake)
+
+    def read(self, position):
+        """SSE chunks after position, events lost from the buffer in between and the new position"""
+        with self._condition:
+            chunks, missed = self._events_after(position)
+            return chunks, missed, self._sequence
+
+    def _events_after(self, last_id):
+        """Buffered events newer than last_id and number of events lost from the buffer (caller holds lock)"""
+        if not self._events:
+            return [], 0
+        oldest = self._events[0][0]
+        if last_id is None:
+            return [], 0
+        if last_id > self._sequence:
+            # Id from before a gateway restart, send everything we have
+            return [chunk for _, chunk in self._events], 0
+        missed = max(0, oldest - last_id - 1)
+        return [chunk for sequence, chunk in self._events if sequence > last_id], missed
+
+    def stream(self, last_event_id=None, keepalive=KEEPALIVE_SECONDS):
+        """Generator of SSE chunks for one subscriber.
+
+        Without last_event_id only new events are sent; with it, buffered
+        events after that id are replayed first. The slot reserved with
+        try_subscribe is released by the caller when the response closes.
+        """
+        with self._condition:
+            backlog, missed = self._events_after(last_event_id)
+            position = self._sequence
+        yield f"retry: {RECONNECT_MS}\n\n"
+        if missed:
+            # Client was away longer than the buffer reaches back
+            yield format_sse(None, "gap", {"missed_events": missed})
+        if backlog:
+            yield "".join(backlog)
+        while True:
+            with self._condition:
+                if self._sequence == position:
+                    self._condition.wait(keepalive)
+                chunks, missed = self._events_after(position)
+                position = self._sequence
+            if missed:
+                # Subscriber fell behind by more than the buffer holds
+                yield format_sse(None, "gap", {"missed_events": missed})
+            if chunks:
+                yield "".join(chunks)
+            else:
+                # Comment line keeps proxies from closing an idle stream and detects gone clients
+                yield f": keepalive {int(time.time())}\n\n"
+
+
+def parse_last_event_id(value):
+    """Last-Event-ID header/query value as int, None when missing or invalid"""
+    try:
+        return int(str(value).strip()) if value not in (None, '') else None
+    except ValueError:
+        return None
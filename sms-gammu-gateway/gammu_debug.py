@@ -0,0 +1,138 @@
+"""
+Gammu debug capture for SMS Gammu Gateway
+Gammu's AT-level debug trace is written into a pipe and kept as the last N MB
+in memory instead of growing /data/gammu-debug.log, so it can stay enabled in
+production. A failed gammu operation dumps the buffer to /data/gammu-debug/.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+GAMMU_DEBUG_DUMP_DIR = '/data/gammu-debug'
+GAMMU_DEBUG_BUFFER_MB = 0  # 0 = capture off
+MAX_DUMPS = 5
+DUMP_COOLDOWN = 300  # A modem that stays offline fails every call, one dump per incident is enough
+_READ_SIZE = 65536
+_DUMP_PREFIX = 'gammu-debug-'
+
+
+class DebugRingBuffer:
+    """Keeps the most recent max_bytes of a byte stream"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._chunks = deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data):
+        with self._lock:
+            self._chunks.append(data)
+            self._size += len(data)
+            while self._size > self.max_bytes and len(self._chunks) > 1:
+                self._size -= len(self._chunks.popleft())
+
+    def snapshot(self):
+        with self._lock:
+            data = b"".join(self._chunks)
+        # The oldest chunk may reach past the limit, cut at a line start
+        if len(data) > self.max_bytes:
+            data = data[-self.max_bytes:]
+            data = data[data.find(b"\n") + 1:]
+        return data
+
+
+class GammuDebugCapture:
+    """Pipe for StateMachine.SetDebugFile drained into a ring buffer by a reader thread"""
+
+    def __init__(self, max_bytes, dump_dir=GAMMU_DEBUG_DUMP_DIR, max_dumps=MAX_DUMPS, cooldown=DUMP_COOLDOWN):
+        self.buffer = DebugRingBuffer(max_bytes)
+        self.dump_dir = dump_dir
+        self.max_dumps = max_dumps
+        self.cooldown = cooldown
+        self._last_dump = None
+        self._dump_lock = threading.Lock()
+        self._file = None
+
+    def debug_file(self):
+        """Write end of the pipe (file object) to pass to SetDebugFile, created on first call"""
+        if self._file is None:
+            read_fd, write_fd = os.pipe()
+            self._file = os.fdopen(write_fd, 'w', buffering=1)
+            threading.Thread(target=self._drain, args=(read_fd,), name="gammu-debug", daemon=True).start()
+        return self._file
+
+    def _drain(self, read_fd):
+        # Only ever blocks this thread, gammu writes land in the pipe buffer
+        while True:
+            data = os.read(read_fd, _READ_SIZE)
+            if not data:
+                break
+            self.buffer.write(data)
+
+    def on_failure(self, operation_name, error):
+        """Dump the buffer for a failed gammu operation (in a thread, at most once per cooldown)"""
+        if not self.dump_dir or not len(self.buffer):
+            return
+        now = time.monotonic()
+        with self._dump_lock:
+            if self._last_dump is not None and now - self._last_dump < self.cooldown:
+                return
+            self._last_dump = now
+        threading.Thread(target=self.dump, args=(f"{operation_name} failed: {error}",),
+                         name="gammu-debug-dump", daemon=True).start()
+
+    def dump(self, reason):
+        """Write the current buffer to dump_dir, returns the file name (None when disabled or failed)"""
+        if not self.dump_dir:
+            return None
+        name = f"{_DUMP_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}.log"
+        path = os.path.join(self.dump_dir, name)
+        try:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as dump_file:
+                dump_file.write(f"# {reason}\n".encode('utf-8', 'replace'))
+                dump_file.write(self.buffer.snapshot())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write gammu debug dump {path}: {e}")
+            return None
+        logger.warning(f"🪲 Gammu debug trace saved to {path} ({reason})")
+        for old in self.dumps()[self.max_dumps:]:
+            try:
+                os.remove(os.path.join(self.dump_dir, old["name"]))
+            except OSError:
+                pass
+        return name
+
+    def dumps(self):
+        """Saved dumps, newest first"""
+        if not self.dump_dir or not os.path.isdir(self.dump_dir):
+            return []
+        result = []
+        for name in os.listdir(self.dump_dir):
+            if not (name.startswith(_DUMP_PREFIX) and name.endswith('.log')):
+                continue
+            stat = os.stat(os.path.join(self.dump_dir, name))
+            result.append({
+                "name": name,
+                "size": stat.st_size,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stat.st_mtime)),
+            })
+        return sorted(result, key=lambda dump: dump["name"], reverse=True)
+
+    def read_dump(self, name):
+        """Content of a saved dump, None for unknown names (only names from dumps() are served)"""
+        if name not in {dump["name"] for dump in self.dumps()}:
+            return None
+        with open(os.path.join(self.dump_dir, name), 'rb') as dump_file:
+            return dump_file.read()
@@ -0,0 +1,226 @@
+"""
+Gammu call record/replay for SMS Gammu Gateway
+Records every tracked gammu operation (name, arguments, result or exception,
+timing) to a compact gzip JSON-lines trace under /data, and replays a recorded
+trace back to the gateway instead of a modem
+"""
+
+import os
+import gzip
+import json
+import time
+import base64
+import logging
+import threading
+from collections import deque
+from datetime import datetime, date
+
+logger = logging.getLogger(__name__)
+
+GAMMU_TRACE_FILE = '/data/gammu-trace.jsonl.gz'
+
+TRACE_MODE_OFF = 'off'
+TRACE_MODE_RECORD = 'record'
+TRACE_MODE_REPLAY = 'replay'
+
+
+def encode_value(value):
+    """Convert gammu values to JSON (datetimes and bytes are tagged, objects reduced to type name)"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, datetime):
+        return {"__dt__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__d__": value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__b__": base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, dict):
+        return {str(key): encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    # StateMachine, callables etc. are not data, keep only what they were
+    return {"__obj__": type(value).__name__}
+
+
+def decode_value(value):
+    """Reverse of encode_value"""
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    if isinstance(value, dict):
+        if len(value) == 1:
+            if "__dt__" in value:
+                return datetime.fromisoformat(value["__dt__"])
+            if "__d__" in value:
+                return date.fromisoformat(value["__d__"])
+            if "__b__" in value:
+                return base64.b64decode(value["__b__"])
+            if "__obj__" in value:
+                return None
+        return {key: decode_value(item) for key, item in value.items()}
+    return value
+
+
+class GammuTraceRecorder:
+    """Appends one JSON line per gammu operation to a gzip trace, rotating at max_bytes"""
+
+    def __init__(self, path=GAMMU_TRACE_FILE, max_bytes=20 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._started = time.time()
+        self._open()
+
+    def _open(self):
+        self._file = gzip.open(self.path, 'at', encoding='utf-8', compresslevel=6)
+        self._started = time.time()
+        header = {"trace": "gammu", "version": 1, "started": self._started}
+        self._file.write(json.dumps(header, separators=(',', ':')) + "\n")
+        logger.info(f"Recording gammu operations to {self.path}")
+
+    def _rotate(self):
+        """Keep one previous trace next to the current one (caller holds the lock)"""
+        self._file.close()
+        os.replace(self.path, f"{self.path}.1")
+        self._open()
+
+    def record(self, operation_name, args, kwargs, started, duration, result=None, error=None):
+        """Append a single operation to the trace"""
+        entry = {
+            "t": round(started - self._started, 4),
+            "op": operation_name,
+            "d": round(duration, 4),
+        }
+        if args:
+            entry["a"] = encode_value(args)
+        if kwargs:
+            entry["k"] = encode_value(kwargs)
+        if error is not None:
+            entry["e"] = {"type": type(error).__name__, "args": encode_value(error.args)}
+        else:
+            entry["r"] = encode_value(result)
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n"
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line)
+                # Sync flush so a crash leaves a readable trace up to the last call
+                self._file.flush()
+                if os.path.getsize(self.path) >= self.max_bytes:
+                    self._rotate()
+            except Exception as e:
+                logger.warning(f"Could not write gammu trace: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_trace(path):
+    """Read trace records (header lines skipped), tolerating a truncated gzip tail"""
+    records = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as trace_file:
+            for line in trace_file:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if "op" in entry:
+                    records.append(entry)
+    except (EOFError, gzip.BadGzipFile, json.JSONDecodeError) as e:
+        logger.warning(f"Gammu trace {path} ends early ({e}), replaying {len(records)} recorded operations")
+    return records
+
+
+class ReplayedGammuError(Exception):
+    """Base of exceptions recreated from a trace when gammu doesn't define the type"""
+
+
+class ReplayExhausted(Exception):
+    """No more recorded results for an operation"""
+
+
+class GammuTraceReplayer:
+    """Serves recorded results per operation name, in recorded order.
+
+    speed scales recorded call durations: 1.0 = real time, 10 = ten times
+    faster, 0 = no delay at all.
+    """
+
+    def __init__(self, path=GAMMU_TRACE_FILE, speed=1.0, loop=False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self._records = {}
+        self._lock = threading.Lock()
+        self._error_types = {}
+        for entry in load_trace(path):
+            self._records.setdefault(entry["op"], deque()).append(entry)
+        self._original = {op: list(entries) for op, entries in self._records.items()}
+        total = sum(len(entries) for entries in self._records.values())
+        logger.info(f"Replaying {total} gammu operations from {path} (speed: {speed}x)")
+
+    def has(self, operation_name):
+        return operation_name in self._original
+
+    def _error_from(self, recorded):
+        """Recreate recorded exception, using gammu's class when available"""
+        name = recorded.get("type", "ReplayedGammuError")
+        args = decode_value(recorded.get("args") or [])
+        error_type = self._error_types.get(name)
+        if error_type is None:
+            try:
+                import gammu
+                candidate = getattr(gammu, name, None)
+            except ImportError:
+                candidate = None
+            if isinstance(candidate, type) and issubclass(candidate, BaseException):
+                error_type = candidate
+            else:
+                # Same class name keeps retry classification identical to production
+                error_type = type(name, (ReplayedGammuError,), {})
+            self._error_types[name] = error_type
+        return error_type(*args)
+
+    def play(self, operation_name):
+        """Return (or raise) next recorded outcome of operation"""
+        with self._lock:
+            entries = self._records.get(operation_name)
+            if not entries and self.loop and operation_name in self._original:
+                entries = self._records[operation_name] = deque(self._original[operation_name])
+            if not entries:
+                raise ReplayExhausted(f"No recorded '{operation_name}' left in {self.path}")
+            entry = entries.popleft()
+        if self.speed and entry.get("d"):
+            time.sleep(entry["d"] / self.speed)
+        if "e" in entry:
+            raise self._error_from(entry["e"])
+        return decode_value(entry.get("r"))
+
+
+class ReplayStateMachine:
+    """Stand-in for gammu.StateMachine backed by a trace.
+
+    Methods with recorded calls replay them; anything never recorded
+    (Init, ReadConfig, ...) is accepted and returns None.
+    """
+
+    def __init__(self, replayer):
+        self._replayer = replayer
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        replayer = self._replayer
+
+        def replayed(*args, **kwargs):
+            if replayer.has(name):
+                return replayer.play(name)
+            return None
+
+        replayed.__name__ = name
+        return replayed
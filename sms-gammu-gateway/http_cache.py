@@ -0,0 +1,130 @@
+"""
+HTTP caching for SMS Gammu Gateway
+Version counters turn inbox/signal/network state into ETags so polling
+clients get 304 Not Modified without a modem read; static bodies (Ingress
+page, Swagger JSON) are built once with a precompressed gzip variant
+"""
+
+import gzip
+import time
+import uuid
+import hashlib
+import threading
+
+from flask import Response
+from werkzeug.http import quote_etag
+
+from serialization import dumps_bytes
+
+ETAG_MAX_AGE = 15  # Seconds a version is trusted without reading the modem again
+GZIP_MIN_SIZE = 1024  # Smaller bodies gain nothing from compression
+GZIP_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain')
+
+# Versions restart at 0 with the process, the boot id keeps old ETags from matching
+_BOOT_ID = uuid.uuid4().hex[:8]
+
+
+def accepts_gzip(request):
+    return request.accept_encodings['gzip'] > 0
+
+
+class ResourceVersion:
+    """Version counter of one resource, bumped only when its content changes"""
+
+    def __init__(self, name, max_age=ETAG_MAX_AGE):
+        self.name = name
+        self.max_age = max_age
+        self.version = 0
+        self._digest = None
+        self._checked = None  # Monotonic time content was last compared, None when unknown
+        self._lock = threading.Lock()
+
+    @property
+    def etag(self):
+        return f"{self.name}-{_BOOT_ID}-{self.version}"
+
+    def update(self, data):
+        """Record freshly read content, returns current ETag"""
+        digest = hashlib.blake2b(dumps_bytes(data), digest_size=16).digest()
+        with self._lock:
+            if digest != self._digest:
+                self._digest = digest
+                self.version += 1
+            self._checked = time.monotonic()
+            return self.etag
+
+    def invalidate(self):
+        """Content changed (e.g. SMS deleted), the next read decides the new version"""
+        with self._lock:
+            self._digest = None
+            self._checked = None
+            self.version += 1
+
+    def not_modified(self, request):
+        """Client already has the current version and it was checked recently enough to skip the modem"""
+        with self._lock:
+            fresh = self._checked is not None and time.monotonic() - self._checked < self.max_age
+            return fresh and request.if_none_match.contains_weak(self.etag)
+
+
+def conditional(data, version, request, headers=None):
+    """Resource return value with ETag, or a bare 304 when the client's copy is current"""
+    headers = dict(headers or {})
+    headers["ETag"] = quote_etag(version.etag, weak=True)
+    headers["Cache-Control"] = "no-cache"
+    if request.if_none_match.contains_weak(version.etag):
+        return not_modified(version, headers)
+    return data, 200, headers
+
+
+def not_modified(version, headers=None):
+    headers = dict(headers or {})
+    headers["ETag"] = quote_etag(version.etag, weak=True)
+    headers.setdefault("Cache-Control", "no-cache")
+    return Response(status=304, headers=headers)
+
+
+def compress_response(response, request, min_size=GZIP_MIN_SIZE):
+    """gzip a finished response when the client accepts it and the body is worth it"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not accepts_gzip(request):
+        return response
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+class CachedBody:
+    """Response body built once, served with a content ETag and precompressed gzip.
+
+    The ETags are strong, so the gzip variant (other bytes) gets its own one.
+    """
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.gzipped = gzip.compress(body, compresslevel=9) if len(body) >= GZIP_MIN_SIZE else None
+        self.etag = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.gzip_etag = f"{self.etag}-gzip"
+
+    def response(self, request):
+        gzipped = self.gzipped is not None and accepts_gzip(request)
+        etag = self.gzip_etag if gzipped else self.etag
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif gzipped:
+            response = Response(self.gzipped, mimetype=self.mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype=self.mimetype)
+        response.set_etag(etag)
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,134 @@
+"""
+Idempotency key store for SMS Gammu Gateway
+Remembers SMS send requests by client supplied key so that retries return the
+original result instead of sending the message again
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_STORE_FILE = '/data/idempotency_keys.json'
+
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETED = "completed"
+
+
+def request_fingerprint(number, text):
+    """Build a stable fingerprint of the request content bound to a key"""
+    digest = hashlib.sha256()
+    digest.update(str(number or "").encode('utf-8'))
+    digest.update(b"\x00")
+    digest.update(str(text or "").encode('utf-8'))
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """Bounded, TTL-expiring key store persisted as JSON under /data"""
+
+    def __init__(self, path=IDEMPOTENCY_STORE_FILE, ttl_seconds=86400, max_entries=1000):
+        self.path = path
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> {"status", "created", "fingerprint", "result"}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Load remembered keys, dropping expired and interrupted ones"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as store_file:
+                data = json.load(store_file)
+        except Exception as e:
+            logger.warning(f"Could not load idempotency keys from {self.path}: {e}")
+            return
+
+        now = time.time()
+        interrupted = 0
+        for key, entry in sorted(data.items(), key=lambda item: item[1].get('created', 0)):
+            if now - entry.get('created', 0) > self.ttl:
+                continue
+            if entry.get('status') != STATUS_COMPLETED:
+                # Send never finished before restart, let the client retry it
+                interrupted += 1
+                continue
+            self._entries[key] = entry
+        self._evict()
+        if interrupted:
+            logger.warning(f"Discarded {interrupted} idempotency keys of sends interrupted by restart")
+
+    def _save(self):
+        """Persist keys atomically (caller holds the lock)"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as store_file:
+                json.dump(self._entries, store_file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"Could not persist idempotency keys to {self.path}: {e}")
+
+    def _expire(self):
+        """Drop entries older than TTL (caller holds the lock)"""
+        cutoff = time.time() - self.ttl
+        # Entries are kept in insertion order, so the oldest come first
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.get('created', 0) >= cutoff:
+                break
+            self._entries.popitem(last=False)
+
+    def _evict(self):
+        """Keep store within max_entries, oldest first (caller holds the lock)"""
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def begin(self, key, fingerprint=None):
+        """Reserve key for a new send.
+
+        Returns None when the caller owns the key and should send, otherwise a
+        copy of the existing entry (in progress or completed).
+        """
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(key)
+            if entry is not None:
+                return dict(entry)
+            self._entries[key] = {
+                "status": STATUS_IN_PROGRESS,
+                "created": time.time(),
+                "fingerprint": fingerprint,
+                "result": None,
+            }
+            self._evict()
+            self._save()
+            return None
+
+    def complete(self, key, result):
+        """Remember final result of the send made under key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["status"] = STATUS_COMPLETED
+            entry["result"] = result
+            self._save()
+
+    def release(self, key):
+        """Forget key so a later retry may send again (e.g. send raised before finishing)"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,101 @@
+"""
+Inbox queue for SMS Gammu Gateway
+Hands SMS picked up by the monitor loop to /sms/getsms clients; long-polling
+clients block on it instead of scanning the modem, and every message is given
+to exactly one client. SMS are only kept briefly and only while a client polls.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+
+from log_queue import Phone
+
+logger = logging.getLogger(__name__)
+
+GETSMS_MAX_WAIT = 60  # Seconds, each waiting client holds a server thread
+# Seconds a queued SMS waits for a client, and how long after its last request a client still counts
+# as polling (covers the gap between two long polls); MQTT/webhooks already got the SMS
+QUEUE_TTL = 60
+
+
+class InboxQueue:
+    """Bounded FIFO of received SMS with blocking get, filled only while /sms/getsms clients poll"""
+
+    def __init__(self, max_messages=100, ttl=QUEUE_TTL):
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._messages = deque()  # (queued at, sms)
+        self._waiters = 0
+        self._last_client = float('-inf')  # monotonic time of the last getsms request
+        self._wakers = []  # Waiters that don't block on the condition (asyncio long polls)
+        self._condition = threading.Condition()
+
+    def put(self, sms):
+        """Queue received SMS and wake one waiting client; False (not kept) when no client polls"""
+        now = time.monotonic()
+        with self._condition:
+            self._expire(now)
+            if not self._waiters and now - self._last_client > self.ttl:
+                return False
+            self._messages.append((now, sms))
+            while len(self._messages) > self.max_messages:
+                _, dropped = self._messages.popleft()
+                logger.debug("Inbox queue full, dropping oldest SMS from %s (already published to MQTT/webhooks)",
+                             Phone(dropped.get('Number', '')))
+            self._condition.notify()
+            for wake in self._wakers:
+                wake()
+            return True
+
+    def _expire(self, now):
+        """Drop SMS no client picked up within ttl (caller holds the lock)"""
+        while self._messages and now - self._messages[0][0] > self.ttl:
+            self._messages.popleft()
+
+    def _pop(self):
+        """Oldest unexpired SMS or None (caller holds the lock)"""
+        now = time.monotonic()
+        self._last_client = now
+        self._expire(now)
+        return self._messages.popleft()[1] if self._messages else None
+
+    def get(self, timeout=0):
+        """Oldest queued SMS, waiting up to timeout seconds; None when nothing arrived"""
+        with self._condition:
+            self._expire(time.monotonic())
+            if self._messages or not timeout:
+                return self._pop()
+            self._waiters += 1
+            try:
+                # wait_for re-checks after every wakeup, a message taken by another client keeps us waiting
+                self._condition.wait_for(lambda: self._messages, timeout)
+                return self._pop()
+            finally:
+                self._waiters -= 1
+
+    def add_waker(self, wake):
+        """Count a non-blocking waiter and call wake() (lock held, must not block) on every put.
+
+        Woken right away when SMS are already queued; the waiter then takes
+        one with get() and waits again if another client was faster.
+        """
+        with self._condition:
+            self._waiters += 1
+            self._wakers.append(wake)
+            if self._messages:
+                wake()
+
+    def remove_waker(self, wake):
+        with self._condition:
+            self._wakers.remove(wake)
+            self._waiters -= 1
+            self._last_client = time.monotonic()
+
+    def has_waiters(self):
+        """Long-polling clients are waiting (keeps the monitor loop polling the modem)"""
+        return self._waiters > 0
+
+    def __len__(self):
+        return len(self._messages)
@@ -0,0 +1,148 @@
+"""
+Logging for SMS Gammu Gateway
+Records pass through a bounded queue to one writer thread, so modem and MQTT
+threads never wait on log output. Repetitive messages are rate-limited per
+message template, and phone numbers and SMS texts passed as Phone()/Body()
+arguments can be redacted.
+"""
+
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_QUEUE_SIZE = 10000  # Records beyond this are dropped rather than blocking the caller
+LOG_RATE_LIMIT = 20  # INFO/DEBUG records per message template and window, 0 = unlimited
+LOG_RATE_WINDOW = 60
+_MAX_TRACKED_TEMPLATES = 1000
+
+_redact = False
+
+
+def set_redaction(enabled):
+    """Redact Phone()/Body() log arguments from now on (also for records still queued)"""
+    global _redact
+    _redact = bool(enabled)
+
+
+def mask_number(number):
+    """'+420123456789' -> '+*********789'"""
+    text = str(number or "")
+    prefix = "+" if text.startswith("+") else ""
+    digits = text[len(prefix):]
+    if len(digits) <= 3:
+        return prefix + "*" * len(digits)
+    return prefix + "*" * (len(digits) - 3) + digits[-3:]
+
+
+class Phone:
+    """Phone number log argument, masked when redaction is on"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return mask_number(self.value) if _redact else str(self.value)
+
+
+class Body:
+    """SMS text or payload log argument, replaced by its length when redaction is on"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        text = "" if self.value is None else str(self.value)
+        return f"<{len(text)} chars>" if _redact else text
+
+
+# Arguments that can't change before the writer thread formats them
+_DEFERRABLE = (str, int, float, bool, type(None), Phone, Body)
+
+
+class RateLimitFilter(logging.Filter):
+    """Passes at most `limit` INFO/DEBUG records per message template and window.
+
+    Keyed by the unformatted message, so it only groups %-style calls; the
+    first record of the next window reports how many were suppressed.
+    """
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._windows = {}  # (logger, template) -> [window start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not self.limit or record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or record.created - entry[0] >= self.window:
+                if entry is None and len(self._windows) >= _MAX_TRACKED_TEMPLATES:
+                    self._windows.clear()
+                suppressed = entry[2] if entry is not None else 0
+                self._windows[key] = [record.created, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} [{suppressed} similar messages suppressed]"
+                return True
+            if entry[1] < self.limit:
+                entry[1] += 1
+                return True
+            entry[2] += 1
+            return False
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that formats in the writer thread when it is safe and drops records when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Tracebacks and mutable arguments (dicts, lists) must be rendered now
+        args = record.args or ()
+        if (record.exc_info or record.stack_info or not isinstance(args, tuple)
+                or not all(isinstance(arg, _DEFERRABLE) for arg in args)):
+            return super().prepare(record)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(rate_limit=LOG_RATE_LIMIT, redact=False, queue_size=LOG_QUEUE_SIZE):
+    """Move the root logger's handlers behind a queue with a background writer, returns the listener"""
+    set_redaction(redact)
+    root = logging.getLogger()
+    handlers = list(root.handlers) or [logging.StreamHandler()]
+    for handler in handlers:
+        root.removeHandler(handler)
+    log_queue = queue.Queue(queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(rate_limit))
+    root.addHandler(queue_handler)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Write out what is still queued on exit
+    atexit.register(listener.stop)
+    return listener
+
+
+def rate_limit_filter():
+    """RateLimitFilter of the installed queue handler (None before setup_logging)"""
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, NonBlockingQueueHandler):
+            for log_filter in handler.filters:
+                if isinstance(log_filter, RateLimitFilter):
+                    return log_filter
+    return None
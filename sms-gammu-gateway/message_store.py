@@ -0,0 +1,300 @@
+"""
+Message history for SMS Gammu Gateway
+SQLite archive (WAL mode) of every received SMS and every sent part, written
+in batches from a background thread so modem loops never wait on disk, with
+configurable retention. History reads never touch the modem. An FTS5 index
+kept in sync by triggers serves ranked full-text search.
+"""
+
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_DB = '/data/messages.db'
+RETENTION_DAYS = 90  # 0 keeps messages forever
+FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 200
+PRUNE_INTERVAL = 3600
+MAX_HISTORY_LIMIT = 1000
+
+DIRECTION_IN = 'in'
+DIRECTION_OUT = 'out'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    direction TEXT NOT NULL,
+    number TEXT,
+    text TEXT,
+    state TEXT,
+    date TEXT NOT NULL,
+    reference INTEGER,
+    part INTEGER,
+    parts INTEGER,
+    recorded_at REAL NOT NULL,
+    fingerprint TEXT UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_messages_number ON messages(number, date);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(date);
+CREATE INDEX IF NOT EXISTS idx_messages_state ON messages(state);
+"""
+
+# External content index over messages.text, triggers update it within the batch transaction
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF text ON messages BEGIN
+    INSERT INTO messages_fts(messages_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text);
+END;
+"""
+
+_HISTORY_COLUMNS = "m.id, m.direction, m.number, m.text, m.state, m.date, m.reference, m.part, m.parts"
+
+_INSERT_COLUMNS = ('direction', 'number', 'text', 'state', 'date', 'reference', 'part', 'parts',
+                   'recorded_at', 'fingerprint')
+
+
+def normalize_date(value):
+    """'2025-01-19T14:30' style input as the stored 'YYYY-MM-DD HH:MM:SS' form (prefix compare)"""
+    return str(value).strip().replace('T', ' ') if value else None
+
+
+def build_match_query(query):
+    """FTS5 MATCH expression from user input: "quoted phrases", word* prefixes, all terms required.
+
+    Every term is quoted, so characters like + - : in numbers and codes never
+    become FTS5 syntax errors.
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query or ""):
+        if phrase.strip():
+            terms.append('"' + phrase.strip() + '"')
+        elif word:
+            prefix = word.endswith('*')
+            word = word.rstrip('*').replace('"', '')
+            if word:
+                terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return " ".join(terms)
+
+
+class MessageStore:
+    """Archive of received and sent SMS, path None disables it"""
+
+    def __init__(self, path=MESSAGE_DB, retention_days=RETENTION_DAYS, flush_interval=FLUSH_INTERVAL,
+                 batch_size=BATCH_SIZE):
+        self.path = path
+        self.retention_days = retention_days
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer = None
+        self._reader = None
+        self._running = False
+        self._thread = None
+        self._last_prune = 0.0
+        self.search_available = False
+
+    @property
+    def enabled(self):
+        return self._writer is not None
+
+    def _open(self):
+        try:
+            self._writer = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._writer.execute("PRAGMA journal_mode=WAL")
+            self._writer.execute("PRAGMA synchronous=NORMAL")  # WAL keeps this crash safe, fsync per checkpoint
+            self._writer.executescript(SCHEMA)
+            self._create_search_index()
+            # Separate connection: with WAL, history reads don't wait for a batch being written
+            self._reader = sqlite3.connect(self.path, check_same_thread=False)
+            self._reader.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            logger.error(f"Could not open message history {self.path}: {e}")
+            self.close()
+
+    def _create_search_index(self):
+        """Create the FTS5 index, filling it from messages archived before it existed"""
+        existed = self._writer.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'").fetchone()
+        try:
+            self._writer.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search unavailable (SQLite without FTS5?): {e}")
+            return
+        if not existed:
+            self._writer.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+        self.search_available = True
+
+    def start(self):
+        """Open the database and start the batch writer"""
+        if self._thread is not None or not self.path:
+            return
+        if not self.enabled:
+            self._open()
+            if not self.enabled:
+                return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="message-store", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop writer and write what is still pending"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def close(self):
+        self.stop()
+        for connection in (self._writer, self._reader):
+            if connection is not None:
+                connection.close()
+        self._writer = self._reader = None
+
+    def _queue(self, rows):
+        if not self.enabled or not rows:
+            return
+        with self._condition:
+            self._pending.extend(rows)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def record_received(self, messages):
+        """Archive SMS as returned by retrieveAllSms; messages seen again only update their state"""
+        now = time.time()
+        rows = []
+        for sms in messages:
+            number, date, text = sms.get("Number"), sms.get("Date") or "", sms.get("Text") or ""
+            fingerprint = hashlib.sha1(f"in|{number}|{date}|{text}".encode('utf-8')).hexdigest()
+            parts = len(sms.get("Locations") or []) or None
+            rows.append((DIRECTION_IN, number, text, sms.get("State"), date, None, None, parts, now, fingerprint))
+        self._queue(rows)
+
+    def record_sent(self, message, reference):
+        """Archive one SMS part accepted by the network (message as passed to SendSMS)"""
+        udh = message.get("UDH") or {}
+        all_parts = udh.get("AllParts") or 0
+        part, parts = (udh.get("PartNumber"), all_parts) if all_parts > 1 else (1, 1)
+        self._queue([(DIRECTION_OUT, message.get("Number"), message.get("Text") or "", "Sent",
+                      time.strftime("%Y-%m-%d %H:%M:%S"), reference, part, parts, time.time(), None)])
+
+    def flush(self):
+        """Write pending rows in one transaction, returns False when they could not be written"""
+        with self._condition:
+            rows = list(self._pending)
+            self._pending.clear()
+        if not rows or not self.enabled:
+            return True
+        placeholders = ", ".join("?" for _ in _INSERT_COLUMNS)
+        with self._write_lock:
+            try:
+                self._writer.execute("BEGIN")
+                self._writer.executemany(
+                    f"INSERT INTO messages ({', '.join(_INSERT_COLUMNS)}) VALUES ({placeholders}) "
+                    f"ON CONFLICT(fingerprint) DO UPDATE SET state = excluded.state", rows)
+                self._writer.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self._writer.in_transaction:
+                    self._writer.execute("ROLLBACK")
+                logger.error(f"Could not write {len(rows)} message(s) to history: {e}")
+                return False
+        return True
+
+    def prune(self, now=None):
+        """Delete messages older than the retention period, returns number removed"""
+        if not self.enabled or not self.retention_days:
+            return 0
+        now = time.time() if now is None else now
+        with self._write_lock:
+            try:
+                cursor = self._writer.execute("DELETE FROM messages WHERE recorded_at < ?",
+                                              (now - self.retention_days * 86400,))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not prune message history: {e}")
+                return 0
+        if cursor.rowcount:
+            logger.info(f"Removed {cursor.rowcount} message(s) older than {self.retention_days} days from history")
+        return cursor.rowcount
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._running and len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                running = self._running
+            self.flush()
+            if not running:
+                break
+            if time.time() - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = time.time()
+                self.prune()
+
+    @staticmethod
+    def _filters(direction=None, number=None, state=None, since=None, until=None):
+        """SQL conditions on messages (alias m) and their parameters"""
+        clauses, params = [], []
+        for column, value in (("direction", direction), ("number", number), ("state", state)):
+            if value:
+                clauses.append(f"m.{column} = ?")
+                params.append(value)
+        if since:
+            clauses.append("m.date >= ?")
+            params.append(normalize_date(since))
+        if until:
+            # Prefix compare: until=2025-01-19 includes the whole day
+            clauses.append("m.date <= ?")
+            params.append(normalize_date(until) + "\uffff")
+        return clauses, params
+
+    def _query(self, sql, params, limit, offset):
+        # Callers expect to see what was just received or sent
+        self.flush()
+        params = list(params) + [max(1, min(int(limit), MAX_HISTORY_LIMIT)), max(0, int(offset))]
+        with self._read_lock:
+            rows = self._reader.execute(f"{sql} LIMIT ? OFFSET ?", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def history(self, direction=None, number=None, state=None, since=None, until=None, limit=100, offset=0):
+        """Archived messages, newest first"""
+        if not self.enabled:
+            return []
+        clauses, params = self._filters(direction, number, state, since, until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT {_HISTORY_COLUMNS} FROM messages m {where} ORDER BY m.date DESC, m.id DESC",
+                           params, limit, offset)
+
+    def search(self, q, direction=None, number=None, state=None, since=None, until=None, limit=20, offset=0):
+        """Archived messages matching q, best match first (ValueError for an empty query)"""
+        match = build_match_query(q)
+        if not match:
+            raise ValueError("Search query is empty")
+        if not self.enabled or not self.search_available:
+            return []
+        clauses, params = self._filters(direction, number, state, since, until)
+        where = "".join(f" AND {clause}" for clause in clauses)
+        return self._query(
+            f"SELECT {_HISTORY_COLUMNS}, -bm25(messages_fts) AS score, "
+            f"snippet(messages_fts, 0, '[', ']', '…', 12) AS snippet "
+            f"FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+            f"WHERE messages_fts MATCH ?{where} ORDER BY bm25(messages_fts), m.date DESC",
+            [match] + params, limit, offset)
@@ -0,0 +1,375 @@
+"""
+Modem auto-discovery for SMS Gammu Gateway
+Probes USB modem ports in parallel with short AT command timeouts, identifies
+the port that answers (IMEI, manufacturer, model) and caches the result under
+/data so later boots check the known port first. Only ports of known modem
+makers (USB vendor/product id) or ports the user listed are probed, and ports
+another program holds or has locked are skipped before their settings are touched.
+"""
+
+import os
+import glob
+import json
+import time
+import errno
+import fcntl
+import array
+import select
+import logging
+import termios
+import tty
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+MODEM_PORT_CACHE = '/data/modem_port.json'
+AUTO_DEVICE_PATH = 'auto'
+
+# Zigbee/Z-Wave coordinators sit on the same ttyUSB/ttyACM names (CP210x, CH340, FTDI bridges) and
+# ports other add-ons have open aren't visible from this container, so only known modems are probed
+CANDIDATE_PATTERNS = ('/dev/ttyUSB*', '/dev/ttyACM*')
+SERIAL_BY_ID_DIR = '/dev/serial/by-id'
+SYS_TTY_DIR = '/sys/class/tty'
+LOCK_DIRS = ('/var/lock', '/run/lock')
+# USB vendor ids of GSM modem makers, with the modem product ids for vendors that also make other devices
+MODEM_USB_IDS = {
+    '12d1': None,  # Huawei
+    '19d2': None,  # ZTE
+    '2c7c': None,  # Quectel
+    '1199': None,  # Sierra Wireless
+    '1bc7': None,  # Telit
+    '1e0e': None,  # SIMCom
+    '2cb7': None,  # Fibocom
+    '1e2d': None,  # Cinterion
+    '114f': None,  # Wavecom
+    '0681': None,  # Siemens
+    '1410': None,  # Novatel
+    '05c6': ('9003', '9215'),  # Qualcomm reference ids of Quectel UC20/EC20
+}
+TIOCGEXCL = getattr(termios, 'TIOCGEXCL', 0x80045440)  # _IOR('T', 0x40, int), missing from older Pythons
+
+PROBE_TIMEOUT = 1.5  # Seconds for one AT command, ports that don't speak AT stay silent
+PROBE_BAUDRATE = termios.B115200
+
+
+def candidate_ports():
+    """USB serial ports whose vendor/product id belongs to a known GSM modem"""
+    ports = []
+    for pattern in CANDIDATE_PATTERNS:
+        for path in sorted(glob.glob(pattern), key=_port_sort_key):
+            vendor, product = usb_id(path)
+            if is_modem_usb_id(vendor, product):
+                ports.append(path)
+            else:
+                usb = f"USB {vendor}:{product}" if vendor else "no USB id"
+                logger.info(f"Not probing {path} ({usb}, not a known modem; list it in modem_probe_ports to probe it)")
+    return ports
+
+
+def is_modem_usb_id(vendor, product):
+    """USB vendor/product id belongs to a known GSM modem"""
+    if vendor not in MODEM_USB_IDS:
+        return False
+    products = MODEM_USB_IDS[vendor]
+    return products is None or product in products
+
+
+def usb_id(port):
+    """USB (vendor, product) id (e.g. ('12d1', '1001')) of the device behind a tty, (None, None) when unknown"""
+    device = os.path.realpath(os.path.join(SYS_TTY_DIR, os.path.basename(os.path.realpath(port)), 'device'))
+    for _ in range(4):  # Interface -> USB device
+        try:
+            with open(os.path.join(device, 'idVendor'), 'r', encoding='ascii') as vendor_file:
+                vendor = vendor_file.read().strip().lower()
+            with open(os.path.join(device, 'idProduct'), 'r', encoding='ascii') as product_file:
+                return vendor, product_file.read().strip().lower()
+        except OSError:
+            device = os.path.dirname(device)
+    return None, None
+
+
+def _port_sort_key(path):
+    """ttyUSB2 before ttyUSB10"""
+    base = path.rstrip('0123456789')
+    number = path[len(base):]
+    return base, int(number) if number else -1
+
+
+def stable_port_name(port):
+    """/dev/serial/by-id link of a port (survives USB renumbering), or None"""
+    real_port = os.path.realpath(port)
+    for link in glob.glob(os.path.join(SERIAL_BY_ID_DIR, '*')):
+        if os.path.realpath(link) == real_port:
+            return link
+    return None
+
+
+class PortBusy(OSError):
+    """Another program has the port open or locked"""
+
+
+def _lock_file_owner(port):
+    """PID of a running process holding a UUCP lock file (/var/lock/LCK..ttyUSB0) for port, or None"""
+    for lock_dir in LOCK_DIRS:
+        try:
+            with open(os.path.join(lock_dir, f"LCK..{os.path.basename(port)}"), 'r', encoding='ascii') as lock_file:
+                pid = int(lock_file.read().strip() or 0)
+        except (OSError, ValueError):
+            continue
+        if pid and pid != os.getpid() and os.path.exists(f"/proc/{pid}"):
+            return pid
+    return None
+
+
+def _open_by_other_process(port):
+    """PID of another process (visible from this container) with port open, or None"""
+    real_port = os.path.realpath(port)
+    for fd_dir in glob.glob('/proc/[0-9]*/fd'):
+        pid = int(fd_dir.split('/')[2])
+        if pid == os.getpid():
+            continue
+        try:
+            for fd in os.listdir(fd_dir):
+                if os.readlink(os.path.join(fd_dir, fd)) == real_port:
+                    return pid
+        except OSError:
+            continue  # Process gone or not ours to inspect
+    return None
+
+
+def _claim(fd, port):
+    """Take the port exclusively, PortBusy when someone else has it (nothing is changed on the port then)"""
+    excl = array.array('i', [0])
+    try:
+        fcntl.ioctl(fd, TIOCGEXCL, excl, True)
+    except OSError:
+        pass  # Not a tty or kernel without TIOCGEXCL, O_EXCL and flock still apply
+    if excl[0]:
+        raise PortBusy(errno.EBUSY, "opened in exclusive mode by another program", port)
+    try:
+        # Lock taken by pyserial (exclusive=True), ModemManager and gammu
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        raise PortBusy(errno.EBUSY, "locked by another program", port)
+    try:
+        fcntl.ioctl(fd, termios.TIOCEXCL)
+    except OSError:
+        pass  # Not a tty, nobody else can share it the tty way either
+
+
+def _release(fd):
+    try:
+        fcntl.ioctl(fd, termios.TIOCNXCL)
+    except OSError:
+        pass
+    os.close(fd)
+
+
+def _open_port(port):
+    """Claim serial port and set it raw at 115200 without becoming its controlling terminal.
+
+    Raises PortBusy without touching the port's settings when another
+    program has it open or locked.
+    """
+    pid = _lock_file_owner(port) or _open_by_other_process(port)
+    if pid:
+        raise PortBusy(errno.EBUSY, f"in use by process {pid}", port)
+    try:
+        # O_EXCL fails with EBUSY on a tty another program put in exclusive mode (TIOCEXCL)
+        fd = os.open(port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK | os.O_EXCL)
+    except OSError as e:
+        if e.errno == errno.EBUSY:
+            raise PortBusy(errno.EBUSY, "opened in exclusive mode by another program", port)
+        raise
+    try:
+        _claim(fd, port)
+    except Exception:
+        os.close(fd)
+        raise
+    try:
+        tty.setraw(fd)
+        attrs = termios.tcgetattr(fd)
+        attrs[4] = attrs[5] = PROBE_BAUDRATE  # ispeed, ospeed
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        termios.tcflush(fd, termios.TCIOFLUSH)
+    except termios.error:
+        # Not a tty (or a pty that refuses speed changes), plain read/write still works
+        pass
+    except Exception:
+        _release(fd)
+        raise
+    return fd
+
+
+def at_command(fd, command, timeout=PROBE_TIMEOUT):
+    """Send AT command, returns (ok, response lines without echo and final result)"""
+    os.write(fd, (command + "\r").encode('ascii'))
+    deadline = time.monotonic() + timeout
+    buffer = b""
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, []
+        readable, _, _ = select.select([fd], [], [], remaining)
+        if not readable:
+            return False, []
+        try:
+            chunk = os.read(fd, 256)
+        except BlockingIOError:
+            continue
+        if not chunk:
+            return False, []
+        buffer += chunk
+        lines = [line.strip() for line in buffer.decode('ascii', 'replace').replace('\r', '\n').split('\n')]
+        lines = [line for line in lines if line]
+        for index, line in enumerate(lines):
+            if line == "OK" or line == "ERROR" or line.startswith("+CME ERROR") or line.startswith("+CMS ERROR"):
+                body = [item for item in lines[:index] if item != command]
+                return line == "OK", body
+
+
+def _first_value(lines, prefix=""):
+    """First response line with optional '+CGMI:' style prefix removed"""
+    for line in lines:
+        if prefix and line.startswith(prefix):
+            line = line[len(prefix):].strip()
+        if line:
+            return line.strip('"')
+    return None
+
+
+def probe_port(port, timeout=PROBE_TIMEOUT):
+    """Check if port answers AT commands, returns modem identity dict or None"""
+    started = time.monotonic()
+    try:
+        fd = _open_port(port)
+    except PortBusy as e:
+        logger.info(f"Skipping {port}: {e.strerror}")
+        return None
+    except OSError as e:
+        logger.debug(f"Cannot open {port}: {e}")
+        return None
+    try:
+        # Two short tries: the first may only flush garbage left in the modem's buffer
+        ok, _ = at_command(fd, "AT", timeout / 2)
+        if not ok:
+            ok, _ = at_command(fd, "AT", timeout / 2)
+        if not ok:
+            logger.debug(f"No AT response on {port}")
+            return None
+        _, imei = at_command(fd, "AT+CGSN", timeout)
+        _, manufacturer = at_command(fd, "AT+CGMI", timeout)
+        _, model = at_command(fd, "AT+CGMM", timeout)
+        # Read-only query, answered only by ports that can handle SMS
+        sms_capable, _ = at_command(fd, "AT+CPMS?", timeout)
+        return {
+            "port": port,
+            "imei": _first_value(imei, "+CGSN:"),
+            "manufacturer": _first_value(manufacturer, "+CGMI:"),
+            "model": _first_value(model, "+CGMM:"),
+            "sms": sms_capable,
+            "probe_ms": int((time.monotonic() - started) * 1000),
+        }
+    except OSError as e:
+        logger.debug(f"Probing {port} failed: {e}")
+        return None
+    finally:
+        _release(fd)
+
+
+def load_cached_port(path=MODEM_PORT_CACHE):
+    """Modem found on a previous boot, or None"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as cache_file:
+            cached = json.load(cache_file)
+        return cached if isinstance(cached, dict) and cached.get("port") else None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read modem port cache {path}: {e}")
+        return None
+
+
+def save_cached_port(modem, path=MODEM_PORT_CACHE):
+    """Persist detected modem atomically"""
+    if not path:
+        return
+    entry = dict(modem)
+    entry["stable_port"] = stable_port_name(modem["port"])
+    entry["detected_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(entry, cache_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not save modem port cache {path}: {e}")
+
+
+def forget_cached_port(path=MODEM_PORT_CACHE):
+    """Drop cached port (e.g. gammu could not initialize it)"""
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove modem port cache {path}: {e}")
+
+
+def _cached_candidates(cached):
+    """Ports to check for a cached modem: by-id link first (USB numbering may have changed)"""
+    ports = []
+    for key in ("stable_port", "port"):
+        port = cached.get(key)
+        if port and os.path.exists(port):
+            real_port = os.path.realpath(port)
+            if real_port not in ports:
+                ports.append(real_port)
+    return ports
+
+
+def _rank(modem, order):
+    """SMS capable ports first, then candidate order"""
+    return (not modem["sms"], order.index(modem["port"]))
+
+
+def discover_modem(candidates=None, cache_path=MODEM_PORT_CACHE, timeout=PROBE_TIMEOUT):
+    """Find the AT port of a GSM modem, trying the cached port before probing all ports in parallel.
+
+    Only the given candidates (the user's port list) or, without them, ports
+    of known modems are ever probed, also when the cached port is checked.
+    """
+    started = time.monotonic()
+    ports = list(candidates) if candidates else candidate_ports()
+    allowed = {os.path.realpath(port) for port in ports}
+    cached = load_cached_port(cache_path)
+    if cached:
+        for port in _cached_candidates(cached):
+            if port not in allowed:
+                continue  # USB renumbering may have put another device on the cached name
+            modem = probe_port(port, timeout)
+            if modem and (not cached.get("imei") or modem["imei"] == cached["imei"]):
+                logger.info(f"📡 Modem found on cached port {port} in {int((time.monotonic() - started) * 1000)} ms")
+                if port != cached.get("port"):
+                    save_cached_port(modem, cache_path)
+                return modem
+        logger.info(f"Cached modem port {cached.get('port')} does not answer, probing all ports")
+
+    if not ports:
+        logger.error("No known modem ports found for auto-detection (set modem_probe_ports to probe other ports)")
+        return None
+    logger.info(f"Probing {len(ports)} serial port(s) for a modem: {', '.join(ports)}")
+    with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="modem-probe") as executor:
+        results = list(executor.map(lambda port: probe_port(port, timeout), ports))
+    found = [modem for modem in results if modem]
+    for modem in found:
+        logger.info(f"   {modem['port']}: {modem['manufacturer']} {modem['model']} "
+                    f"(IMEI {modem['imei']}, SMS: {'yes' if modem['sms'] else 'no'})")
+    if not found:
+        logger.error(f"No modem answered AT commands on {', '.join(ports)}")
+        return None
+
+    modem = min(found, key=lambda item: _rank(item, ports))
+    logger.info(f"📡 Using modem port {modem['port']} (detected in {int((time.monotonic() - started) * 1000)} ms)")
+    save_cached_port(modem, cache_path)
+    return modem
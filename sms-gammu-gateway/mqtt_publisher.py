@@ -7,12 +7,35 @@ import json
 import time
 import logging
 import threading
-from typing import Optional, Dict, Any
-import paho.mqtt.client as mqtt
-from support import encodeSms, message_requires_unicode
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, TYPE_CHECKING
+from support import encodeSms, message_requires_unicode, is_status_report, deleteSms, retrieveAllSms
+from idempotency import request_fingerprint, STATUS_IN_PROGRESS
+from retry_policy import RetryPolicy, RetryingSender, SmsSendError, describe_gammu_error
+from serialization import dumps
+from sim_storage import storage_occupancy, LEVEL_ALERT, LEVEL_FULL
+from log_queue import Phone, Body
+from sms_routing import ACTION_MQTT, ACTION_WEBHOOK, ACTION_REPLY, ACTION_DROP
+from task_scheduler import ModemTaskScheduler
+
+if TYPE_CHECKING:
+    import paho.mqtt.client as mqtt  # Imported in connect() only when MQTT is enabled
 
 logger = logging.getLogger(__name__)
 
+MACHINE_READY_TIMEOUT = 30  # Seconds an SMS send command waits for modem init at startup
+# Settings the MQTT client is built from, changing any of them reconnects
+MQTT_CONNECTION_KEYS = ('mqtt_enabled', 'mqtt_host', 'mqtt_port', 'mqtt_username', 'mqtt_password',
+                        'mqtt_topic_prefix')
+# Background modem tasks, all run by one ModemTaskScheduler
+TASK_INBOX = 'inbox'
+TASK_SIGNAL = 'signal'
+TASK_NETWORK = 'network'
+TASK_STORAGE = 'storage'
+TASK_HEARTBEAT = 'device_status'
+STATUS_CHECK_INTERVAL = 300  # Signal and network
+DEVICE_HEARTBEAT_INTERVAL = 60
+
 class DeviceConnectivityTracker:
     """Tracks USB GSM device connectivity status based on gammu communication"""
     
@@ -23,6 +46,9 @@ class DeviceConnectivityTracker:
         self.offline_timeout = offline_timeout_seconds
         self.total_operations = 0
         self.successful_operations = 0
+        self.send_retries = 0  # SMS part re-sends after transient errors
+        self.send_retries_by_outcome = {"sent": 0, "transient": 0, "permanent": 0}  # Same re-sends, by how the part ended
+        self.send_failures = {"transient": 0, "permanent": 0}  # Parts given up, by error class
         
     def record_success(self):
         """Record successful gammu operation"""
@@ -38,6 +64,18 @@ class DeviceConnectivityTracker:
         self.last_error = str(error_message) if error_message else "Communication failed"
         self.total_operations += 1
         
+    def record_send_retry(self):
+        """Record SMS part retry after an error the retry policy retries"""
+        self.send_retries += 1
+
+    def record_send_outcome(self, outcome, retries):
+        """Record how a retried SMS part ended ('sent' or the error class it was given up with)"""
+        self.send_retries_by_outcome[outcome] = self.send_retries_by_outcome.get(outcome, 0) + retries
+
+    def record_send_failure(self, error_class):
+        """Record SMS part that could not be sent after applying retry policy"""
+        self.send_failures[error_class] = self.send_failures.get(error_class, 0) + 1
+        
     def get_status(self):
         """Get current device connectivity status"""
         if self.last_success_time is None:
@@ -58,7 +96,10 @@ class DeviceConnectivityTracker:
             "consecutive_failures": self.consecutive_failures,
             "total_operations": self.total_operations,
             "successful_operations": self.successful_operations,
-            "last_error": self.last_error
+            "last_error": self.last_error,
+            "send_retries": self.send_retries,
+            "send_retries_by_outcome": dict(self.send_retries_by_outcome),
+            "send_failures": dict(self.send_failures)
         }
         
         if self.last_success_time:
@@ -73,25 +114,181 @@ class DeviceConnectivityTracker:
 class MQTTPublisher:
     def __init__(self, config: Dict[str, Any]):
         self.config = config
-        self.client: Optional[mqtt.Client] = None
+        self.client: Optional["mqtt.Client"] = None
         self.connected = False
+        self.connected_event = threading.Event()  # Set while connected to the broker
+        self.machine_ready = threading.Event()  # Set once gammu machine is initialized
+        self.last_status = {}  # Last known signal/network state, also restored from retained MQTT state
         self.topic_prefix = config.get('mqtt_topic_prefix', 'homeassistant/sensor/sms_gateway')
         self.gammu_machine = None  # Will be set externally
         self.current_phone_number = ""  # Current phone number from text input
         self.current_message_text = ""  # Current message text from text input
         self.device_tracker = DeviceConnectivityTracker()  # USB device connectivity tracking
+        self.idempotency_store = None  # Will be set externally
+        self.delivery_tracker = None  # Will be set externally
+        self.gammu_recorder = None  # Gammu trace recording (set externally)
+        self.gammu_replayer = None  # Gammu trace replay instead of modem (set externally)
+        self.event_listeners = []  # Callables (event_type, data) notified of gateway events, e.g. webhooks
+        self.event_consumers = []  # Callables returning True while someone besides MQTT wants modem events
+        self.inbox_queue = None  # Hands monitored SMS to /sms/getsms clients (set externally)
+        self.reassembly_buffer = None  # Holds incomplete multipart SMS on the SIM (set externally)
+        self.send_scheduler = None  # Sends with send_at/window go here (set externally)
+        self.message_store = None  # History of received SMS and sent parts (set externally)
+        self.storage_watermarks = None  # SIM/phone memory offloading policy (set externally)
+        self.gammu_debug_capture = None  # In-memory gammu debug trace, dumped on failures (set externally)
+        self.signal_history = None  # Signal/network samples for /status/history (set externally)
+        self.sms_router = None  # Routing rules for received SMS (set externally)
+        self.modem_worker = None  # Single thread running tracked gammu calls (asyncio runtime, set externally)
+        self.mqtt_runner = None  # Drives the client from an event loop instead of paho's thread (asyncio runtime)
+        # Received messages are handled here in arrival order, a send command must not block the network thread
+        self._commands = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mqtt-commands")
+        self.inbox_lock = threading.Lock()  # One reader at a time takes SMS off the SIM, no double delivery
+        self.sms_check_interval = config.get('sms_check_interval', 60)
+        self._last_sms_count = 0  # SMS still on the SIM after the last monitoring round
+        self.task_scheduler = ModemTaskScheduler(self.wait_for_machine)  # Inbox, signal, network, storage polls
+        self.retrying_sender = RetryingSender(self._retry_policy(config), self.device_tracker)
         
         if config.get('mqtt_enabled', False):
             self._setup_client()
     
+    @staticmethod
+    def _retry_policy(config):
+        return RetryPolicy(
+            max_attempts=config.get('send_retry_attempts', 4),
+            base_delay=config.get('send_retry_base_delay', 2),
+            max_delay=config.get('send_retry_max_delay', 30),
+        )
+
+    def reconfigure(self, config):
+        """Apply reloaded settings, the MQTT client is rebuilt only when its connection settings changed"""
+        old_config = self.config
+        self.config = config
+        self.sms_check_interval = config.get('sms_check_interval', 60)
+        self.task_scheduler.set_interval(TASK_INBOX, self.sms_check_interval)
+        self.task_scheduler.set_enabled(TASK_INBOX, config.get('sms_monitoring_enabled', True))
+        for task in (TASK_SIGNAL, TASK_NETWORK):
+            self.task_scheduler.set_interval(task, config.get('status_check_interval', STATUS_CHECK_INTERVAL))
+        self.retrying_sender.policy = self._retry_policy(config)
+        if all(old_config.get(key) == config.get(key) for key in MQTT_CONNECTION_KEYS):
+            return False
+        self.disconnect()
+        self.client = None
+        self.connected = False
+        self.connected_event.clear()
+        self.topic_prefix = config.get('mqtt_topic_prefix', 'homeassistant/sensor/sms_gateway')
+        if config.get('mqtt_enabled', False):
+            self._setup_client()
+        return True
+
     def set_gammu_machine(self, machine):
         """Set gammu machine for SMS sending"""
         self.gammu_machine = machine
+        self.machine_ready.set()
         logger.info("Gammu machine set for MQTT SMS sending")
+
+    def detach_gammu_machine(self):
+        """Modem is being re-initialized, loops and sends wait for the new machine"""
+        self.machine_ready.clear()
+        self.gammu_machine = None
+
+    def wait_for_machine(self, timeout=None):
+        """Wait until gammu machine is initialized, returns it or None on timeout"""
+        if self.machine_ready.wait(timeout):
+            return self.gammu_machine
+        return None
+
+    def wait_connected(self, timeout=None):
+        """Wait for MQTT broker connection, returns True when connected"""
+        return self.connected_event.wait(timeout)
+
+    def set_idempotency_store(self, store):
+        """Set idempotency store used to de-duplicate MQTT send commands by payload id"""
+        self.idempotency_store = store
     
+    def set_delivery_tracker(self, tracker):
+        """Set tracker correlating status reports with sent messages"""
+        self.delivery_tracker = tracker
+
+    def set_inbox_queue(self, queue):
+        """Set queue receiving SMS picked up by the monitor loop"""
+        self.inbox_queue = queue
+
+    def set_reassembly_buffer(self, buffer):
+        """Set buffer deciding when incomplete multipart SMS are handed out"""
+        self.reassembly_buffer = buffer
+
+    def set_send_scheduler(self, scheduler):
+        """Set scheduler for MQTT send commands with send_at or window"""
+        self.send_scheduler = scheduler
+
+    def set_message_store(self, store):
+        """Set store archiving received SMS and sent parts"""
+        self.message_store = store
+
+    def set_signal_history(self, history):
+        """Set signal/network history, fed from signal and network events and polled for without consumers"""
+        self.signal_history = history
+        self.add_event_listener(history.on_event)
+
+    def set_sms_router(self, router):
+        """Set routing rules applied to SMS picked up by SMS monitoring"""
+        self.sms_router = router
+
+    def set_modem_worker(self, worker):
+        """Set worker whose thread runs every tracked gammu call"""
+        self.modem_worker = worker
+
+    def set_mqtt_runner(self, runner):
+        """Hand the MQTT client (now and after reconnects) to an event loop runner, stopping paho's thread"""
+        self.mqtt_runner = runner
+        if self.client is not None:
+            self.client.loop_stop()
+            runner.attach(self.client)
+
+    def set_storage_watermarks(self, watermarks):
+        """Set policy for offloading read SMS when SMS memory fills up"""
+        self.storage_watermarks = watermarks
+
+    def set_gammu_debug_capture(self, capture):
+        """Set gammu debug capture that is dumped when an operation fails"""
+        self.gammu_debug_capture = capture
+
+    def set_gammu_trace(self, recorder=None, replayer=None):
+        """Set gammu trace recorder or replayer used by track_gammu_operation"""
+        self.gammu_recorder = recorder
+        self.gammu_replayer = replayer
+
+    def add_event_listener(self, listener):
+        """Register callable(event_type, data) for sms_received, send_status, delivery_status,
+        device_status, signal and network events"""
+        self.event_listeners.append(listener)
+
+    def add_event_consumer(self, is_active):
+        """Register callable telling whether SMS/status polling is needed without MQTT (webhooks, SSE clients)"""
+        self.event_consumers.append(is_active)
+
+    def emit_event(self, event_type, data):
+        """Notify event listeners (independent of MQTT connection state)"""
+        for listener in self.event_listeners:
+            try:
+                listener(event_type, data)
+            except Exception as e:
+                logger.warning(f"Event listener failed for {event_type}: {e}")
+
+    def delivery_reports_requested(self, explicit_flag=None):
+        """Decide whether status reports should be requested for a send"""
+        if self.delivery_tracker is None:
+            return False
+        if explicit_flag is None:
+            return bool(self.config.get('delivery_reports', False))
+        if isinstance(explicit_flag, (bool, int, float)):
+            return bool(explicit_flag)
+        return str(explicit_flag).lower() in ('1', 'true', 'yes', 'on')
+
     def _setup_client(self):
         """Setup MQTT client with configuration"""
         try:
+            import paho.mqtt.client as mqtt
             self.client = mqtt.Client()
             
             # Set credentials if provided
@@ -104,15 +301,20 @@ class MQTTPublisher:
             self.client.on_connect = self._on_connect
             self.client.on_disconnect = self._on_disconnect
             self.client.on_publish = self._on_publish
-            self.client.on_message = self._on_message
+            self.client.on_message = self._queue_message
             
             # Connect to broker
             host = self.config.get('mqtt_host', 'core-mosquitto')
             port = self.config.get('mqtt_port', 1883)
             
+            # Connect from the network thread so startup doesn't wait for the broker
+            # (paho keeps retrying until it is reachable)
             logger.info(f"Connecting to MQTT broker: {host}:{port}")
-            self.client.connect(host, port, 60)
-            self.client.loop_start()
+            self.client.connect_async(host, port, 60)
+            if self.mqtt_runner is not None:
+                self.mqtt_runner.attach(self.client)
+            else:
+                self.client.loop_start()
             
         except Exception as e:
             logger.error(f"Failed to setup MQTT client: {e}")
@@ -122,6 +324,9 @@ class MQTTPublisher:
         if rc == 0:
             self.connected = True
             logger.info("Connected to MQTT broker")
+            # Retained signal/network state from the last run answers REST until the modem is up
+            client.subscribe(f"{self.topic_prefix}/signal/state")
+            client.subscribe(f"{self.topic_prefix}/network/state")
             self._publish_discovery_configs()
             # Subscribe to SMS send command topic
             send_topic = f"{self.topic_prefix}/send"
@@ -144,24 +349,33 @@ class MQTTPublisher:
             client.subscribe(phone_state_topic)  # Subscribe to state topics too
             client.subscribe(message_state_topic)
             logger.info(f"Subscribed to text input topics: {phone_topic}, {message_topic}, {phone_state_topic}, {message_state_topic}")
+            self.connected_event.set()
         else:
             logger.error(f"Failed to connect to MQTT broker: {rc}")
     
     def _on_disconnect(self, client, userdata, rc):
         """Callback for MQTT disconnection"""
         self.connected = False
+        self.connected_event.clear()
         logger.warning("Disconnected from MQTT broker")
     
     def _on_publish(self, client, userdata, mid):
         """Callback for published messages"""
         pass
     
+    def _queue_message(self, client, userdata, msg):
+        """Callback for received MQTT messages, handled on the command thread"""
+        self._commands.submit(self._on_message, client, userdata, msg)
+
     def _on_message(self, client, userdata, msg):
-        """Callback for received MQTT messages"""
+        """Handle a received MQTT message (may wait for the modem and send SMS)"""
         try:
             topic = msg.topic
             payload = msg.payload.decode('utf-8')
-            logger.info(f"Received MQTT message on topic {topic}: {payload}")
+            if topic in (f"{self.topic_prefix}/signal/state", f"{self.topic_prefix}/network/state"):
+                self._remember_status(topic, payload)
+                return
+            logger.info("Received MQTT message on topic %s: %s", topic, Body(payload))
             
             # Check message topic and handle accordingly
             send_topic = f"{self.topic_prefix}/send"
@@ -180,20 +394,20 @@ class MQTTPublisher:
                 # Phone number updated via command topic
                 self.current_phone_number = payload
                 self._publish_phone_state(payload)
-                logger.info(f"Phone number updated via command: {payload}")
+                logger.info("Phone number updated via command: %s", Phone(payload))
             elif topic == message_topic:
                 # Message text updated via command topic
                 self.current_message_text = payload
                 self._publish_message_state(payload)
-                logger.info(f"Message text updated via command: {payload}")
+                logger.info("Message text updated via command: %s", Body(payload))
             elif topic == phone_state_topic:
                 # Phone number state received (sync with HA)
                 self.current_phone_number = payload
-                logger.info(f"Phone number synced from HA state: {payload}")
+                logger.info("Phone number synced from HA state: %s", Phone(payload))
             elif topic == message_state_topic:
                 # Message text state received (sync with HA)
                 self.current_message_text = payload
-                logger.info(f"Message text synced from HA state: {payload}")
+                logger.info("Message text synced from HA state: %s", Body(payload))
                 
         except Exception as e:
             logger.error(f"Error processing MQTT message: {e}")
@@ -229,26 +443,124 @@ class MQTTPublisher:
             text = data.get('text')
             unicode_flag = data.get('unicode')
             unicode_mode = self._determine_unicode_mode(text, unicode_flag)
+            delivery_report = self.delivery_reports_requested(data.get('delivery_report'))
             
             if not number or not text:
                 logger.error("SMS send command missing required fields: number or text")
                 return
             
-            logger.info(f"Processing SMS send command: {number} -> {text} (unicode: {unicode_mode})")
+            if data.get('send_at') is not None or data.get('window') is not None:
+                self._schedule_sms_send(data, number, text, delivery_report)
+                return
+
+            logger.info("Processing SMS send command: %s -> %s (unicode: %s)", Phone(number), Body(text), unicode_mode)
             
-            # Send SMS via gammu machine (will be set externally)
-            if hasattr(self, 'gammu_machine') and self.gammu_machine:
-                self._send_sms_via_gammu(number, text, unicode_mode)
-            else:
+            # Send SMS via gammu machine, commands arriving during startup wait for modem init
+            if not self.wait_for_machine(MACHINE_READY_TIMEOUT):
                 logger.error("Gammu machine not available for SMS sending")
+                return
+
+            request_id = data.get('id')
+            if request_id is None or self.idempotency_store is None:
+                self._send_sms_via_gammu(number, text, unicode_mode, delivery_report=delivery_report)
+                return
+
+            request_id = str(request_id)
+            fingerprint = request_fingerprint(number, text)
+            existing = self.idempotency_store.begin(request_id, fingerprint)
+            if existing is not None:
+                self._publish_duplicate_status(request_id, existing, fingerprint)
+                return
+
+            status_data = None
+            try:
+                status_data = self._send_sms_via_gammu(number, text, unicode_mode, request_id=request_id,
+                                                       delivery_report=delivery_report)
+            finally:
+                if status_data and (status_data.get("status") == "success" or status_data.get("references")):
+                    # Sent (even partially), a retry must not resend parts
+                    self.idempotency_store.complete(request_id, status_data)
+                else:
+                    # Nothing went out, failed sends may be retried with the same id
+                    self.idempotency_store.release(request_id)
                 
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON in SMS send command: {e}")
         except Exception as e:
             logger.error(f"Error handling SMS send command: {e}")
     
-    def _send_sms_via_gammu(self, number, text, unicode_mode=False):
-        """Send SMS using gammu machine"""
+    def _schedule_sms_send(self, data, number, text, delivery_report):
+        """Queue MQTT send command with send_at/window in the scheduler, publishes a 'scheduled' status"""
+        from send_scheduler import parse_send_at, parse_window
+
+        request_id = data.get('id')
+        request_id = str(request_id) if request_id is not None else None
+        fingerprint = request_fingerprint(number, text)
+        if request_id is not None and self.idempotency_store is not None:
+            existing = self.idempotency_store.begin(request_id, fingerprint)
+            if existing is not None:
+                self._publish_duplicate_status(request_id, existing, fingerprint)
+                return
+
+        try:
+            if self.send_scheduler is None:
+                raise ValueError("Scheduled sending is not available")
+            jobs = self.send_scheduler.schedule(
+                [item.strip() for item in str(number).split(',') if item.strip()], text,
+                send_at=parse_send_at(data.get('send_at')), window=parse_window(data.get('window')),
+                unicode=data.get('unicode'), delivery_report=delivery_report, request_id=request_id, source="mqtt",
+            )
+            status_data = {
+                "status": "scheduled",
+                "number": number,
+                "schedule_ids": [job["id"] for job in jobs],
+                "send_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(min(job["due_at"] for job in jobs))),
+            }
+        except (ValueError, OverflowError) as e:
+            logger.error("Cannot schedule SMS to %s: %s", Phone(number), e)
+            status_data = {"status": "error", "error": str(e), "number": number}
+        if request_id is not None:
+            status_data["id"] = request_id
+            if self.idempotency_store is not None:
+                if status_data["status"] == "scheduled":
+                    self.idempotency_store.complete(request_id, status_data)
+                else:
+                    self.idempotency_store.release(request_id)
+        status_data["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.emit_event("send_status", dict(status_data, source="mqtt"))
+        if self.connected:
+            self.client.publish(f"{self.topic_prefix}/send_status", dumps(status_data), retain=False)
+
+    def send_scheduled_job(self, job):
+        """Send a job released by the send scheduler, returns status data like MQTT sends"""
+        if not self.wait_for_machine(MACHINE_READY_TIMEOUT):
+            raise RuntimeError("Gammu machine not available for scheduled SMS")
+        return self._send_sms_via_gammu(job["number"], job["text"], job.get("unicode"), request_id=job["id"],
+                                        delivery_report=job.get("delivery_report"), smsc=job.get("smsc"),
+                                        source="scheduled")
+
+    def _publish_duplicate_status(self, request_id, entry, fingerprint):
+        """Report an MQTT send command whose id was already processed"""
+        if entry.get("fingerprint") and entry["fingerprint"] != fingerprint:
+            status_data = {
+                "status": "error",
+                "error": f"Send id '{request_id}' was already used for a different message",
+            }
+        elif entry.get("status") == STATUS_IN_PROGRESS:
+            status_data = {"status": "in_progress"}
+        else:
+            status_data = {"status": "duplicate", "original": entry.get("result")}
+        status_data["id"] = request_id
+        status_data["timestamp"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        logger.info(f"SMS send id '{request_id}' already seen ({status_data['status']}), not sending again")
+
+        if self.connected:
+            status_topic = f"{self.topic_prefix}/send_status"
+            self.client.publish(status_topic, dumps(status_data), retain=False)
+
+    def _send_sms_via_gammu(self, number, text, unicode_mode=False, request_id=None, delivery_report=None,
+                            smsc=None, source="mqtt"):
+        """Send SMS using gammu machine, returns published status data"""
         try:
             unicode_enabled = self._determine_unicode_mode(text, unicode_mode)
             # Prepare SMS info
@@ -269,59 +581,74 @@ class MQTTPublisher:
             messages = encodeSms(smsinfo)
             for message in messages:
                 # Use same SMSC logic as REST API
-                config_smsc = self.config.get('smsc_number', '').strip()
+                config_smsc = (smsc or self.config.get('smsc_number', '')).strip()
                 if config_smsc:
                     message["SMSC"] = {'Number': config_smsc}
-                    logger.info(f"Using configured SMSC: {config_smsc}")
+                    logger.debug("Using configured SMSC: %s", config_smsc)
                 else:
                     # Use Location 1 (same as REST API when no SMSC provided)
                     message["SMSC"] = {'Location': 1}
-                    logger.info("Using SMSC from Location 1 (same as REST API)")
+                    logger.debug("Using SMSC from Location 1 (same as REST API)")
                 
                 message["Number"] = number
-                result = self.track_gammu_operation("SendSMS", self.gammu_machine.SendSMS, message)
-                logger.info(f"SMS sent successfully: {result}")
+                if delivery_report:
+                    # Submit PDU with status report request
+                    message["Type"] = "Status_Report"
+
+            result = self.send_sms_parts(self.gammu_machine, messages)
+            logger.info("SMS sent successfully to %s: %s", Phone(number), result)
                 
             # Publish confirmation
+            status_data = {
+                "status": "success",
+                "number": number,
+                "text": text,
+                "references": result,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            if request_id is not None:
+                status_data["id"] = request_id
+            if delivery_report:
+                status_data["delivery_id"] = self.delivery_tracker.register(number, result)
+            self.emit_event("send_status", dict(status_data, source=source))
             if self.connected:
                 status_topic = f"{self.topic_prefix}/send_status"
-                status_data = {
-                    "status": "success",
-                    "number": number,
-                    "text": text,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-                self.client.publish(status_topic, json.dumps(status_data, ensure_ascii=False), retain=False)
+                self.client.publish(status_topic, dumps(status_data), retain=False)
+            return status_data
                 
         except Exception as e:
-            error_msg = str(e)
             # Try to extract useful error message from gammu error
-            if "Code': 27" in error_msg:
-                user_error = "SMS sending failed - check SIM card, network signal or device connection"
-            elif "Code': 38" in error_msg:
-                user_error = "Network registration failed - check SIM card and signal"
-            elif "Code': 69" in error_msg:
-                user_error = "SMSC number not found - configure SMS center number in SIM settings"
-            else:
-                user_error = f"SMS sending error: {error_msg}"
+            cause = e.cause if isinstance(e, SmsSendError) else e
+            user_error = describe_gammu_error(cause)
             
-            logger.error(f"Failed to send SMS via gammu: {error_msg}")
+            logger.error(f"Failed to send SMS via gammu: {cause}")
             # Publish error status with user-friendly message
+            status_data = {
+                "status": "error",
+                "error": user_error,
+                "number": number,
+                "text": text,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            if isinstance(e, SmsSendError):
+                status_data["error_class"] = e.error_class
+                status_data["attempts"] = e.attempts
+                status_data["failed_part"] = e.failed_part
+                status_data["total_parts"] = e.total_parts
+                status_data["references"] = e.sent_references
+            if request_id is not None:
+                status_data["id"] = request_id
+            self.emit_event("send_status", dict(status_data, source=source))
             if self.connected:
                 status_topic = f"{self.topic_prefix}/send_status"
-                status_data = {
-                    "status": "error",
-                    "error": user_error,
-                    "number": number,
-                    "text": text,
-                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                }
-                self.client.publish(status_topic, json.dumps(status_data, ensure_ascii=False), retain=False)
+                self.client.publish(status_topic, dumps(status_data), retain=False)
+            return status_data
     
     def _handle_button_sms_send(self):
         """Handle SMS send when button is pressed using current text inputs"""
         # Log current state for debugging
-        logger.info(f"Button pressed - current state: phone='{self.current_phone_number}', message='{self.current_message_text}'")
+        logger.info("Button pressed - current state: phone='%s', message='%s'",
+                    Phone(self.current_phone_number), Body(self.current_message_text))
         
         if not self.current_phone_number.strip() or not self.current_message_text.strip():
             # If fields are empty, show instruction
@@ -332,13 +659,15 @@ class MQTTPublisher:
                     "message": f"Please fill in phone number and message text first. Current: phone='{self.current_phone_number}', message='{self.current_message_text}'",
                     "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
                 }
-                self.client.publish(status_topic, json.dumps(status_data, ensure_ascii=False), retain=False)
-            logger.warning(f"Button pressed but fields empty: phone='{self.current_phone_number}', message='{self.current_message_text}'")
+                self.client.publish(status_topic, dumps(status_data), retain=False)
+            logger.warning("Button pressed but fields empty: phone='%s', message='%s'",
+                           Phone(self.current_phone_number), Body(self.current_message_text))
             return
         
         # Send SMS using current values
         unicode_mode = self._determine_unicode_mode(self.current_message_text, None)
-        logger.info(f"Button SMS send: {self.current_phone_number} -> {self.current_message_text} (unicode: {unicode_mode})")
+        logger.info("Button SMS send: %s -> %s (unicode: %s)",
+                    Phone(self.current_phone_number), Body(self.current_message_text), unicode_mode)
         if hasattr(self, 'gammu_machine') and self.gammu_machine:
             self._send_sms_via_gammu(self.current_phone_number, self.current_message_text, unicode_mode=unicode_mode)
             # Always clear fields after send attempt (success or failure)
@@ -507,6 +836,22 @@ class MQTTPublisher:
             }
         }
         
+        # SMS delivery status sensor
+        delivery_status_config = {
+            "name": "SMS Delivery Status",
+            "unique_id": "sms_gateway_delivery_status",
+            "state_topic": f"{self.topic_prefix}/delivery_status",
+            "value_template": "{{ value_json.state }}",
+            "json_attributes_topic": f"{self.topic_prefix}/delivery_status",
+            "icon": "mdi:message-check",
+            "device": {
+                "identifiers": ["sms_gateway"],
+                "name": "SMS Gateway",
+                "model": "GSM Modem",
+                "manufacturer": "Gammu Gateway"
+            }
+        }
+        
         # Modem Status sensor
         device_status_config = {
             "name": "Modem Status",
@@ -523,77 +868,249 @@ class MQTTPublisher:
             }
         }
         
+        # SMS memory occupancy sensor
+        storage_config = {
+            "name": "SIM SMS Storage",
+            "unique_id": "sms_gateway_storage",
+            "state_topic": f"{self.topic_prefix}/storage/state",
+            "value_template": "{{ value_json.SIMPercent }}",
+            "json_attributes_topic": f"{self.topic_prefix}/storage/state",
+            "unit_of_measurement": "%",
+            "icon": "mdi:sim",
+            "device": {
+                "identifiers": ["sms_gateway"],
+                "name": "SMS Gateway",
+                "model": "GSM Modem",
+                "manufacturer": "Gammu Gateway"
+            }
+        }
+
+        # SMS memory nearly full
+        storage_alert_config = {
+            "name": "SMS Storage Alert",
+            "unique_id": "sms_gateway_storage_alert",
+            "state_topic": f"{self.topic_prefix}/storage/state",
+            "value_template": "{{ 'ON' if value_json.level in ['alert', 'full'] else 'OFF' }}",
+            "device_class": "problem",
+            "device": {
+                "identifiers": ["sms_gateway"],
+                "name": "SMS Gateway",
+                "model": "GSM Modem",
+                "manufacturer": "Gammu Gateway"
+            }
+        }
+
         # Publish discovery configs
         discoveries = [
             ("homeassistant/sensor/sms_gateway_signal/config", signal_config),
             ("homeassistant/sensor/sms_gateway_network/config", network_config),
             ("homeassistant/sensor/sms_gateway_last_sms/config", sms_config),
             ("homeassistant/sensor/sms_gateway_send_status/config", send_status_config),
+            ("homeassistant/sensor/sms_gateway_delivery_status/config", delivery_status_config),
             ("homeassistant/sensor/sms_gateway_modem_status/config", device_status_config),
+            ("homeassistant/sensor/sms_gateway_storage/config", storage_config),
+            ("homeassistant/binary_sensor/sms_gateway_storage_alert/config", storage_alert_config),
             ("homeassistant/button/sms_gateway_send_button/config", button_config),
             ("homeassistant/text/sms_gateway_phone_number/config", phone_text_config),
             ("homeassistant/text/sms_gateway_message_text/config", message_text_config)
         ]
         
         for topic, config in discoveries:
-            self.client.publish(topic, json.dumps(config, ensure_ascii=False), retain=True)
+            self.client.publish(topic, dumps(config), retain=True)
         
         logger.info("Published MQTT discovery configurations including SMS send button")
         
         # Publish initial states immediately after discovery
         self._publish_initial_states()
         
-        # Wait a moment for HA to process discovery, then force empty text fields
-        import time
-        time.sleep(1)
-        self._publish_empty_text_fields()
-        
-        # Give HA another moment to send retained state messages back to us
-        time.sleep(0.5)
+        # Give HA a moment to process discovery, then force empty text fields
+        # (timer instead of sleep keeps the network loop receiving retained states meanwhile)
+        timer = threading.Timer(1.0, self._publish_empty_text_fields)
+        timer.daemon = True
+        timer.start()
     
+    def _remember_status(self, topic, payload):
+        """Keep retained signal/network state from the last run as last known value"""
+        # Needed once per connect, our own publishes would echo back otherwise
+        self.client.unsubscribe(topic)
+        kind = topic.rsplit('/', 2)[-2]
+        if not payload or kind in self.last_status:
+            return
+        try:
+            self.last_status[kind] = json.loads(payload)
+            logger.debug(f"Restored last known {kind} state from MQTT")
+        except ValueError:
+            pass
+
     def publish_signal_strength(self, signal_data: Dict[str, Any]):
         """Publish signal strength data"""
+        self.last_status["signal"] = signal_data
+        self.emit_event("signal", signal_data)
         if not self.connected:
             return
             
         topic = f"{self.topic_prefix}/signal/state"
-        self.client.publish(topic, json.dumps(signal_data, ensure_ascii=False), retain=True)
-        logger.info(f"📡 Published signal strength to MQTT: {signal_data.get('SignalPercent', 'N/A')}%")
+        self.client.publish(topic, dumps(signal_data), retain=True)
+        logger.info("📡 Published signal strength to MQTT: %s%%", signal_data.get('SignalPercent', 'N/A'))
     
     def publish_network_info(self, network_data: Dict[str, Any]):
         """Publish network information"""
+        self.last_status["network"] = network_data
+        self.emit_event("network", network_data)
         if not self.connected:
             return
             
         topic = f"{self.topic_prefix}/network/state"
-        self.client.publish(topic, json.dumps(network_data, ensure_ascii=False), retain=True)
-        logger.info(f"📡 Published network info to MQTT: {network_data.get('NetworkName', 'Unknown')}")
+        self.client.publish(topic, dumps(network_data), retain=True)
+        logger.info("📡 Published network info to MQTT: %s", network_data.get('NetworkName', 'Unknown'))
     
-    def publish_sms_received(self, sms_data: Dict[str, Any]):
-        """Publish received SMS data"""
+    def publish_storage_status(self, occupancy: Dict[str, Any]):
+        """Publish SMS memory occupancy, alert once when it reaches the alert level"""
+        previous = (self.last_status.get("storage") or {}).get("level")
+        self.last_status["storage"] = occupancy
+        self.emit_event("storage", occupancy)
+        level = occupancy.get("level")
+        alerting = level in (LEVEL_ALERT, LEVEL_FULL)
+        if alerting and previous != level:
+            logger.warning(f"⚠️ SMS storage {level}: SIM {occupancy.get('SIMUsed')}/{occupancy.get('SIMSize')}, "
+                           f"phone {occupancy.get('PhoneUsed')}/{occupancy.get('PhoneSize')}")
         if not self.connected:
             return
-            
+
+        self.client.publish(f"{self.topic_prefix}/storage/state", dumps(occupancy), retain=True)
+        if alerting and previous != level:
+            self.client.publish(f"{self.topic_prefix}/storage/alert", dumps(occupancy), retain=False)
+
+    def check_sim_storage(self, gammu_machine):
+        """Read SMS memory occupancy, offload read SMS above the high watermark and publish the result"""
+        status = self.track_gammu_operation("GetSMSStatus", gammu_machine.GetSMSStatus)
+        occupancy = storage_occupancy(status)
+        offloaded = 0
+        if self.storage_watermarks.excess(occupancy) > 0:
+            offloaded = self.offload_read_sms(gammu_machine, occupancy)
+            if offloaded:
+                occupancy = storage_occupancy(self.track_gammu_operation("GetSMSStatus", gammu_machine.GetSMSStatus))
+        occupancy["level"] = self.storage_watermarks.level(occupancy)
+        occupancy["offloaded"] = offloaded
+        self.publish_storage_status(occupancy)
+        return occupancy
+
+    def offload_read_sms(self, gammu_machine, occupancy):
+        """Archive the oldest read SMS in the message history and delete them from the modem, returns count"""
+        if self.message_store is None or not self.message_store.enabled:
+            logger.warning("SMS memory above high watermark, but message history is disabled: nothing offloaded")
+            return 0
+        with self.inbox_lock:
+            all_sms = self.track_gammu_operation("retrieveAllSms", retrieveAllSms, gammu_machine)
+            selected = self.storage_watermarks.select_offload(all_sms, occupancy)
+            if not selected:
+                logger.warning("SMS memory above high watermark, but there are no read SMS to offload")
+                return 0
+            self.message_store.record_received(selected)
+            if not self.message_store.flush():
+                # Never delete what is not safely archived
+                return 0
+            for sms in selected:
+                self.track_gammu_operation("deleteSms", deleteSms, gammu_machine, sms)
+        logger.info(f"📦 Offloaded {len(selected)} read SMS to message history "
+                    f"(SMS memory above {self.storage_watermarks.high}%)")
+        return len(selected)
+
+    def publish_sms_received(self, sms_data: Dict[str, Any], topic=None):
+        """Publish received SMS data (to sms/state unless routed to another topic)"""
         # Add timestamp
         sms_data['timestamp'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.emit_event("sms_received", dict(sms_data))
+        if not self.connected:
+            return
         
-        topic = f"{self.topic_prefix}/sms/state"
-        self.client.publish(topic, json.dumps(sms_data, ensure_ascii=False))
+        topic = topic or f"{self.topic_prefix}/sms/state"
+        self.client.publish(topic, dumps(sms_data))
         
-        logger.info(f"📡 Published SMS to MQTT: {sms_data.get('Number', 'Unknown')} -> {sms_data.get('Text', '')}")
+        logger.info("📡 Published SMS to MQTT: %s -> %s", Phone(sms_data.get('Number', 'Unknown')), Body(sms_data.get('Text', '')))
     
-    def publish_device_status(self):
-        """Publish USB device connectivity status"""
+    def route_received_sms(self, sms: Dict[str, Any]):
+        """Apply routing rules to a received SMS, returns its MQTT topic or None when a rule drops it.
+
+        Matched SMS get a "Route" field with the first rule's name; webhook and
+        reply actions run besides publishing.
+        """
+        topic = f"{self.topic_prefix}/sms/state"
+        if self.sms_router is None:
+            return topic
+        rules = self.sms_router.route(sms)
+        if not rules:
+            return topic
+        sms["Route"] = rules[0].name
+        number = sms.get("Number", "")
+        for rule in rules:
+            if rule.action == ACTION_DROP:
+                logger.info("🔀 SMS from %s dropped by routing rule %s", Phone(number), rule.name)
+                return None
+            if rule.action == ACTION_MQTT:
+                topic = f"{self.topic_prefix}/sms/{rule.target}"
+            elif rule.action == ACTION_WEBHOOK:
+                self.sms_router.post_webhook(rule, dict(sms, timestamp=time.strftime('%Y-%m-%d %H:%M:%S')))
+            elif rule.action == ACTION_REPLY:
+                if self.send_scheduler is not None and self.sms_router.reply_allowed(rule, number):
+                    self.send_scheduler.schedule([number], rule.target, source="auto_reply")
+                    logger.info("🔀 Auto-reply to %s queued by routing rule %s", Phone(number), rule.name)
+        logger.debug("SMS from %s routed by %s", Phone(number), ", ".join(rule.name for rule in rules))
+        return topic
+
+    def publish_delivery_status(self, job: Dict[str, Any]):
+        """Publish delivery report state of a sent message"""
+        self.emit_event("delivery_status", job)
         if not self.connected:
             return
-            
+
+        topic = f"{self.topic_prefix}/delivery_status"
+        self.client.publish(topic, dumps(job), retain=False)
+        logger.info("📡 Published delivery status to MQTT: %s -> %s", job.get('id'), job.get('state'))
+
+    def process_status_reports(self, gammu_machine, all_sms):
+        """Hand status reports to delivery tracker and delete them, return ordinary SMS"""
+        ordinary = []
+        for sms in all_sms:
+            if not is_status_report(sms):
+                ordinary.append(sms)
+                continue
+            if self.delivery_tracker is not None:
+                job = self.delivery_tracker.process_report(sms)
+                if job is not None:
+                    logger.info("Delivery report for %s: %s (latency: %ss)", job['id'], job['state'], job.get('latency_seconds'))
+                    self.publish_delivery_status(job)
+            try:
+                self.track_gammu_operation("deleteSms", deleteSms, gammu_machine, sms)
+            except Exception as delete_error:
+                logger.warning(f"Could not delete status report: {delete_error}")
+        return ordinary
+
+    def hold_incomplete_sms(self, all_sms):
+        """Drop multipart SMS still missing parts (they stay on the SIM), return records ready to hand out"""
+        if self.reassembly_buffer is None:
+            return all_sms
+        return self.reassembly_buffer.ready(all_sms)
+
+    def archive_received_sms(self, all_sms):
+        """Record SMS read from the SIM in the message history, return them unchanged"""
+        if self.message_store is not None:
+            self.message_store.record_received(all_sms)
+        return all_sms
+
+    def publish_device_status(self):
+        """Publish USB device connectivity status"""
         status_data = self.device_tracker.get_status_data()
-        
-        topic = f"{self.topic_prefix}/device_status/state"
-        self.client.publish(topic, json.dumps(status_data, ensure_ascii=False), retain=True)
+        status = status_data.get('status')
+        if getattr(self, '_last_device_status', None) != status:
+            # Listeners only get transitions, not every successful gammu call
+            self.emit_event("device_status", status_data)
+
+        if self.connected:
+            topic = f"{self.topic_prefix}/device_status/state"
+            self.client.publish(topic, dumps(status_data), retain=True)
         
         # Log status changes
-        status = status_data.get('status')
         if hasattr(self, '_last_device_status') and self._last_device_status != status:
             if status == 'online':
                 logger.info(f"📶 Modem: ONLINE (after {status_data.get('consecutive_failures', 0)} failures)")
@@ -604,18 +1121,40 @@ class MQTTPublisher:
         
         self._last_device_status = status
         
+    def send_sms_parts(self, gammu_machine, messages):
+        """Send encoded SMS parts with per-part retry policy, returns message references"""
+        def _send_part(message):
+            reference = self.track_gammu_operation("SendSMS", gammu_machine.SendSMS, message)
+            if self.message_store is not None:
+                self.message_store.record_sent(message, reference)
+            return reference
+
+        return self.retrying_sender.send_parts(messages, _send_part)
+
     def track_gammu_operation(self, operation_name, gammu_function, *args, **kwargs):
-        """Execute gammu operation with connectivity tracking"""
+        """Execute gammu operation with connectivity tracking (recorded or replayed when tracing)"""
+        started = time.time()
         try:
-            result = gammu_function(*args, **kwargs)
+            if self.gammu_replayer is not None and self.gammu_replayer.has(operation_name):
+                result = self.gammu_replayer.play(operation_name)
+            elif self.modem_worker is not None:
+                result = self.modem_worker.call(gammu_function, *args, **kwargs)
+            else:
+                result = gammu_function(*args, **kwargs)
+            if self.gammu_recorder is not None:
+                self.gammu_recorder.record(operation_name, args, kwargs, started, time.time() - started, result=result)
             self.device_tracker.record_success()
             self.publish_device_status()
-            logger.debug(f"✅ Gammu operation '{operation_name}' succeeded")
+            logger.debug("✅ Gammu operation '%s' succeeded", operation_name)
             return result
         except Exception as e:
+            if self.gammu_recorder is not None:
+                self.gammu_recorder.record(operation_name, args, kwargs, started, time.time() - started, error=e)
             self.device_tracker.record_failure(f"{operation_name}: {str(e)}")
             self.publish_device_status()
-            logger.warning(f"❌ Gammu operation '{operation_name}' failed: {e}")
+            logger.warning("❌ Gammu operation '%s' failed: %s", operation_name, e)
+            if self.gammu_debug_capture is not None:
+                self.gammu_debug_capture.on_failure(operation_name, e)
             raise
     
     def _publish_initial_states(self):
@@ -644,99 +1183,112 @@ class MQTTPublisher:
             # Publish empty SMS state initially
             empty_sms = {"Date": "", "Number": "", "State": "", "Text": "", "timestamp": ""}
             topic = f"{self.topic_prefix}/sms/state"
-            self.client.publish(topic, json.dumps(empty_sms, ensure_ascii=False), retain=True)
+            self.client.publish(topic, dumps(empty_sms), retain=True)
             
             logger.info("📡 Published initial states to MQTT")
             
         except Exception as e:
             logger.error(f"Error publishing initial states: {e}")
     
+    def _has_sms_consumers(self):
+        """MQTT connection or event consumers (webhooks, SSE clients) want received SMS"""
+        return self.connected or any(is_active() for is_active in self.event_consumers)
+
+    def poll_inbox(self, gammu_machine):
+        """One SMS monitoring round: read the SIM, publish new SMS and delete them"""
+        # Held while reading and deleting, /sms/getsms must not take the same SIM messages
+        with self.inbox_lock:
+            # Check for new SMS with connectivity tracking
+            all_sms = self.track_gammu_operation("retrieveAllSms", retrieveAllSms, gammu_machine)
+            # Status reports update delivery state, they are not received SMS
+            all_sms = self.process_status_reports(gammu_machine, all_sms)
+            # Concatenated SMS are published once all parts arrived (or waited too long)
+            all_sms = self.hold_incomplete_sms(all_sms)
+            self.archive_received_sms(all_sms)
+            previous_count = self._last_sms_count
+            current_count = len(all_sms)
+
+            # If there are new SMS since last check
+            if current_count > previous_count:
+                logger.info("📱 Detected %d new SMS messages", current_count - previous_count)
+
+                # Process new SMS (from the end, newest first)
+                for i in range(previous_count, current_count):
+                    sms_record = all_sms[i]
+                    sms = sms_record.copy()
+                    sms.pop("Locations", None)
+
+                    # Publish to MQTT (state topic or the routed one), dropped SMS go nowhere
+                    topic = self.route_received_sms(sms)
+                    if topic is not None:
+                        self.publish_sms_received(sms, topic)
+                        if self.inbox_queue is not None:
+                            self.inbox_queue.put(sms)
+
+                    # Delete SMS from SIM after it has been processed
+                    try:
+                        self.track_gammu_operation("deleteSms", deleteSms, gammu_machine, sms_record)
+                        logger.debug("Deleted SMS from %s after publishing to MQTT", Phone(sms.get('Number', '')))
+                    except Exception as delete_error:
+                        logger.warning(f"Could not delete SMS after publishing: {delete_error}")
+            else:
+                self._last_sms_count = current_count
+
+    def poll_signal(self, gammu_machine):
+        """Read and publish signal strength"""
+        signal = self.track_gammu_operation("GetSignalQuality", gammu_machine.GetSignalQuality)
+        self.publish_signal_strength(signal)
+
+    def poll_network(self, gammu_machine):
+        """Read and publish network information"""
+        from gammu import GSMNetworks
+        network = self.track_gammu_operation("GetNetworkInfo", gammu_machine.GetNetworkInfo)
+        network["NetworkName"] = GSMNetworks.get(network.get("NetworkCode", ""), 'Unknown')
+        self.publish_network_info(network)
+
+    def _status_wanted(self):
+        """Signal/network polls are needed for MQTT, event consumers or the signal history"""
+        return self._has_sms_consumers() or self.signal_history is not None
+
     def start_sms_monitoring(self, gammu_machine, check_interval=30):
-        """Start SMS monitoring in background thread"""
-        if not self.connected:
-            return
-            
-        def _sms_monitor_loop():
-            logger.info(f"📱 Started SMS monitoring (check every {check_interval}s)")
-            last_sms_count = 0
-            
-            while self.connected:
-                try:
-                    from support import retrieveAllSms, deleteSms
-                    
-                    # Check for new SMS with connectivity tracking
-                    all_sms = self.track_gammu_operation("retrieveAllSms", retrieveAllSms, gammu_machine)
-                    previous_count = last_sms_count
-                    current_count = len(all_sms)
-                    
-                    # If there are new SMS since last check
-                    if current_count > previous_count:
-                        logger.info(f"📱 Detected {current_count - previous_count} new SMS messages")
-                        
-                        # Process new SMS (from the end, newest first)
-                        for i in range(previous_count, current_count):
-                            if i < len(all_sms):
-                                sms_record = all_sms[i]
-                                sms = sms_record.copy()
-                                sms.pop("Locations", None)
-                                
-                                # Publish to MQTT
-                                self.publish_sms_received(sms)
-                                
-                                # Delete SMS from SIM after it has been processed
-                                try:
-                                    self.track_gammu_operation("deleteSms", deleteSms, gammu_machine, sms_record)
-                                    logger.debug(f"Deleted SMS from {sms.get('Number', '')} after publishing to MQTT")
-                                except Exception as delete_error:
-                                    logger.warning(f"Could not delete SMS after publishing: {delete_error}")
-                        last_sms_count = previous_count
-                    else:
-                        last_sms_count = current_count
-                    
-                except Exception as e:
-                    logger.error(f"Error monitoring SMS: {e}")
-                
-                time.sleep(check_interval)
-        
-        # Only start if both MQTT and SMS monitoring are enabled  
-        if (self.config.get('mqtt_enabled', False) and 
-            self.config.get('sms_monitoring_enabled', True)):
-            thread = threading.Thread(target=_sms_monitor_loop, daemon=True)
-            thread.start()
-    
+        """Schedule SMS monitoring (modem is only polled while someone consumes SMS).
+
+        Interval and sms_monitoring_enabled are applied live by reconfigure(),
+        a re-initialized modem is picked up on the next round.
+        """
+        self.sms_check_interval = check_interval
+        # MQTT reconnecting or no SSE client yet, leave SMS on the SIM meanwhile
+        self.task_scheduler.add(TASK_INBOX, self.poll_inbox, check_interval, when=self._has_sms_consumers,
+                                enabled=self.config.get('sms_monitoring_enabled', True))
+        self.task_scheduler.start()
+        logger.info(f"📱 Started SMS monitoring (check every {check_interval}s)")
+
     def publish_status_periodic(self, gammu_machine, interval=60):
-        """Publish status data periodically in background thread"""
-        if not self.connected:
+        """Schedule signal, network and device status publishing (polls only while MQTT, consumers or the signal history listen)"""
+        self.task_scheduler.add(TASK_SIGNAL, self.poll_signal, interval, when=self._status_wanted)
+        self.task_scheduler.add(TASK_NETWORK, self.poll_network, interval, when=self._status_wanted)
+        # Offline detection also while nothing else talks to the modem
+        self.task_scheduler.add(TASK_HEARTBEAT, lambda machine: self.publish_device_status(), DEVICE_HEARTBEAT_INTERVAL,
+                                needs_modem=False)
+        self.task_scheduler.start()
+        logger.info(f"Started periodic status publishing (interval: {interval}s)")
+
+    def start_storage_monitoring(self, gammu_machine, interval=300):
+        """Schedule SMS memory watermark checks (also while nobody consumes SMS)"""
+        if self.storage_watermarks is None:
             return
-            
-        def _publish_loop():
-            while self.connected:
-                try:
-                    # Publish signal strength with connectivity tracking
-                    signal = self.track_gammu_operation("GetSignalQuality", gammu_machine.GetSignalQuality)
-                    self.publish_signal_strength(signal)
-                    
-                    # Publish network info with connectivity tracking
-                    from gammu import GSMNetworks
-                    network = self.track_gammu_operation("GetNetworkInfo", gammu_machine.GetNetworkInfo)
-                    network["NetworkName"] = GSMNetworks.get(network.get("NetworkCode", ""), 'Unknown')
-                    self.publish_network_info(network)
-                    
-                except Exception as e:
-                    logger.error(f"Error publishing periodic status: {e}")
-                
-                time.sleep(interval)
-        
-        if self.config.get('mqtt_enabled', False):
-            thread = threading.Thread(target=_publish_loop, daemon=True)
-            thread.start()
-            logger.info(f"Started MQTT periodic publishing (interval: {interval}s)")
-    
+        self.task_scheduler.add(TASK_STORAGE, self.check_sim_storage, interval)
+        self.task_scheduler.start()
+        logger.info(f"Started SMS storage monitoring (high {self.storage_watermarks.high}%, "
+                    f"low {self.storage_watermarks.low}%, every {interval}s)")
+
     def disconnect(self):
         """Disconnect from MQTT broker"""
-        if self.client and self.connected:
+        if self.client:
+            # Also stops reconnect attempts when the broker was never reached
             self.client.loop_stop()
-            self.client.disconnect()
-            logger.info("Disconnected from MQTT broker")
+            if self.connected:
+                self.client.disconnect()
+                logger.info("Disconnected from MQTT broker")
 
 
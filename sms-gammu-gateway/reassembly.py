@@ -0,0 +1,94 @@
+"""
+Multipart SMS reassembly for SMS Gammu Gateway
+Incomplete concatenated SMS stay on the SIM across inbox reads until the
+missing parts arrive; fragments that wait too long (or take too many SIM
+slots) are released as one partial message
+"""
+
+import time
+import logging
+import threading
+
+from log_queue import Phone
+
+logger = logging.getLogger(__name__)
+
+MULTIPART_TIMEOUT = 600  # Seconds to wait for missing parts
+MULTIPART_MAX_PENDING = 10  # Incomplete messages held at most, each takes SIM slots
+
+
+def multipart_key(sms):
+    """Sender and concatenation reference of an incomplete SMS, None for complete ones"""
+    info = sms.get("Multipart")
+    if not info:
+        return None
+    return sms.get("Number"), info.get("Reference"), info.get("Parts")
+
+
+def merge_fragments(fragments):
+    """Combine fragments of one message into a single record marked Partial"""
+    fragments = sorted(fragments, key=lambda sms: min(sms["Multipart"]["Received"] or [0]))
+    received = sorted({part for sms in fragments for part in sms["Multipart"]["Received"]})
+    parts = fragments[0]["Multipart"]["Parts"]
+    merged = {key: value for key, value in fragments[0].items() if key != "Multipart"}
+    merged["Text"] = "".join(sms.get("Text") or "" for sms in fragments)
+    merged["Locations"] = [location for sms in fragments for location in sms.get("Locations", [])]
+    merged["Partial"] = True
+    merged["MissingParts"] = [part for part in range(1, parts + 1) if part not in received]
+    return merged
+
+
+class ReassemblyBuffer:
+    """Remembers since when incomplete multipart SMS are waiting on the SIM.
+
+    The fragments themselves stay on the SIM, so nothing is lost on restart;
+    only the wait starts over.
+    """
+
+    def __init__(self, timeout=MULTIPART_TIMEOUT, max_pending=MULTIPART_MAX_PENDING):
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._first_seen = {}
+        self._lock = threading.Lock()
+
+    def ready(self, all_sms, now=None):
+        """Inbox records that may be handed out: complete SMS plus expired fragments merged as partial"""
+        now = time.monotonic() if now is None else now
+        ready = []
+        fragments = {}
+        for sms in all_sms:
+            key = multipart_key(sms)
+            if key is None:
+                ready.append(sms)
+            else:
+                fragments.setdefault(key, []).append(sms)
+
+        with self._lock:
+            # Completed or deleted messages no longer show up as fragments
+            for key in list(self._first_seen):
+                if key not in fragments:
+                    del self._first_seen[key]
+            for key in fragments:
+                self._first_seen.setdefault(key, now)
+            expired = {key for key, since in self._first_seen.items() if now - since >= self.timeout}
+            waiting = sorted(((since, key) for key, since in self._first_seen.items() if key not in expired),
+                             key=lambda item: item[0])
+            # Fragments occupy SIM slots new SMS need, give up on the oldest ones first
+            overflow = len(waiting) - self.max_pending
+            if overflow > 0:
+                expired.update(key for _, key in waiting[:overflow])
+
+        for key, parts in fragments.items():
+            if key in expired:
+                merged = merge_fragments(parts)
+                logger.info("Multipart SMS from %s incomplete, releasing without parts %s",
+                            Phone(key[0]), merged['MissingParts'])
+                ready.append(merged)
+        held = len(fragments) - len([key for key in fragments if key in expired])
+        if held:
+            logger.debug(f"Holding {held} incomplete multipart SMS on the SIM")
+        return ready
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._first_seen)
@@ -0,0 +1,170 @@
+"""
+SMS send retry policy for SMS Gammu Gateway
+Classifies gammu errors and retries transient failures per message part with
+jittered exponential backoff
+"""
+
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+ERROR_CLASS_TRANSIENT = "transient"
+ERROR_CLASS_PERMANENT = "permanent"
+OUTCOME_SENT = "sent"  # Retried part that went out in the end
+
+# Gammu exception names (python-gammu raises gammu.ERR_<NAME>) worth retrying:
+# timeouts, busy device, garbled/lost frames and network registration hiccups
+TRANSIENT_GAMMU_ERRORS = {
+    "ERR_TIMEOUT",
+    "ERR_BUSY",
+    "ERR_DEVICEBUSY",
+    "ERR_WORKINPROGRESS",
+    "ERR_DEVICEREADERROR",
+    "ERR_DEVICEWRITEERROR",
+    "ERR_FRAMENOTREQUESTED",
+    "ERR_UNKNOWNRESPONSE",
+    "ERR_UNKNOWNFRAME",
+    "ERR_NOTCONNECTED",
+    "ERR_NETWORK_ERROR",
+    "ERR_UNKNOWN",
+}
+
+# Errors that will not go away by sending again: bad number/data, missing
+# SMSC, SIM or security problems, unsupported operations
+PERMANENT_GAMMU_ERRORS = {
+    "ERR_GETTING_SMSC",
+    "ERR_EMPTYSMSC",
+    "ERR_INVALIDDATA",
+    "ERR_INVALIDLOCATION",
+    "ERR_NOTSUPPORTED",
+    "ERR_NOTIMPLEMENTED",
+    "ERR_NOSIM",
+    "ERR_SECURITYERROR",
+    "ERR_PERMISSION",
+    "ERR_PHONEOFF",
+}
+
+# Fallback by numeric gammu error code (as seen in "Code': NN" of error text)
+GAMMU_ERROR_CODE_CLASSES = {
+    14: ERROR_CLASS_TRANSIENT,  # Timeout
+    27: ERROR_CLASS_TRANSIENT,  # Unknown error, usually signal/network
+    38: ERROR_CLASS_TRANSIENT,  # Network registration
+    69: ERROR_CLASS_PERMANENT,  # SMSC number not found
+}
+
+GAMMU_ERROR_DESCRIPTIONS = {
+    27: "SMS sending failed - check SIM card, network signal or device connection",
+    38: "Network registration failed - check SIM card and signal",
+    69: "SMSC number not found - configure SMS center number in SIM settings",
+}
+
+
+def gammu_error_code(error):
+    """Extract numeric gammu error code from exception, None if unavailable"""
+    if error.args and isinstance(error.args[0], dict):
+        code = error.args[0].get('Code')
+        if isinstance(code, int):
+            return code
+    text = str(error)
+    for code in GAMMU_ERROR_DESCRIPTIONS:
+        if f"Code': {code}" in text:
+            return code
+    return None
+
+
+def classify_gammu_error(error):
+    """Return ERROR_CLASS_TRANSIENT or ERROR_CLASS_PERMANENT for exception"""
+    name = type(error).__name__
+    if name in TRANSIENT_GAMMU_ERRORS:
+        return ERROR_CLASS_TRANSIENT
+    if name in PERMANENT_GAMMU_ERRORS:
+        return ERROR_CLASS_PERMANENT
+    code = gammu_error_code(error)
+    if code in GAMMU_ERROR_CODE_CLASSES:
+        return GAMMU_ERROR_CODE_CLASSES[code]
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return ERROR_CLASS_TRANSIENT
+    return ERROR_CLASS_PERMANENT
+
+
+def describe_gammu_error(error):
+    """User friendly message for gammu send error"""
+    code = gammu_error_code(error)
+    if code in GAMMU_ERROR_DESCRIPTIONS:
+        return GAMMU_ERROR_DESCRIPTIONS[code]
+    return f"SMS sending error: {error}"
+
+
+class SmsSendError(Exception):
+    """Raised when a message part could not be sent after applying retry policy"""
+
+    def __init__(self, cause, error_class, failed_part, total_parts, sent_references, attempts):
+        super().__init__(describe_gammu_error(cause))
+        self.cause = cause
+        self.error_class = error_class
+        self.failed_part = failed_part  # 1-based index of the part that failed
+        self.total_parts = total_parts
+        self.sent_references = sent_references  # References of parts sent before failure
+        self.attempts = attempts
+
+
+class RetryPolicy:
+    """Jittered exponential backoff for transient errors, fail fast on permanent ones"""
+
+    def __init__(self, max_attempts=4, base_delay=2.0, max_delay=30.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+
+    def should_retry(self, error_class, attempt):
+        """Decide whether attempt number `attempt` (1-based) may be followed by another"""
+        return error_class == ERROR_CLASS_TRANSIENT and attempt < self.max_attempts
+
+    def backoff(self, attempt):
+        """Full-jitter delay before retry following attempt number `attempt`"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, ceiling)
+
+
+class RetryingSender:
+    """Sends encoded SMS parts one by one, each part with its own retry state"""
+
+    def __init__(self, policy, tracker=None, sleep=time.sleep):
+        self.policy = policy
+        self.tracker = tracker
+        self.sleep = sleep
+
+    def send_parts(self, messages, send_part):
+        """Send all parts via send_part(message), return list of message references.
+
+        A failing part is retried on its own; parts already sent are never
+        resent. Raises SmsSendError when a part can't be delivered to the modem.
+        """
+        references = []
+        total = len(messages)
+        for index, message in enumerate(messages, start=1):
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    references.append(send_part(message))
+                    if self.tracker and attempt > 1:
+                        self.tracker.record_send_outcome(OUTCOME_SENT, attempt - 1)
+                    break
+                except Exception as e:
+                    error_class = classify_gammu_error(e)
+                    if not self.policy.should_retry(error_class, attempt):
+                        if self.tracker:
+                            self.tracker.record_send_failure(error_class)
+                            if attempt > 1:
+                                self.tracker.record_send_outcome(error_class, attempt - 1)
+                        logger.error(f"SMS part {index}/{total} failed ({error_class}) after {attempt} attempt(s): {e}")
+                        raise SmsSendError(e, error_class, index, total, references, attempt) from e
+                    delay = self.policy.backoff(attempt)
+                    if self.tracker:
+                        self.tracker.record_send_retry()
+                    logger.warning(f"SMS part {index}/{total} failed ({error_class}), retry {attempt}/{self.policy.max_attempts - 1} in {delay:.1f}s: {e}")
+                    self.sleep(delay)
+        return references
@@ -7,17 +7,53 @@ Based on: https://github.com/pajikos/sms-gammu-gateway
 Licensed under Apache License 2.0
 """
 
+import time
+_process_started = time.time()
+
 import os
+import sys
 import json
 import logging
-import yaml
-from flask import Flask, request
+import threading
+from flask import Flask, Response, request, make_response
 from flask_httpauth import HTTPBasicAuth
+from werkzeug.datastructures import Authorization
 from flask_restx import Api, Resource, fields, reqparse
 
 from support import init_state_machine, retrieveAllSms, deleteSms, encodeSms, message_requires_unicode
-from mqtt_publisher import MQTTPublisher
-from gammu import GSMNetworks
+from mqtt_publisher import MQTTPublisher, STATUS_CHECK_INTERVAL
+from idempotency import IdempotencyStore, request_fingerprint, STATUS_IN_PROGRESS
+from retry_policy import SmsSendError, RetryPolicy, ERROR_CLASS_TRANSIENT
+from delivery_reports import DeliveryReportTracker
+from gammu_trace import (GammuTraceRecorder, GammuTraceReplayer, ReplayStateMachine, GAMMU_TRACE_FILE,
+                         TRACE_MODE_RECORD, TRACE_MODE_REPLAY)
+from startup import StartupTimer
+from modem_discovery import discover_modem, forget_cached_port, AUTO_DEVICE_PATH
+from webhooks import WebhookDispatcher
+from event_stream import EventBroadcaster, parse_last_event_id
+from inbox_queue import InboxQueue, GETSMS_MAX_WAIT
+from reassembly import ReassemblyBuffer, MULTIPART_TIMEOUT, MULTIPART_MAX_PENDING
+from serialization import dumps_bytes, Projection
+from send_scheduler import SendScheduler, parse_send_at, parse_window, SEND_INTERVAL
+from message_store import MessageStore, RETENTION_DAYS, MAX_HISTORY_LIMIT
+from config_reload import ConfigReloader, MODEM_KEYS, RESTART_KEYS
+from gammu_debug import GammuDebugCapture, GAMMU_DEBUG_BUFFER_MB
+from log_queue import setup_logging, set_redaction, rate_limit_filter, LOG_RATE_LIMIT
+from sms_routing import SmsRouter, SMS_ROUTING_FILE
+from signal_history import SignalHistory, parse_time, MAX_HISTORY_POINTS
+from sim_storage import (StorageWatermarks, storage_occupancy, SIM_HIGH_WATERMARK, SIM_LOW_WATERMARK,
+                         SIM_ALERT_LEVEL, STORAGE_CHECK_INTERVAL)
+from async_runtime import (AsgiGateway, AsyncMqttRunner, ModemWorker, serve, asyncio_runtime_available,
+                           RUNTIME_THREADED, RUNTIME_ASYNCIO)
+from http_cache import ResourceVersion, CachedBody, conditional, not_modified, compress_response, ETAG_MAX_AGE
+
+startup_timer = StartupTimer(_process_started)
+startup_timer.begin("imports", _process_started)
+startup_timer.end("imports")
+
+# How long requests wait for modem init at startup before answering 503
+MODEM_READY_SEND_TIMEOUT = 15
+MODEM_RETRY_AFTER_SECONDS = 5
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -28,9 +64,12 @@ mqtt_logger.setLevel(logging.INFO)
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
+# GATEWAY_OPTIONS_FILE lets load tests run the gateway outside HA
+OPTIONS_FILE = os.environ.get('GATEWAY_OPTIONS_FILE', '/data/options.json')
+
 def load_ha_config():
     """Load Home Assistant add-on configuration"""
-    config_path = '/data/options.json'
+    config_path = OPTIONS_FILE
     if os.path.exists(config_path):
         with open(config_path, 'r') as f:
             return json.load(f)
@@ -51,6 +90,20 @@ def load_ha_config():
             'mqtt_topic_prefix': 'homeassistant/sensor/sms_gateway',
             'sms_monitoring_enabled': True,
             'sms_check_interval': 60,
+            'idempotency_ttl': 86400,
+            'idempotency_max_keys': 1000,
+            'send_retry_attempts': 4,
+            'send_retry_base_delay': 2,
+            'send_retry_max_delay': 30,
+            'delivery_reports': False,
+            'gammu_trace_mode': 'off',
+            'gammu_trace_max_mb': 20,
+            'gammu_replay_speed': 1.0,
+            'webhook_urls': [],
+            'webhook_secret': '',
+            'webhook_batch_size': 1,
+            'webhook_batch_interval': 1.0,
+            'webhook_max_attempts': 10,
             'debug': False
         }
 
@@ -69,6 +122,7 @@ _missing_secret_keys = set()
 
 def _load_secrets():
     """Load secrets from known Home Assistant paths."""
+    import yaml  # Only needed when options use !secret
     secrets = {}
     for path in SECRET_FILES:
         if not os.path.exists(path):
@@ -135,42 +189,303 @@ def _resolve_secrets_in_structure(data):
         return _resolve_secret_directive(data)
     return data
 
+def load_config():
+    """Options with !secret values resolved, secrets files are read again on every call"""
+    global _secrets_cache
+    _secrets_cache = None
+    _missing_secret_keys.clear()
+    return _resolve_secrets_in_structure(load_ha_config())
+
 # Load configuration
-config = load_ha_config()
-config = _resolve_secrets_in_structure(config)
+startup_timer.begin("config")
+config = load_config()
+startup_timer.end("config")
 pin = config.get('pin') if config.get('pin') else None
 ssl = config.get('ssl', False)
 port = config.get('port', 5000)
-username = config.get('username', 'admin')
-password = config.get('password', 'password')
-device_path = config.get('device_path', '/dev/ttyUSB0')
+runtime = config.get('runtime', RUNTIME_THREADED)  # 'asyncio' serves from one event loop (uvicorn)
+# One tuple, a reload swaps user and password together
+_credentials = (config.get('username', 'admin'), config.get('password', 'password'))
+device_path = config.get('device_path', '/dev/ttyUSB0')  # 'auto' probes serial ports for the modem
+connection = config.get('connection', 'at')  # 'dummy' = test mode, device_path is a directory
 debug_enabled = config.get('debug', False)
 
 if debug_enabled:
     logging.getLogger().setLevel(logging.DEBUG)
     mqtt_logger.setLevel(logging.DEBUG)
-    logging.info("Debug logging enabled. Detailed output will be written to the add-on logs and /data/gammu-debug.log.")
+    if config.get('gammu_debug_buffer_mb', GAMMU_DEBUG_BUFFER_MB):
+        logging.info("Debug logging enabled. Detailed output goes to the add-on logs, the gammu trace is served "
+                     "at GET /debug/gammu and saved after failures to GET /debug/gammu/dumps.")
+    else:
+        logging.info("Debug logging enabled. Detailed output goes to the add-on logs and the gammu trace to "
+                     "/data/gammu-debug.log (set gammu_debug_buffer_mb to keep it in memory at GET /debug/gammu).")
 
-# Initialize gammu state machine
-machine = init_state_machine(pin, device_path, debug_enabled)
+# Log records are written by a background thread, modem and MQTT threads only enqueue them
+log_listener = setup_logging(
+    rate_limit=config.get('log_rate_limit', LOG_RATE_LIMIT),
+    redact=config.get('log_redact', False),
+)
+
+# Gammu call record/replay ('record' writes a trace, 'replay' serves it instead of the modem)
+gammu_trace_mode = config.get('gammu_trace_mode', 'off')
+gammu_trace_file = config.get('gammu_trace_file') or GAMMU_TRACE_FILE
+gammu_recorder = None
+gammu_replayer = None
 
-# Initialize MQTT publisher
+# Initialize MQTT publisher (connects in background, modem is initialized in parallel)
+if config.get('mqtt_enabled', False):
+    startup_timer.begin("mqtt_connect")
 mqtt_publisher = MQTTPublisher(config)
-# Set gammu machine for MQTT SMS sending
-mqtt_publisher.set_gammu_machine(machine)
+
+# Gammu AT trace kept in memory (last N MB) and dumped to /data/gammu-debug/ when an operation fails
+gammu_debug_capture = None
+if config.get('gammu_debug_buffer_mb', GAMMU_DEBUG_BUFFER_MB):
+    gammu_debug_capture = GammuDebugCapture(int(config.get('gammu_debug_buffer_mb') * 1024 * 1024))
+    mqtt_publisher.set_gammu_debug_capture(gammu_debug_capture)
+
+# Gammu state machine, None until init_modem() has finished
+machine = None
+
+
+class ModemNotReady(Exception):
+    """Raised by REST endpoints while the modem is still initializing"""
+
+
+def attach_machine(gammu_machine):
+    """Make an initialized state machine available to REST endpoints and MQTT"""
+    global machine
+    machine = gammu_machine
+    # Set gammu machine for MQTT SMS sending (also signals modem readiness)
+    mqtt_publisher.set_gammu_machine(gammu_machine)
+
+
+def _detect_device_path():
+    """Resolve device_path 'auto' to the port that answers AT commands"""
+    with startup_timer.phase("modem_discovery"):
+        modem = discover_modem(config.get('modem_probe_ports') or None)
+    if modem is None:
+        raise RuntimeError("Modem auto-detection found no serial port answering AT commands")
+    return modem["port"]
+
+
+def init_modem():
+    """Initialize gammu state machine (or trace replay) and attach it"""
+    global gammu_recorder, gammu_replayer
+    auto_detect = device_path == AUTO_DEVICE_PATH and connection == 'at' and gammu_trace_mode != TRACE_MODE_REPLAY
+    modem_path = _detect_device_path() if auto_detect else device_path
+    with startup_timer.phase("modem_init"):
+        if gammu_trace_mode == TRACE_MODE_REPLAY:
+            gammu_replayer = GammuTraceReplayer(
+                gammu_trace_file,
+                speed=config.get('gammu_replay_speed', 1.0),
+                loop=config.get('gammu_replay_loop', False),
+            )
+            gammu_machine = ReplayStateMachine(gammu_replayer)
+        else:
+            try:
+                debug_file = gammu_debug_capture.debug_file() if gammu_debug_capture is not None else None
+                gammu_machine = init_state_machine(pin, modem_path, debug_enabled, connection, debug_file=debug_file)
+            except Exception:
+                if auto_detect:
+                    # Answers AT but gammu can't use it, probe again on next start
+                    forget_cached_port()
+                raise
+            if gammu_trace_mode == TRACE_MODE_RECORD:
+                gammu_recorder = GammuTraceRecorder(
+                    gammu_trace_file,
+                    max_bytes=int(config.get('gammu_trace_max_mb', 20) * 1024 * 1024),
+                )
+        mqtt_publisher.set_gammu_trace(recorder=gammu_recorder, replayer=gammu_replayer)
+    attach_machine(gammu_machine)
+    return gammu_machine
+
+
+def _require_machine(wait=0):
+    """Gammu machine for a request, waiting up to `wait` seconds during startup"""
+    gammu_machine = mqtt_publisher.wait_for_machine(wait) if wait else machine
+    if gammu_machine is None:
+        raise ModemNotReady()
+    return gammu_machine
+
+# Remember Idempotency-Key / MQTT "id" values so client retries don't send twice
+idempotency_store = IdempotencyStore(
+    ttl_seconds=config.get('idempotency_ttl', 86400),
+    max_entries=config.get('idempotency_max_keys', 1000),
+)
+mqtt_publisher.set_idempotency_store(idempotency_store)
+
+# Correlate incoming status reports with sent messages by message reference
+delivery_tracker = DeliveryReportTracker()
+mqtt_publisher.set_delivery_tracker(delivery_tracker)
+
+# Concatenated SMS wait on the SIM until all parts arrived
+mqtt_publisher.set_reassembly_buffer(ReassemblyBuffer(
+    timeout=config.get('multipart_timeout', MULTIPART_TIMEOUT),
+    max_pending=config.get('multipart_max_pending', MULTIPART_MAX_PENDING),
+))
+
+# HTTP push of gateway events for consumers outside MQTT
+webhook_dispatcher = None
+if config.get('webhook_urls'):
+    webhook_dispatcher = WebhookDispatcher(
+        config.get('webhook_urls'),
+        secret=config.get('webhook_secret', ''),
+        batch_size=config.get('webhook_batch_size', 1),
+        batch_interval=config.get('webhook_batch_interval', 1.0),
+        policy=RetryPolicy(max_attempts=config.get('webhook_max_attempts', 10), base_delay=5, max_delay=600),
+    )
+    mqtt_publisher.add_event_listener(webhook_dispatcher.emit)
+    mqtt_publisher.add_event_consumer(lambda: True)
+
+# Server-Sent Events: one modem poll fans out to all connected /events clients
+event_broadcaster = EventBroadcaster()
+mqtt_publisher.add_event_listener(event_broadcaster.publish)
+mqtt_publisher.add_event_consumer(event_broadcaster.has_subscribers)
+
+# SMS taken off the SIM by the monitor loop wait here for /sms/getsms (long-polling) clients
+inbox_queue = InboxQueue()
+mqtt_publisher.set_inbox_queue(inbox_queue)
+mqtt_publisher.add_event_consumer(inbox_queue.has_waiters)
+
+# SMS with send_at/window wait here and are released one by one with a gap between sends
+send_scheduler = SendScheduler(
+    mqtt_publisher.send_scheduled_job,
+    min_interval=config.get('scheduled_send_interval', SEND_INTERVAL),
+)
+mqtt_publisher.set_send_scheduler(send_scheduler)
+
+# Every SMS read from the SIM and every sent part is archived, /sms/history reads never touch the modem
+message_store = MessageStore(retention_days=config.get('history_retention_days', RETENTION_DAYS))
+mqtt_publisher.set_message_store(message_store)
+
+# Read SMS move from a filling SIM to the message history before the network starts rejecting new ones
+try:
+    storage_watermarks = StorageWatermarks(
+        high=config.get('sim_high_watermark', SIM_HIGH_WATERMARK),
+        low=config.get('sim_low_watermark', SIM_LOW_WATERMARK),
+        alert=config.get('sim_alert_level', SIM_ALERT_LEVEL),
+    )
+except ValueError as e:
+    logging.warning(f"{e}, using defaults")
+    storage_watermarks = StorageWatermarks()
+mqtt_publisher.set_storage_watermarks(storage_watermarks)
+
+# Received SMS go to per-rule topics, webhooks or auto-replies instead of sms/state (rules file reloads itself)
+sms_router = SmsRouter(config.get('sms_routing_file') or SMS_ROUTING_FILE, webhook_secret=config.get('webhook_secret', ''))
+mqtt_publisher.set_sms_router(sms_router)
+mqtt_publisher.add_event_consumer(sms_router.needs_polling)
+
+# Signal/network samples from the periodic status poll, /status/history answers from memory
+signal_history = None
+if config.get('signal_history_enabled', True):
+    signal_history = SignalHistory()
+    mqtt_publisher.set_signal_history(signal_history)
+
+# ETags of polled read endpoints, versions bump when the gateway sees the data change
+etag_max_age = config.get('etag_max_age', ETAG_MAX_AGE)
+inbox_version = ResourceVersion("sms", etag_max_age)
+signal_version = ResourceVersion("signal", etag_max_age)
+network_version = ResourceVersion("network", etag_max_age)
+
+def _track_versions(event_type, data):
+    """Monitor loop and periodic status updates keep the versions current between polls"""
+    if event_type == "sms_received":
+        inbox_version.invalidate()
+    elif event_type == "signal":
+        signal_version.update(data)
+    elif event_type == "network":
+        network_version.update(data)
+    elif event_type == "storage" and data.get("offloaded"):
+        inbox_version.invalidate()
+
+mqtt_publisher.add_event_listener(_track_versions)
+
+
+def reinit_modem():
+    """Re-initialize the modem after device_path/pin/connection changed, REST answers 503 meanwhile"""
+    global machine
+    old_machine = machine
+    machine = None
+    mqtt_publisher.detach_gammu_machine()
+    # Let a running inbox read finish on the old connection
+    with mqtt_publisher.inbox_lock:
+        if old_machine is not None:
+            try:
+                old_machine.Terminate()
+            except Exception as e:
+                logging.warning(f"Closing previous modem connection failed: {e}")
+    try:
+        init_modem()
+        logging.info(f"📱 Modem re-initialized on {device_path}")
+    except BaseException as e:  # Includes SystemExit for a missing PIN
+        logging.error(f"❌ Modem re-initialization failed: {e}")
+
+
+def _apply_config(old, new, changed):
+    """Apply reloaded settings to the running gateway (ConfigReloader callback)"""
+    global config, _credentials, pin, device_path, connection, debug_enabled
+    restart_required = [key for key in changed if key in RESTART_KEYS]
+    modem_reinit = any(key in MODEM_KEYS for key in changed)
+
+    # Rebinding is atomic: a request sees either the old or the new settings, never a mix
+    config = new
+    _credentials = (new.get('username', 'admin'), new.get('password', 'password'))
+    mqtt_publisher.reconfigure(new)
+
+    idempotency_store.ttl = new.get('idempotency_ttl', 86400)
+    idempotency_store.max_entries = new.get('idempotency_max_keys', 1000)
+    mqtt_publisher.reassembly_buffer.timeout = new.get('multipart_timeout', MULTIPART_TIMEOUT)
+    mqtt_publisher.reassembly_buffer.max_pending = new.get('multipart_max_pending', MULTIPART_MAX_PENDING)
+    send_scheduler.min_interval = new.get('scheduled_send_interval', SEND_INTERVAL)
+    message_store.retention_days = new.get('history_retention_days', RETENTION_DAYS)
+    if 'sms_routing_file' in changed:
+        sms_router.path = new.get('sms_routing_file') or SMS_ROUTING_FILE
+        sms_router.reload()
+    try:
+        mqtt_publisher.set_storage_watermarks(StorageWatermarks(
+            high=new.get('sim_high_watermark', SIM_HIGH_WATERMARK),
+            low=new.get('sim_low_watermark', SIM_LOW_WATERMARK),
+            alert=new.get('sim_alert_level', SIM_ALERT_LEVEL),
+        ))
+    except ValueError as e:
+        logging.warning(f"{e}, keeping previous watermarks")
+    for version in (inbox_version, signal_version, network_version):
+        version.max_age = new.get('etag_max_age', ETAG_MAX_AGE)
+
+    debug_enabled = new.get('debug', False)
+    level = logging.DEBUG if debug_enabled else logging.INFO
+    logging.getLogger().setLevel(level)
+    mqtt_logger.setLevel(level)
+    set_redaction(new.get('log_redact', False))
+    limiter = rate_limit_filter()
+    if limiter is not None:
+        limiter.limit = new.get('log_rate_limit', LOG_RATE_LIMIT)
+
+    if restart_required:
+        logging.warning(f"Restart the add-on to apply: {', '.join(restart_required)}")
+    if modem_reinit:
+        pin = new.get('pin') or None
+        device_path = new.get('device_path', '/dev/ttyUSB0')
+        connection = new.get('connection', 'at')
+        threading.Thread(target=reinit_modem, name="modem-reinit", daemon=True).start()
+    return {"restart_required": restart_required, "modem_reinit": modem_reinit}
+
+
+# Options and secrets changes are applied live, the modem only restarts for device_path/pin/connection
+config_reloader = ConfigReloader(config, load_config, _apply_config, watch_paths=(OPTIONS_FILE,) + SECRET_FILES)
 
 app = Flask(__name__)
 app.config['JSON_AS_ASCII'] = False  # Allow Cyrillic characters in JSON responses
-app.config['RESTX_JSON'] = {'ensure_ascii': False}
 
 # Check if running under Ingress
 ingress_path = os.environ.get('INGRESS_PATH', '')
 
-# Create simple HTML page for Ingress
-@app.route('/')
-def home():
+# Ingress page only differs by host name, it is built once per name
+HOME_PAGE_CACHE_HOSTS = 32
+_home_pages = {}
+
+def _build_home_page(hostname):
     """Simple status page for Home Assistant Ingress"""
-    from flask import Response, request
     html = '''
     <!DOCTYPE html>
     <html>
@@ -238,7 +553,7 @@ def home():
                 Version: 2.1.0
             </div>
             
-            <a href="http://''' + request.host.split(':')[0] + ''':5000/docs/" 
+            <a href="http://''' + hostname + ''':5000/docs/" 
                class="swagger-link" target="_blank">
                 📋 Open Swagger API Documentation
             </a>
@@ -259,7 +574,19 @@ def home():
     </body>
     </html>
     '''
-    return Response(html, mimetype='text/html')
+    return CachedBody(html.encode('utf-8'), 'text/html')
+
+@app.route('/')
+def home():
+    """Simple status page for Home Assistant Ingress"""
+    hostname = request.host.split(':')[0]
+    page = _home_pages.get(hostname)
+    if page is None:
+        page = _build_home_page(hostname)
+        # Host header comes from the client, don't let it grow the cache without bound
+        if len(_home_pages) < HOME_PAGE_CACHE_HOSTS:
+            _home_pages[hostname] = page
+    return page.response(request)
 
 # Swagger UI Configuration  
 # Put Swagger UI on /docs/ path for direct access via port 5000
@@ -282,18 +609,62 @@ api = Api(
 
 auth = HTTPBasicAuth()
 
+@api.representation('application/json')
+def output_json(data, code, headers=None):
+    """Encode API responses with the shared serializer (orjson when installed)"""
+    response = make_response(dumps_bytes(data) + b"\n", code)
+    response.headers.extend(headers or {})
+    return response
+
+@app.after_request
+def compress(response):
+    """gzip large listings for clients that accept it"""
+    return compress_response(response, request)
+
+# Swagger JSON doesn't change while running, encode and compress it once
+_swagger_json = None
+
+def swagger_json():
+    global _swagger_json
+    schema = api.__schema__
+    if "error" in schema:
+        return output_json(schema, 500)
+    if _swagger_json is None:
+        _swagger_json = CachedBody(dumps_bytes(schema), 'application/json')
+    return _swagger_json.response(request)
+
+app.view_functions[api.endpoint('specs')] = swagger_json
+
+@api.errorhandler(ModemNotReady)
+def handle_modem_not_ready(error):
+    """Answer 503 with Retry-After while the modem is initializing"""
+    return ({"status": 503, "message": "Modem is still initializing, retry shortly"}, 503,
+            {"Retry-After": str(MODEM_RETRY_AFTER_SECONDS)})
+
+# Expected during startup, flask-restx would log a traceback for every 503
+app.logger.addFilter(lambda record: not (record.exc_info and isinstance(record.exc_info[1], ModemNotReady)))
+
 @auth.verify_password
 def verify(user, pwd):
     if not (user and pwd):
         return False
+    username, password = _credentials
     return user == username and pwd == password
 
+def _authorized(header):
+    """Authorization header value passes basic auth (for requests answered outside Flask)"""
+    credentials = Authorization.from_header(header)
+    return credentials is not None and verify(credentials.username, credentials.password)
+
 # API Models for Swagger documentation
 sms_model = api.model('SMS', {
     'text': fields.String(required=True, description='SMS message text', example='Hello, how are you?'),
     'number': fields.String(required=True, description='Phone number (international format)', example='+420123456789'),
     'smsc': fields.String(required=False, description='SMS Center number (optional)', example='+420603052000'),
-    'unicode': fields.Boolean(required=False, description='Force Unicode encoding (auto-enabled for non-ASCII text)', default=False)
+    'unicode': fields.Boolean(required=False, description='Force Unicode encoding (auto-enabled for non-ASCII text)', default=False),
+    'delivery_report': fields.Boolean(required=False, description='Request delivery status report (defaults to add-on option delivery_reports)'),
+    'send_at': fields.String(required=False, description='Send later: ISO 8601 date/time (local time without offset) or unix timestamp', example='2025-01-19T08:00:00'),
+    'window': fields.Integer(required=False, description='Spread sends over this many seconds from send_at (or now)', example=3600)
 })
 
 sms_response = api.model('SMS Response', {
@@ -317,9 +688,118 @@ network_response = api.model('Network Info', {
     'LAC': fields.String(description='Location Area Code', example='1234')
 })
 
+storage_response = api.model('SMS Storage', {
+    'SIMUsed': fields.Integer(description='SMS stored on the SIM', example=12),
+    'SIMSize': fields.Integer(description='SMS capacity of the SIM', example=30),
+    'SIMPercent': fields.Integer(description='SIM occupancy in percent', example=40),
+    'PhoneUsed': fields.Integer(description='SMS stored in modem memory', example=0),
+    'PhoneSize': fields.Integer(description='SMS capacity of modem memory (0 = none)', example=0),
+    'PhonePercent': fields.Integer(description='Modem memory occupancy in percent', example=None),
+    'level': fields.String(description='ok, high (offloading), alert or full', example='ok')
+})
+
+signal_sample_response = api.model('Signal Sample', {
+    'time': fields.String(description='Sample time (bucket start for minute/hour)', example='2025-01-19 14:30:00'),
+    'timestamp': fields.Float(description='Sample time as unix timestamp', example=1737293400.0),
+    'signal_dbm': fields.Float(description='Signal strength in dBm (average for minute/hour)', example=-75.0),
+    'signal_dbm_min': fields.Float(description='Weakest signal in the bucket (minute/hour only)', example=-81.0),
+    'signal_percent': fields.Float(description='Signal strength percentage', example=65.0),
+    'ber': fields.Float(description='Bit error rate (-1 = unknown)', example=-1.0),
+    'network_code': fields.String(description='Network operator code', example='230 01'),
+    'lac': fields.String(description='Location Area Code', example='1234'),
+    'cid': fields.String(description='Cell ID', example='A1B2C3D'),
+    'samples': fields.Integer(description='Samples in the bucket (minute/hour only)', example=1)
+})
+
+routing_rule_response = api.model('SMS Routing Rule', {
+    'name': fields.String(description='Rule name', example='alarm'),
+    'action': fields.String(description='mqtt, webhook, reply or drop', example='mqtt'),
+    'from': fields.List(fields.String, description='Sender numbers, prefix* patterns or * (empty = any)', example=['+420800*']),
+    'text': fields.String(description='Text regex (empty = any text)', example='alarm|intrusion'),
+    'target': fields.String(description='Topic, webhook URL or reply text', example='alarm'),
+    'continue': fields.Boolean(description='Later rules are checked after this one matched', example=False),
+    'hits': fields.Integer(description='SMS matched since start', example=12),
+    'last_hit': fields.String(description='Time of the last match', example='2025-01-19 14:30:00')
+})
+
+routing_response = api.model('SMS Routing', {
+    'file': fields.String(description='Rules file', example='/share/sms_gateway/routing.yaml'),
+    'error': fields.String(description='Why the file was not loaded (previous rules stay active)', example=None),
+    'rules': fields.List(fields.Nested(routing_rule_response), description='Rules in match order')
+})
+
+signal_history_response = api.model('Signal History', {
+    'resolution': fields.String(description='raw, minute or hour', example='minute'),
+    'samples': fields.List(fields.Nested(signal_sample_response), description='Samples, oldest first')
+})
+
 send_response = api.model('Send Response', {
     'status': fields.Integer(description='HTTP status code', example=200),
-    'message': fields.String(description='Response message', example='[1]')
+    'message': fields.String(description='Response message', example='[1]'),
+    'delivery_ids': fields.List(fields.String, description='Delivery tracking IDs (one per recipient) when status reports were requested', example=['3f9a1c2b7d4e5f60']),
+    'schedule_ids': fields.List(fields.String, description='Scheduled send IDs (one per recipient) when send_at or window was given', example=['9b2d4f6a8c0e1a3b'])
+})
+
+scheduled_response = api.model('Scheduled SMS', {
+    'id': fields.String(description='Scheduled send ID', example='9b2d4f6a8c0e1a3b'),
+    'number': fields.String(description='Recipient phone number', example='+420123456789'),
+    'text': fields.String(description='SMS message text', example='Reminder: meeting at 10:00'),
+    'send_at': fields.String(description='Planned send time', example='2025-01-19 08:00:00'),
+    'source': fields.String(description='rest or mqtt', example='rest'),
+    'state': fields.String(description='scheduled or sending', example='scheduled')
+})
+
+history_response = api.model('SMS History Entry', {
+    'id': fields.Integer(description='History entry ID', example=1842),
+    'direction': fields.String(description='in (received) or out (sent part)', example='in'),
+    'number': fields.String(description='Sender or recipient phone number', example='+420123456789'),
+    'text': fields.String(description='SMS text (of this part for sent multipart SMS)', example='Hello World!'),
+    'state': fields.String(description='SMS state (UnRead, Read, Sent)', example='Read'),
+    'date': fields.String(description='Date and time received or sent', example='2025-01-19 14:30:00'),
+    'reference': fields.Integer(description='Message reference of a sent part', example=42),
+    'part': fields.Integer(description='Part number of a sent multipart SMS', example=1),
+    'parts': fields.Integer(description='Number of parts', example=1)
+})
+
+search_response = api.clone('SMS Search Result', history_response, {
+    'score': fields.Float(description='Relevance (higher is better)', example=7.42),
+    'snippet': fields.String(description='Matching text with hits in [brackets]', example='Your code is [483920]')
+})
+
+delivery_part = api.model('Delivery Part', {
+    'reference': fields.Integer(description='Message reference assigned by the network', example=42),
+    'state': fields.String(description='Part delivery state', example='delivered'),
+    'status': fields.Integer(description='TP-Status from the status report', example=0),
+    'delivered_at': fields.String(description='Discharge time reported by SMSC', example='2025-01-19 14:30:05'),
+    'latency_seconds': fields.Float(description='Submit-to-delivery latency', example=4.0)
+})
+
+delivery_response = api.model('Delivery Status', {
+    'id': fields.String(description='Delivery tracking ID', example='3f9a1c2b7d4e5f60'),
+    'number': fields.String(description='Recipient phone number', example='+420123456789'),
+    'state': fields.String(description='pending, delivered, failed or expired', example='delivered'),
+    'submitted_at': fields.String(description='Time the message was handed to the modem', example='2025-01-19 14:30:00'),
+    'latency_seconds': fields.Float(description='Submit-to-delivery latency of the slowest part', example=4.0),
+    'parts': fields.List(fields.Nested(delivery_part))
+})
+
+# Hot read endpoints skip marshal(), the models above still document them
+sms_projection = Projection(sms_response)
+signal_projection = Projection(signal_response)
+network_projection = Projection(network_response)
+history_projection = Projection(history_response)
+search_projection = Projection(search_response)
+
+reload_response = api.model('Config Reload', {
+    'changed': fields.List(fields.String, description='Options that changed (names only)', example=['mqtt_host', 'sms_check_interval']),
+    'restart_required': fields.List(fields.String, description='Changed options that only apply after an add-on restart', example=[]),
+    'modem_reinit': fields.Boolean(description='Modem is being re-initialized (device_path, pin or connection changed)', example=False)
+})
+
+debug_dump_response = api.model('Gammu Debug Dump', {
+    'name': fields.String(description='Dump file name', example='gammu-debug-20250119-143000.log'),
+    'size': fields.Integer(description='Size in bytes', example=524288),
+    'created': fields.String(description='Time the dump was written', example='2025-01-19 14:30:00')
 })
 
 reset_response = api.model('Reset Response', {
@@ -327,28 +807,100 @@ reset_response = api.model('Reset Response', {
     'message': fields.String(description='Reset message', example='Reset done')
 })
 
+def _idempotent_replay(entry, fingerprint):
+    """Build response for a request whose Idempotency-Key was already seen"""
+    if entry.get("fingerprint") and entry["fingerprint"] != fingerprint:
+        return {"status": 422, "message": "Idempotency-Key was already used for a different request"}, 422
+    if entry.get("status") == STATUS_IN_PROGRESS:
+        return {"status": 409, "message": "Request with this Idempotency-Key is still in progress"}, 409
+    result = entry.get("result") or {}
+    return result, result.get("status", 200), {"Idempotent-Replayed": "true"}
+
+def _emit_send_status(status, number, text, references, **details):
+    """Notify event listeners (webhooks) of a REST send, same fields as MQTT send_status"""
+    status_data = {
+        "status": status,
+        "number": number,
+        "text": text,
+        "references": references,
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "source": "rest",
+    }
+    status_data.update({key: value for key, value in details.items() if value is not None})
+    mqtt_publisher.emit_event("send_status", status_data)
+
+def _schedule_send(args, sms_number, sms_text, unicode_requested, delivery_report, idempotency_key):
+    """Hand a POST /sms with send_at/window to the send scheduler, answers 202"""
+    try:
+        jobs = send_scheduler.schedule(
+            [number.strip() for number in sms_number.split(',') if number.strip()], sms_text,
+            send_at=parse_send_at(args.get('send_at')), window=parse_window(args.get('window')),
+            unicode=unicode_requested, smsc=args.get('smsc'), delivery_report=delivery_report, source="rest",
+        )
+    except (ValueError, OverflowError) as e:
+        if idempotency_key:
+            idempotency_store.release(idempotency_key)
+        status_code = 400 if isinstance(e, ValueError) else 503
+        return {"status": status_code, "message": str(e)}, status_code
+    first = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(min(job["due_at"] for job in jobs)))
+    response = {
+        "status": 202,
+        "message": f"Scheduled {len(jobs)} SMS from {first}",
+        "schedule_ids": [job["id"] for job in jobs],
+    }
+    if idempotency_key:
+        idempotency_store.complete(idempotency_key, response)
+    return response, 202
+
+def _read_inbox():
+    """Read SMS from modem, delivery status reports are consumed by the tracker and
+    incomplete multipart SMS are left on the SIM until their parts arrive"""
+    gammu_machine = _require_machine()
+    allSms = mqtt_publisher.track_gammu_operation("retrieveAllSms", retrieveAllSms, gammu_machine)
+    allSms = mqtt_publisher.hold_incomplete_sms(mqtt_publisher.process_status_reports(gammu_machine, allSms))
+    return mqtt_publisher.archive_received_sms(allSms)
+
+def _cached_status(kind, projection):
+    """Last known signal/network state while the modem is initializing"""
+    cached = mqtt_publisher.last_status.get(kind)
+    if machine is None and cached is not None:
+        return projection(cached), 200, {"Modem-Initializing": "true"}
+    return None
+
 # API Namespaces
 ns_sms = api.namespace('sms', description='SMS operations (requires authentication)')
 ns_status = api.namespace('status', description='Device status and information (public)')
+ns_debug = api.namespace('debug', description='Diagnostics (requires authentication)')
+ns_config = api.namespace('config', description='Add-on configuration (requires authentication)')
+ns_events = api.namespace('events', description='Live gateway events as Server-Sent Events (requires authentication)')
 
 @ns_sms.route('')
 @ns_sms.doc('sms_operations')
 class SmsCollection(Resource):
     @ns_sms.doc('get_all_sms')
-    @ns_sms.marshal_list_with(sms_response)
+    @ns_sms.response(200, 'Success', [sms_response])
+    @ns_sms.response(304, 'Not modified since the ETag sent in If-None-Match')
     @ns_sms.doc(security='basicAuth')
     @auth.login_required
     def get(self):
         """Get all SMS messages from SIM/device memory"""
-        allSms = mqtt_publisher.track_gammu_operation("retrieveAllSms", retrieveAllSms, machine)
-        list(map(lambda sms: sms.pop("Locations", None), allSms))
-        return allSms
+        if inbox_version.not_modified(request):
+            return not_modified(inbox_version)
+        # Monitor loop must not delete SMS between our read and the version update
+        with mqtt_publisher.inbox_lock:
+            allSms = sms_projection.many(_read_inbox())
+            inbox_version.update(allSms)
+        return conditional(allSms, inbox_version, request)
 
-    @ns_sms.doc('send_sms')
+    @ns_sms.doc('send_sms', params={'Idempotency-Key': {
+        'in': 'header',
+        'type': 'string',
+        'description': 'Optional unique key; retries with the same key return the original result instead of sending again'
+    }})
     @ns_sms.expect(sms_model)
-    @ns_sms.marshal_with(send_response)
     @ns_sms.doc(security='basicAuth')
     @auth.login_required
+    @ns_sms.marshal_with(send_response, skip_none=True)
     def post(self):
         """Send SMS message(s)"""
         parser = reqparse.RequestParser()
@@ -358,6 +910,9 @@ class SmsCollection(Resource):
         parser.add_argument('target', required=False, help='Phone number (alias for number)')
         parser.add_argument('smsc', required=False, help='SMS Center number (optional)')
         parser.add_argument('unicode', required=False, help='Use Unicode encoding (true/false, auto-detected if omitted)')
+        parser.add_argument('delivery_report', required=False, help='Request delivery status report (true/false)')
+        parser.add_argument('send_at', required=False, help='Send later (ISO 8601 or unix timestamp)')
+        parser.add_argument('window', required=False, help='Spread sends over this many seconds')
         
         args = parser.parse_args()
         
@@ -394,86 +949,323 @@ class SmsCollection(Resource):
         if unicode_enabled:
             smsinfo["Coding"] = "Unicode"
         
-        messages = []
-        for number in sms_number.split(','):
-            for message in encodeSms(smsinfo):
-                message["SMSC"] = {'Number': args.get("smsc")} if args.get("smsc") else {'Location': 1}
-                message["Number"] = number.strip()
-                messages.append(message)
-        result = [mqtt_publisher.track_gammu_operation("SendSMS", machine.SendSMS, message) for message in messages]
-        return {"status": 200, "message": str(result)}, 200
+        idempotency_key = (request.headers.get('Idempotency-Key') or '').strip()
+        if idempotency_key:
+            fingerprint = request_fingerprint(sms_number, sms_text)
+            existing = idempotency_store.begin(idempotency_key, fingerprint)
+            if existing is not None:
+                logging.info(f"Idempotency-Key '{idempotency_key}' already seen, not sending again")
+                return _idempotent_replay(existing, fingerprint)
+
+        delivery_report = mqtt_publisher.delivery_reports_requested(args.get('delivery_report'))
+        if args.get('send_at') is not None or args.get('window') is not None:
+            return _schedule_send(args, sms_number, sms_text, unicode_requested, delivery_report, idempotency_key)
+
+        delivery_ids = []
+        result = []
+        try:
+            gammu_machine = _require_machine(wait=MODEM_READY_SEND_TIMEOUT)
+            for number in sms_number.split(','):
+                messages = []
+                for message in encodeSms(smsinfo):
+                    message["SMSC"] = {'Number': args.get("smsc")} if args.get("smsc") else {'Location': 1}
+                    message["Number"] = number.strip()
+                    if delivery_report:
+                        # Submit PDU with status report request
+                        message["Type"] = "Status_Report"
+                    messages.append(message)
+                # Each part is retried on its own, sent parts are never resent
+                references = mqtt_publisher.send_sms_parts(gammu_machine, messages)
+                result.extend(references)
+                if delivery_report:
+                    delivery_ids.append(delivery_tracker.register(number.strip(), references))
+        except SmsSendError as e:
+            result.extend(e.sent_references)
+            status_code = 503 if e.error_class == ERROR_CLASS_TRANSIENT else 500
+            response = {
+                "status": status_code,
+                "message": f"{e} (part {e.failed_part}/{e.total_parts}, {e.attempts} attempt(s), sent: {result})"
+            }
+            if idempotency_key:
+                if result:
+                    # Some parts already went out, a retry must not resend them
+                    idempotency_store.complete(idempotency_key, response)
+                else:
+                    idempotency_store.release(idempotency_key)
+            _emit_send_status("error", sms_number, sms_text, result, error=str(e), error_class=e.error_class,
+                              attempts=e.attempts, failed_part=e.failed_part, total_parts=e.total_parts)
+            return response, status_code
+        except Exception:
+            if idempotency_key:
+                # Nothing confirmed to the client, allow the retry to send
+                idempotency_store.release(idempotency_key)
+            raise
+
+        response = {"status": 200, "message": str(result)}
+        if delivery_ids:
+            response["delivery_ids"] = delivery_ids
+        if idempotency_key:
+            idempotency_store.complete(idempotency_key, response)
+        _emit_send_status("success", sms_number, sms_text, result, delivery_ids=delivery_ids or None)
+        return response, 200
+
+@ns_sms.route('/scheduled')
+@ns_sms.doc('scheduled_sms')
+class ScheduledSmsCollection(Resource):
+    @ns_sms.doc('list_scheduled_sms')
+    @ns_sms.doc(security='basicAuth')
+    @auth.login_required
+    @ns_sms.marshal_list_with(scheduled_response)
+    def get(self):
+        """List SMS waiting to be sent (send_at/window)"""
+        return [dict(job, send_at=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job["due_at"])))
+                for job in send_scheduler.jobs()]
+
+@ns_sms.route('/scheduled/<string:job_id>')
+@ns_sms.doc('scheduled_sms_by_id')
+class ScheduledSmsItem(Resource):
+    @ns_sms.doc('cancel_scheduled_sms')
+    @ns_sms.doc(security='basicAuth')
+    @auth.login_required
+    def delete(self, job_id):
+        """Cancel a scheduled SMS that was not sent yet"""
+        if not send_scheduler.cancel(job_id):
+            api.abort(404, f"Scheduled SMS '{job_id}' not found or already sending")
+        return '', 204
+
+history_parser = reqparse.RequestParser()
+history_parser.add_argument('direction', choices=('in', 'out'), location='args', help='in (received) or out (sent)')
+history_parser.add_argument('number', location='args', help='Only messages from/to this number')
+history_parser.add_argument('state', location='args', help='Only messages in this state (UnRead, Read, Sent)')
+history_parser.add_argument('since', location='args', help='From this date/time, e.g. 2025-01-19 or 2025-01-19T08:00')
+history_parser.add_argument('until', location='args', help='Up to this date/time (a bare date includes the whole day)')
+history_parser.add_argument('limit', type=int, default=100, location='args', help=f'Max entries (up to {MAX_HISTORY_LIMIT})')
+history_parser.add_argument('offset', type=int, default=0, location='args', help='Entries to skip (paging)')
+
+@ns_sms.route('/history')
+@ns_sms.doc('sms_history')
+class SmsHistory(Resource):
+    @ns_sms.doc('get_sms_history')
+    @ns_sms.expect(history_parser)
+    @ns_sms.response(200, 'Success', [history_response])
+    @ns_sms.doc(security='basicAuth')
+    @auth.login_required
+    def get(self):
+        """Get received and sent SMS from the gateway history, newest first (no modem access)"""
+        args = history_parser.parse_args()
+        return history_projection.many(message_store.history(**args))
+
+search_parser = history_parser.copy()
+search_parser.add_argument('q', required=True, location='args',
+                           help='Words (all must match), "exact phrase" or prefix* e.g. "code is" 48*')
+search_parser.replace_argument('limit', type=int, default=20, location='args', help=f'Max results (up to {MAX_HISTORY_LIMIT})')
+
+@ns_sms.route('/search')
+@ns_sms.doc('sms_search')
+class SmsSearch(Resource):
+    @ns_sms.doc('search_sms')
+    @ns_sms.expect(search_parser)
+    @ns_sms.response(200, 'Success', [search_response])
+    @ns_sms.response(400, 'Empty or missing query')
+    @ns_sms.response(503, 'Full-text search unavailable')
+    @ns_sms.doc(security='basicAuth')
+    @auth.login_required
+    def get(self):
+        """Full-text search of received and sent SMS in the gateway history, best match first"""
+        args = search_parser.parse_args()
+        if message_store.enabled and not message_store.search_available:
+            api.abort(503, "Full-text search is not available (SQLite without FTS5)")
+        try:
+            results = message_store.search(**args)
+        except ValueError as e:
+            api.abort(400, str(e))
+        return search_projection.many(results)
+
+@ns_sms.route('/routing')
+@ns_sms.doc('sms_routing')
+class SmsRouting(Resource):
+    @ns_sms.doc('get_sms_routing')
+    @ns_sms.response(200, 'Success', routing_response)
+    @ns_sms.doc(security='basicAuth')
+    @auth.login_required
+    def get(self):
+        """Get SMS routing rules with hit counters"""
+        sms_router.refresh()
+        return {"file": sms_router.path, "error": sms_router.error, "rules": sms_router.rules()}
 
 @ns_sms.route('/<int:id>')
 @ns_sms.doc('sms_by_id')
 class SmsItem(Resource):
     @ns_sms.doc('get_sms_by_id')
-    @ns_sms.marshal_with(sms_response)
+    @ns_sms.response(200, 'Success', sms_response)
     @ns_sms.doc(security='basicAuth')
     @auth.login_required
     def get(self, id):
         """Get specific SMS by ID"""
-        allSms = mqtt_publisher.track_gammu_operation("retrieveAllSms", retrieveAllSms, machine)
+        allSms = _read_inbox()
         if id < 0 or id >= len(allSms):
             api.abort(404, f"SMS with id '{id}' not found")
-        sms = allSms[id]
-        sms.pop("Locations", None)
-        return sms
+        return sms_projection(allSms[id])
 
     @ns_sms.doc('delete_sms_by_id')
     @ns_sms.doc(security='basicAuth')
     @auth.login_required
     def delete(self, id):
         """Delete SMS by ID"""
-        allSms = mqtt_publisher.track_gammu_operation("retrieveAllSms", retrieveAllSms, machine)
+        allSms = _read_inbox()
         if id < 0 or id >= len(allSms):
             api.abort(404, f"SMS with id '{id}' not found")
-        mqtt_publisher.track_gammu_operation("deleteSms", deleteSms, machine, allSms[id])
+        mqtt_publisher.track_gammu_operation("deleteSms", deleteSms, _require_machine(), allSms[id])
+        inbox_version.invalidate()
         return '', 204
 
+@ns_sms.route('/delivery')
+@ns_sms.doc('delivery_reports')
+class DeliveryCollection(Resource):
+    @ns_sms.doc('list_delivery_reports')
+    @ns_sms.doc(security='basicAuth')
+    @auth.login_required
+    @ns_sms.marshal_list_with(delivery_response)
+    def get(self):
+        """Get delivery state of recently sent SMS (newest first)"""
+        return delivery_tracker.recent()
+
+@ns_sms.route('/delivery/<string:delivery_id>')
+@ns_sms.doc('delivery_report_by_id')
+class DeliveryItem(Resource):
+    @ns_sms.doc('get_delivery_report')
+    @ns_sms.doc(security='basicAuth')
+    @auth.login_required
+    @ns_sms.marshal_with(delivery_response)
+    def get(self, delivery_id):
+        """Get delivery state and latency of a sent SMS"""
+        job = delivery_tracker.get(delivery_id)
+        if job is None:
+            api.abort(404, f"Delivery report '{delivery_id}' not found")
+        return job
+
+def _getsms_wait(value):
+    """Seconds GET /sms/getsms may wait for an SMS, ValueError when value isn't a number"""
+    wait = min(max(int(value), 0), GETSMS_MAX_WAIT)
+    # Nothing would wake a waiter while monitoring is off, waiters are fed by the monitor loop
+    return wait if config.get('sms_monitoring_enabled', True) else 0
+
 @ns_sms.route('/getsms')
 @ns_sms.doc('get_and_delete_first_sms')
 class GetSms(Resource):
-    @ns_sms.doc('pop_first_sms')
-    @ns_sms.marshal_with(sms_response)
+    @ns_sms.doc('pop_first_sms', params={'wait': {
+        'in': 'query',
+        'type': 'integer',
+        'description': f'Seconds to wait for an SMS when the inbox is empty (long polling, max {GETSMS_MAX_WAIT})'
+    }})
+    @ns_sms.response(200, 'Success', sms_response)
     @ns_sms.doc(security='basicAuth')
     @auth.login_required
     def get(self):
         """Get first SMS and delete it from memory"""
-        allSms = mqtt_publisher.track_gammu_operation("retrieveAllSms", retrieveAllSms, machine)
-        sms = {"Date": "", "Number": "", "State": "", "Text": ""}
-        if len(allSms) > 0:
-            sms = allSms[0]
-            mqtt_publisher.track_gammu_operation("deleteSms", deleteSms, machine, sms)
-            sms.pop("Locations", None)
+        try:
+            wait = _getsms_wait(request.args.get('wait', 0))
+        except ValueError:
+            api.abort(400, "wait must be a number of seconds")
+
+        # SMS the monitor already took off the SIM come first
+        sms = inbox_queue.get()
+        if sms is None:
+            with mqtt_publisher.inbox_lock:
+                allSms = _read_inbox()
+                if len(allSms) > 0:
+                    sms = allSms[0]
+                    mqtt_publisher.track_gammu_operation("deleteSms", deleteSms, _require_machine(), sms)
+                    inbox_version.invalidate()
+                    sms.pop("Locations", None)
             # Publish to MQTT if enabled and SMS has content
-            if sms.get("Text"):
+            if sms is not None and sms.get("Text"):
                 mqtt_publisher.publish_sms_received(sms)
-        return sms
+        if sms is None and wait:
+            sms = inbox_queue.get(timeout=wait)
+        return sms_projection(sms) if sms else {"Date": "", "Number": "", "State": "", "Text": ""}
 
 @ns_status.route('/signal')
 @ns_status.doc('get_signal_quality')
 class Signal(Resource):
     @ns_status.doc('signal_strength')
-    @ns_status.marshal_with(signal_response)
+    @ns_status.response(200, 'Success', signal_response)
+    @ns_status.response(304, 'Not modified since the ETag sent in If-None-Match')
     def get(self):
         """Get GSM signal strength and quality"""
-        signal_data = mqtt_publisher.track_gammu_operation("GetSignalQuality", machine.GetSignalQuality)
-        # Publish to MQTT if enabled
+        cached = _cached_status("signal", signal_projection)
+        if cached is not None:
+            return cached
+        if signal_version.not_modified(request):
+            return not_modified(signal_version)
+        signal_data = mqtt_publisher.track_gammu_operation("GetSignalQuality", _require_machine().GetSignalQuality)
+        # Publish to MQTT if enabled (also updates signal_version)
         mqtt_publisher.publish_signal_strength(signal_data)
-        return signal_data
+        return conditional(signal_projection(signal_data), signal_version, request)
 
 @ns_status.route('/network')
 @ns_status.doc('get_network_info')
 class Network(Resource):
     @ns_status.doc('network_information')
-    @ns_status.marshal_with(network_response)
+    @ns_status.response(200, 'Success', network_response)
+    @ns_status.response(304, 'Not modified since the ETag sent in If-None-Match')
     def get(self):
         """Get network operator and registration information"""
-        network = mqtt_publisher.track_gammu_operation("GetNetworkInfo", machine.GetNetworkInfo)
+        from gammu import GSMNetworks
+        cached = _cached_status("network", network_projection)
+        if cached is not None:
+            return cached
+        if network_version.not_modified(request):
+            return not_modified(network_version)
+        network = mqtt_publisher.track_gammu_operation("GetNetworkInfo", _require_machine().GetNetworkInfo)
         network["NetworkName"] = GSMNetworks.get(network.get("NetworkCode", ""), 'Unknown')
         # Publish to MQTT if enabled
         mqtt_publisher.publish_network_info(network)
-        return network
+        return conditional(network_projection(network), network_version, request)
+
+@ns_status.route('/storage')
+@ns_status.doc('get_sms_storage')
+class Storage(Resource):
+    @ns_status.doc('sms_storage')
+    @ns_status.marshal_with(storage_response)
+    def get(self):
+        """Get SMS memory occupancy of SIM and modem"""
+        cached = mqtt_publisher.last_status.get("storage")
+        if machine is None and cached is not None:
+            return cached, 200, {"Modem-Initializing": "true"}
+        status = mqtt_publisher.track_gammu_operation("GetSMSStatus", _require_machine().GetSMSStatus)
+        occupancy = storage_occupancy(status)
+        occupancy["level"] = mqtt_publisher.storage_watermarks.level(occupancy)
+        return occupancy
+
+signal_history_parser = reqparse.RequestParser()
+signal_history_parser.add_argument('since', location='args', help='From this time, ISO 8601 (e.g. 2025-01-19T08:00) or unix timestamp')
+signal_history_parser.add_argument('until', location='args', help='Up to this time, ISO 8601 or unix timestamp')
+signal_history_parser.add_argument('resolution', choices=('auto', 'raw', 'minute', 'hour'), default='auto', location='args',
+                                   help='auto picks the finest tier that reaches back to since')
+signal_history_parser.add_argument('limit', type=int, default=MAX_HISTORY_POINTS, location='args',
+                                   help=f'Max samples, the newest are kept (up to {MAX_HISTORY_POINTS})')
+
+@ns_status.route('/history')
+@ns_status.doc('get_signal_history')
+class SignalHistoryResource(Resource):
+    @ns_status.doc('signal_history')
+    @ns_status.expect(signal_history_parser)
+    @ns_status.response(200, 'Success', signal_history_response)
+    @ns_status.response(400, 'Invalid time')
+    @ns_status.response(404, 'Signal history disabled')
+    def get(self):
+        """Get signal strength and cell history recorded by the gateway (no modem access)"""
+        if signal_history is None:
+            api.abort(404, "Signal history is disabled (signal_history_enabled)")
+        args = signal_history_parser.parse_args()
+        try:
+            since, until = parse_time(args['since']), parse_time(args['until'])
+        except ValueError as e:
+            api.abort(400, str(e))
+        resolution = None if args['resolution'] == 'auto' else args['resolution']
+        resolution, samples = signal_history.query(since, until, resolution, args['limit'])
+        return {"resolution": resolution, "samples": samples}
 
 @ns_status.route('/reset')
 @ns_status.doc('reset_modem')
@@ -482,48 +1274,248 @@ class Reset(Resource):
     @ns_status.marshal_with(reset_response)
     def get(self):
         """Reset GSM modem (useful for stuck connections)"""
-        mqtt_publisher.track_gammu_operation("Reset", machine.Reset, False)
+        mqtt_publisher.track_gammu_operation("Reset", _require_machine().Reset, False)
         return {"status": 200, "message": "Reset done"}, 200
 
+def _require_debug_capture():
+    if gammu_debug_capture is None:
+        api.abort(404, "Gammu debug capture is off (set gammu_debug_buffer_mb)")
+    return gammu_debug_capture
+
+@ns_debug.route('/gammu')
+@ns_debug.doc('gammu_debug_trace')
+class GammuDebugTrace(Resource):
+    @ns_debug.doc('get_gammu_debug_trace')
+    @ns_debug.produces(['text/plain'])
+    @ns_debug.doc(security='basicAuth')
+    @auth.login_required
+    def get(self):
+        """Get the gammu debug trace currently held in memory (oldest first)"""
+        return Response(_require_debug_capture().buffer.snapshot(), mimetype='text/plain')
+
+@ns_debug.route('/gammu/dumps')
+@ns_debug.doc('gammu_debug_dumps')
+class GammuDebugDumps(Resource):
+    @ns_debug.doc('list_gammu_debug_dumps')
+    @ns_debug.doc(security='basicAuth')
+    @auth.login_required
+    @ns_debug.marshal_list_with(debug_dump_response)
+    def get(self):
+        """List gammu debug traces saved after failed modem operations (newest first)"""
+        return _require_debug_capture().dumps()
+
+@ns_debug.route('/gammu/dumps/<string:name>')
+@ns_debug.doc('gammu_debug_dump')
+class GammuDebugDump(Resource):
+    @ns_debug.doc('get_gammu_debug_dump')
+    @ns_debug.produces(['text/plain'])
+    @ns_debug.doc(security='basicAuth')
+    @auth.login_required
+    def get(self, name):
+        """Get a saved gammu debug trace"""
+        content = _require_debug_capture().read_dump(name)
+        if content is None:
+            api.abort(404, f"Gammu debug dump '{name}' not found")
+        return Response(content, mimetype='text/plain')
+
+@ns_config.route('/reload')
+@ns_config.doc('config_reload')
+class ConfigReload(Resource):
+    @ns_config.doc('reload_config')
+    @ns_config.response(200, 'Success', reload_response)
+    @ns_config.response(400, 'Options could not be loaded')
+    @ns_config.doc(security='basicAuth')
+    @auth.login_required
+    def post(self):
+        """Re-read add-on options and secrets and apply changes without restarting"""
+        try:
+            return config_reloader.reload()
+        except Exception as e:
+            api.abort(400, f"Configuration could not be loaded, current settings kept: {e}")
+
+@ns_events.route('')
+@ns_events.doc('event_stream')
+class Events(Resource):
+    @ns_events.doc('subscribe_events', params={
+        'Last-Event-ID': {'in': 'header', 'type': 'integer',
+                          'description': 'Resume after this event id (sent automatically by EventSource on reconnect)'},
+        'last_event_id': {'in': 'query', 'type': 'integer', 'description': 'Same as Last-Event-ID header'},
+    })
+    @ns_events.doc(security='basicAuth')
+    @auth.login_required
+    def get(self):
+        """Stream sms_received, send_status, delivery_status, device_status, signal and network events"""
+        last_event_id = parse_last_event_id(request.headers.get('Last-Event-ID', request.args.get('last_event_id')))
+        if not event_broadcaster.try_subscribe():
+            return ({"status": 503, "message": "Too many event stream clients"}, 503,
+                    {"Retry-After": "30"})
+        response = Response(event_broadcaster.stream(last_event_id), mimetype='text/event-stream',
+                            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        # Also runs when the client disconnects before the first chunk
+        response.call_on_close(event_broadcaster.unsubscribe)
+        return response
+
+def _render_sms(sms, environ):
+    """GET /sms/getsms response for an SMS a waiting asyncio request took from the inbox queue"""
+    with app.request_context(environ):
+        response = output_json(sms_projection(sms), 200)
+        response.headers['Content-Type'] = 'application/json'  # Set by flask-restx for its own responses
+        response = compress(response)
+        return response.status_code, response.headers.to_wsgi_list(), response.get_data()
+
+MQTT_STARTUP_TIMEOUT = 30  # Startup report doesn't wait longer for an unreachable broker
+
+
+def _init_modem_background():
+    """Modem init thread, the add-on exits when the modem can't be initialized (as before)"""
+    try:
+        init_modem()
+    except BaseException as e:  # Includes SystemExit for a missing PIN
+        logging.error(f"❌ Modem initialization failed: {e}")
+        startup_timer.log_report("Startup (modem initialization failed)")
+        mqtt_publisher.disconnect()
+        os._exit(1)
+
+
+def _finish_startup():
+    """Start MQTT publishing and SMS monitoring once both broker and modem are ready"""
+    mqtt_enabled = config.get('mqtt_enabled', False)
+    if mqtt_enabled:
+        if mqtt_publisher.wait_connected(MQTT_STARTUP_TIMEOUT):
+            startup_timer.end("mqtt_connect")
+        else:
+            logging.warning(f"MQTT broker not reachable after {MQTT_STARTUP_TIMEOUT}s, still retrying in background")
+    gammu_machine = mqtt_publisher.wait_for_machine()
+
+    if mqtt_enabled:
+        if not mqtt_publisher.connected:
+            startup_timer.log_report()
+            mqtt_publisher.wait_connected()
+            startup_timer.end("mqtt_connect")
+        with startup_timer.phase("initial_publish"):
+            mqtt_publisher.publish_initial_states_with_machine(gammu_machine)
+
+    # Periodic status and SMS monitoring poll the modem only while MQTT, webhooks or /events clients listen
+    mqtt_publisher.publish_status_periodic(gammu_machine,
+                                           interval=config.get('status_check_interval', STATUS_CHECK_INTERVAL))
+    # Runs regardless of consumers, a SIM nobody reads is the one that fills up
+    mqtt_publisher.start_storage_monitoring(gammu_machine, interval=STORAGE_CHECK_INTERVAL)
+
+    # Also registered when disabled, the task is paused until a reload enables monitoring
+    check_interval = config.get('sms_check_interval', 60)
+    mqtt_publisher.start_sms_monitoring(gammu_machine, check_interval=check_interval)
+    if config.get('sms_monitoring_enabled', True):
+        print(f"📱 SMS Monitoring: Enabled (check every {check_interval}s)")
+    else:
+        print("📱 SMS Monitoring: Disabled")
+
+    startup_timer.log_report()
+    print("✅ Ready to send/receive SMS messages")
+
+
+def _shutdown():
+    """Stop background work and save persistent state, the last thing either runtime does"""
+    # Background modem tasks finish the round they are in, then MQTT goes down
+    mqtt_publisher.task_scheduler.stop()
+    mqtt_publisher.disconnect()
+    if webhook_dispatcher is not None:
+        # Undelivered events stay in the persistent queue for the next start
+        webhook_dispatcher.stop()
+    config_reloader.stop()
+    send_scheduler.stop()
+    message_store.close()
+    sms_router.stop()
+    if signal_history is not None:
+        signal_history.save()
+    if gammu_recorder is not None:
+        gammu_recorder.close()
+
+
+def _serve_asyncio(ssl_context):
+    """Serve from one event loop: uvicorn runs the ASGI gateway, paho and the modem get their own bridges"""
+    import signal
+
+    mqtt_runner = None
+
+    def on_startup(loop):
+        nonlocal mqtt_runner
+        mqtt_runner = AsyncMqttRunner(loop)
+        mqtt_publisher.set_mqtt_runner(mqtt_runner)
+        # SIGHUP reloads options like POST /config/reload (uvicorn handles SIGTERM itself)
+        loop.add_signal_handler(signal.SIGHUP, lambda: loop.run_in_executor(
+            None, lambda: config_reloader.reload(reason="SIGHUP")))
+
+    def on_shutdown():
+        _shutdown()
+        if mqtt_runner is not None:
+            mqtt_runner.stop()
+        mqtt_publisher.modem_worker.shutdown()
+
+    gateway = AsgiGateway(app, event_broadcaster, inbox_queue, _authorized, _getsms_wait, _render_sms,
+                          on_startup=on_startup, on_shutdown=on_shutdown)
+    # uvicorn shuts down on SIGTERM, then re-raises it for the handler it found: exit normally
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    serve(gateway, port, ssl_context)
+
+
 if __name__ == '__main__':
-    print(f"🚀 SMS Gammu Gateway v2.1.0 started successfully!")
+    from werkzeug.serving import make_server
+
+    print("🚀 SMS Gammu Gateway v2.1.0 starting...")
     print(f"📱 Device: {device_path}")
     print(f"🌐 API available on port {port}")
     print(f"🏠 Web UI: http://localhost:{port}/")
     print(f"🔒 SSL: {'Enabled' if ssl else 'Disabled'}")
+    if gammu_trace_mode in (TRACE_MODE_RECORD, TRACE_MODE_REPLAY):
+        print(f"🎞️ Gammu trace: {gammu_trace_mode} ({gammu_trace_file})")
     
     # MQTT info
     if config.get('mqtt_enabled', False):
         print(f"📡 MQTT: Enabled -> {config.get('mqtt_host')}:{config.get('mqtt_port')}")
-        
-        # Wait a moment for MQTT connection, then publish initial states
-        import time
-        time.sleep(2)
-        mqtt_publisher.publish_initial_states_with_machine(machine)
-        
-        # Start periodic MQTT publishing
-        mqtt_publisher.publish_status_periodic(machine, interval=300)  # 5 minutes
-        
-        # Start SMS monitoring if enabled
-        if config.get('sms_monitoring_enabled', True):
-            check_interval = config.get('sms_check_interval', 60)
-            mqtt_publisher.start_sms_monitoring(machine, check_interval=check_interval)
-            print(f"📱 SMS Monitoring: Enabled (check every {check_interval}s)")
-        else:
-            print(f"📱 SMS Monitoring: Disabled")
     else:
-        print(f"📡 MQTT: Disabled")
-    
-    print(f"✅ Ready to send/receive SMS messages")
-    
-    try:
-        if ssl:
-            app.run(port=port, host="0.0.0.0", ssl_context=('/ssl/cert.pem', '/ssl/key.pem'),
-                    debug=False, use_reloader=False)
-        else:
-            app.run(port=port, host="0.0.0.0", debug=False, use_reloader=False)
-    finally:
-        # Cleanup MQTT connection
-        mqtt_publisher.disconnect()
+        print("📡 MQTT: Disabled")
+    if webhook_dispatcher is not None:
+        print(f"🪝 Webhooks: {len(webhook_dispatcher.urls)} URL(s)")
+        webhook_dispatcher.start()
+    if len(send_scheduler):
+        print(f"⏰ Scheduled SMS: {len(send_scheduler)} pending")
+    send_scheduler.start()
+    message_store.start()
+    if message_store.enabled:
+        retention = f"{message_store.retention_days} days" if message_store.retention_days else "forever"
+        print(f"🗄️ Message history: {message_store.path} (kept {retention})")
 
+    if runtime == RUNTIME_ASYNCIO and not asyncio_runtime_available():
+        logging.error("runtime: asyncio needs the uvicorn package (0.22 or newer), using the threaded server")
+        runtime = RUNTIME_THREADED
+    if runtime == RUNTIME_ASYNCIO:
+        print("⚡ Runtime: asyncio")
+        # Before modem init, every tracked gammu call from here on runs on this one thread
+        mqtt_publisher.set_modem_worker(ModemWorker())
 
+    # Modem and broker come up in parallel while HTTP already answers
+    # (503 or last known state until the modem is ready)
+    threading.Thread(target=_init_modem_background, name="modem-init", daemon=True).start()
+    threading.Thread(target=_finish_startup, name="startup", daemon=True).start()
+
+    ssl_context = ('/ssl/cert.pem', '/ssl/key.pem') if ssl else None
+    if runtime == RUNTIME_ASYNCIO:
+        config_reloader.start()
+        _serve_asyncio(ssl_context)  # Returns after SIGTERM, the cleanup ran on lifespan shutdown
+        sys.exit(0)
+
+    with startup_timer.phase("http_listen"):
+        server = make_server("0.0.0.0", port, app, threaded=True, ssl_context=ssl_context)
+
+    # Add-on stop sends SIGTERM, exit through the cleanup below (persistent queues are saved)
+    import signal
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # SIGHUP reloads options like POST /config/reload (in a thread, the handler must return quickly)
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+        target=config_reloader.reload, kwargs={"reason": "SIGHUP"}, daemon=True).start())
+    config_reloader.start()
+
+    try:
+        server.serve_forever()
+    finally:
+        _shutdown()
@@ -14,8 +14,10 @@ PASSWORD=$(bashio::config 'password')
 bashio::log.info "Device path: ${DEVICE_PATH}"
 bashio::log.info "Port: ${PORT}"
 
-# Check if device exists
-if [ ! -c "${DEVICE_PATH}" ]; then
+# Check if device exists ('auto' probes serial ports at startup)
+if [ "${DEVICE_PATH}" = "auto" ]; then
+    bashio::log.info "Modem port will be detected automatically"
+elif [ ! -c "${DEVICE_PATH}" ]; then
     bashio::log.warning "Device ${DEVICE_PATH} not found. Please check your GSM modem connection."
     bashio::log.info "Available tty devices:"
     ls -la /dev/tty* || true
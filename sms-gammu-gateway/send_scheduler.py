@@ -0,0 +1,297 @@
+"""
+Scheduled sends for SMS Gammu Gateway
+Holds SMS to be sent later (send_at) or spread over a time window in a
+hashed timer wheel driven by one worker thread, releases them to the modem
+with a minimum gap between sends and persists pending jobs under /data
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import random
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+
+from log_queue import Phone
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_FILE = '/data/scheduled_sends.json'
+SEND_INTERVAL = 2.0  # Minimum seconds between two scheduled sends, urgent sends go in between
+MAX_JOBS = 10000
+MAX_WINDOW = 7 * 86400
+
+STATE_SCHEDULED = 'scheduled'
+STATE_SENDING = 'sending'
+
+
+def parse_send_at(value, now=None):
+    """send_at as epoch seconds: unix timestamp or ISO 8601 (local time without offset); None when empty"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return _valid_send_at(value, value)
+    text = str(value).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        number = None
+    if number is not None:
+        return _valid_send_at(number, value)
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid send_at '{value}', expected ISO 8601 date/time or unix timestamp")
+
+
+def _valid_send_at(timestamp, value):
+    """Finite timestamp a local date can be made of (inf, nan and 1e400 would break the timer wheel)"""
+    try:
+        timestamp = float(timestamp)
+        if math.isfinite(timestamp):
+            datetime.fromtimestamp(timestamp)
+            return timestamp
+    except (OverflowError, OSError, ValueError):
+        pass
+    raise ValueError(f"send_at '{value}' out of range, expected ISO 8601 date/time or unix timestamp")
+
+
+def parse_window(value):
+    """Window length in seconds (0 = no spreading)"""
+    if value is None or value == '':
+        return 0
+    try:
+        window = int(float(value))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid window '{value}', expected seconds")
+    if window < 0 or window > MAX_WINDOW:
+        raise ValueError(f"window must be between 0 and {MAX_WINDOW} seconds")
+    return window
+
+
+def spread(start, window, count, rng=random):
+    """Due times for count messages: evenly over the window, a single one at a random point in it.
+
+    Random placement spreads campaigns submitted one message per request.
+    """
+    if not window:
+        return [start] * count
+    if count == 1:
+        return [start + rng.uniform(0, window)]
+    step = window / count
+    return [start + index * step for index in range(count)]
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) add and remove, due keys collected per tick.
+
+    Keys more than one rotation ahead share a slot with nearer ones and are
+    skipped until their tick comes round.
+    """
+
+    def __init__(self, tick=1.0, slots=512, now=None):
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [[] for _ in range(slots)]
+        self._due = {}  # key -> due tick, entries in _wheel without a match here were removed
+        self._current = math.floor((time.time() if now is None else now) / tick)
+
+    def __len__(self):
+        return len(self._due)
+
+    def add(self, key, due):
+        """Schedule key for time due (epoch seconds), fires on the first tick at or after it"""
+        due_tick = max(math.ceil(due / self.tick), self._current + 1)
+        self._due[key] = due_tick
+        self._wheel[due_tick % self.slots].append((due_tick, key))
+
+    def remove(self, key):
+        return self._due.pop(key, None) is not None
+
+    def pop_due(self, now):
+        """Keys due up to now, in due order"""
+        target = math.floor(now / self.tick)
+        if target <= self._current or not self._due:
+            self._current = max(self._current, target)
+            return []
+        if target - self._current >= self.slots:
+            ticks = range(self.slots)  # Fell a rotation behind, every slot may hold due keys
+        else:
+            ticks = range(self._current + 1, target + 1)
+        fired = []
+        for tick in ticks:
+            slot = self._wheel[tick % self.slots]
+            keep = []
+            for due_tick, key in slot:
+                if self._due.get(key) != due_tick:
+                    continue  # Removed or rescheduled
+                if due_tick <= target:
+                    fired.append((due_tick, key))
+                    del self._due[key]
+                else:
+                    keep.append((due_tick, key))
+            slot[:] = keep
+        self._current = target
+        fired.sort(key=lambda item: item[0])
+        return [key for _, key in fired]
+
+    def next_due(self):
+        """Epoch time of the next tick with a due key (at most one rotation ahead), None when empty"""
+        if not self._due:
+            return None
+        for tick in range(self._current + 1, self._current + self.slots + 1):
+            if any(due_tick == tick and self._due.get(key) == tick for due_tick, key in self._wheel[tick % self.slots]):
+                return tick * self.tick
+        return (self._current + self.slots) * self.tick
+
+
+class SendScheduler:
+    """Releases scheduled SMS to send_job(job) from a single worker thread"""
+
+    def __init__(self, send_job, path=SCHEDULE_FILE, min_interval=SEND_INTERVAL, max_jobs=MAX_JOBS):
+        self.send_job = send_job
+        self.path = path
+        self.min_interval = min_interval
+        self.max_jobs = max_jobs
+        self._jobs = {}
+        self._wheel = TimerWheel()
+        self._ready = deque()
+        self._next_send = 0.0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._load()
+
+    def _load(self):
+        """Restore pending jobs; overdue ones are sent right after start"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as schedule_file:
+                jobs = json.load(schedule_file).get("jobs", [])
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Could not load scheduled sends {self.path}: {e}")
+            return
+        for job in jobs:
+            if job.get("state") == STATE_SENDING:
+                # May or may not have reached the modem before the restart, never send twice
+                logger.warning("Scheduled SMS %s to %s was interrupted while sending, dropped",
+                               job.get('id'), Phone(job.get('number')))
+                continue
+            self._jobs[job["id"]] = job
+            self._wheel.add(job["id"], job["due_at"])
+        if self._jobs:
+            logger.info(f"Restored {len(self._jobs)} scheduled SMS")
+
+    def _save(self):
+        """Persist jobs atomically (caller holds the condition)"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as schedule_file:
+                json.dump({"jobs": list(self._jobs.values())}, schedule_file, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save scheduled sends {self.path}: {e}")
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="send-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def schedule(self, numbers, text, send_at=None, window=0, **options):
+        """Queue one job per number, returns the jobs; options (unicode, smsc, ...) are passed to send_job"""
+        start = time.time() if send_at is None else send_at
+        due_times = spread(start, window, len(numbers))
+        created = time.strftime("%Y-%m-%d %H:%M:%S")
+        with self._condition:
+            if len(self._jobs) + len(numbers) > self.max_jobs:
+                raise OverflowError(f"Too many scheduled SMS (limit {self.max_jobs})")
+            jobs = []
+            try:
+                for number, due_at in zip(numbers, due_times):
+                    job = dict(options, id=uuid.uuid4().hex[:16], number=number, text=text, due_at=due_at,
+                               created_at=created, state=STATE_SCHEDULED)
+                    # Wheel first: a job it can't take must not linger in _jobs (listed, saved, never sent)
+                    self._wheel.add(job["id"], due_at)
+                    self._jobs[job["id"]] = job
+                    jobs.append(job)
+            except (OverflowError, ValueError):
+                for job in jobs:
+                    del self._jobs[job["id"]]
+                    self._wheel.remove(job["id"])
+                raise ValueError(f"send_at out of range: {start}")
+            self._save()
+            self._condition.notify()
+        logger.info(f"Scheduled {len(jobs)} SMS from {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))}"
+                    f"{f' over {window}s' if window else ''}")
+        return jobs
+
+    def cancel(self, job_id):
+        """Remove a job that was not sent yet, returns False when unknown or already sending"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job["state"] != STATE_SCHEDULED:
+                return False
+            del self._jobs[job_id]
+            self._wheel.remove(job_id)
+            self._save()
+            return True
+
+    def jobs(self):
+        """Pending jobs by due time"""
+        with self._condition:
+            return sorted((dict(job) for job in self._jobs.values()), key=lambda job: job["due_at"])
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _next_job(self):
+        """Wait until a job is due and the send gap has passed, returns it or None when stopping"""
+        with self._condition:
+            while self._running:
+                now = time.time()
+                self._ready.extend(self._wheel.pop_due(now))
+                while self._ready and self._ready[0] not in self._jobs:
+                    self._ready.popleft()  # Cancelled after it became due
+                if self._ready and now >= self._next_send:
+                    job = self._jobs[self._ready.popleft()]
+                    job["state"] = STATE_SENDING
+                    self._save()
+                    return dict(job)
+                if self._ready:
+                    timeout = self._next_send - now
+                else:
+                    next_due = self._wheel.next_due()
+                    timeout = None if next_due is None else max(0.0, next_due - now)
+                self._condition.wait(timeout)
+            return None
+
+    def _run(self):
+        while self._running:
+            job = self._next_job()
+            if job is None:
+                break
+            try:
+                self.send_job(job)
+            except Exception as e:
+                logger.error("Scheduled SMS %s to %s failed: %s", job['id'], Phone(job['number']), e)
+            with self._condition:
+                self._jobs.pop(job["id"], None)
+                self._save()
+                self._next_send = time.time() + self.min_interval
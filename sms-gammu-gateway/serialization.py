@@ -0,0 +1,82 @@
+"""
+JSON serialization for SMS Gammu Gateway
+One encoder for REST responses, MQTT payloads and events: orjson when it is
+installed, the standard json module otherwise (same output, non-ASCII text
+kept as UTF-8). Projection replaces flask-restx marshalling for flat models.
+"""
+
+import json
+
+from flask_restx import fields
+
+try:
+    import orjson
+except ImportError:  # Optional speedup, json gives the same result
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(data):
+        """Encode data as UTF-8 JSON bytes"""
+        return orjson.dumps(data, option=_ORJSON_OPTIONS)
+
+    def dumps(data):
+        """Encode data as JSON text"""
+        return orjson.dumps(data, option=_ORJSON_OPTIONS).decode('utf-8')
+else:
+    def dumps_bytes(data):
+        """Encode data as UTF-8 JSON bytes"""
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps(data):
+        """Encode data as JSON text"""
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+_CONVERTERS = {
+    fields.String: str,
+    fields.Integer: int,
+    fields.Float: float,
+    fields.Boolean: bool,
+    fields.Raw: None,
+}
+
+
+class Projection:
+    """Precomputed field selection for a flat flask-restx model.
+
+    Gives the same result as marshal() for String/Integer/Float/Boolean/Raw
+    fields (missing or None values fall back to the field default) without
+    marshal's per-field lookups; the model itself stays in use for Swagger.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._fields = []
+        for name, field in model.items():
+            if type(field) not in _CONVERTERS:
+                raise ValueError(f"Projection supports flat models only, {model.name}.{name} is {type(field).__name__}")
+            key = field.attribute or name
+            default = field.default() if callable(field.default) else field.default
+            converter = _CONVERTERS[type(field)]
+            if default and converter is not None:
+                default = converter(default)
+            self._fields.append((name, key, converter, default))
+
+    def __call__(self, record):
+        """Project one record (dict) onto the model fields"""
+        result = {}
+        for name, key, converter, default in self._fields:
+            value = record.get(key)
+            if value is None:
+                result[name] = default
+            else:
+                result[name] = converter(value) if converter is not None else value
+        return result
+
+    def many(self, records):
+        return [self(record) for record in records]
@@ -0,0 +1,281 @@
+"""
+Signal and network history for SMS Gammu Gateway
+Signal/network samples kept in fixed-size typed arrays (raw, 1-minute and
+1-hour tiers) so ranges can be answered without the modem or the HA recorder,
+persisted to /data periodically
+"""
+
+import os
+import json
+import time
+import base64
+import bisect
+import logging
+import threading
+from array import array
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_HISTORY_FILE = '/data/signal_history.json'
+SAVE_INTERVAL = 900
+MAX_HISTORY_POINTS = 2000
+
+RESOLUTION_RAW = 'raw'
+RESOLUTION_MINUTE = 'minute'
+RESOLUTION_HOUR = 'hour'
+
+# name -> (bucket seconds, capacity): 4096 raw samples, 7 days of minutes, 1 year of hours
+TIERS = {
+    RESOLUTION_RAW: (0, 4096),
+    RESOLUTION_MINUTE: (60, 7 * 1440),
+    RESOLUTION_HOUR: (3600, 366 * 24),
+}
+
+# Column -> array typecode; aggregated tiers average signal values and keep the last cell
+_COLUMNS = (
+    ('time', 'd'),
+    ('signal_dbm', 'f'),
+    ('signal_dbm_min', 'f'),
+    ('signal_percent', 'f'),
+    ('ber', 'f'),
+    ('network', 'H'),  # Index into the network code table
+    ('lac', 'q'),
+    ('cid', 'q'),
+    ('count', 'H'),
+)
+_MISSING = -1
+
+
+def parse_time(value):
+    """Unix timestamp or ISO 8601 date/time (local time without offset) as epoch seconds, None when empty"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value).strip().replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}', expected ISO 8601 date/time or unix timestamp")
+
+
+def _hex(value):
+    """LAC/CID as reported by gammu (hex string) to int, -1 when unknown"""
+    try:
+        return int(str(value), 16) if value not in (None, '') else _MISSING
+    except ValueError:
+        return _MISSING
+
+
+class _Ring:
+    """Fixed-capacity columns in typed arrays, oldest row overwritten first"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.columns = {name: array(code, [0]) * capacity for name, code in _COLUMNS}
+        self.start = 0
+        self.size = 0
+
+    def append(self, row):
+        index = (self.start + self.size) % self.capacity
+        for name, value in row.items():
+            self.columns[name][index] = value
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, position):
+        """Sample time of the position-th oldest row (sequence protocol for bisect)"""
+        return self.columns['time'][(self.start + position) % self.capacity]
+
+    def row(self, position):
+        index = (self.start + position) % self.capacity
+        return {name: self.columns[name][index] for name, _ in _COLUMNS}
+
+    def dump(self):
+        """Rows in time order as base64 column arrays"""
+        rows = [self.row(position) for position in range(self.size)]
+        return {name: base64.b64encode(array(code, [row[name] for row in rows]).tobytes()).decode('ascii')
+                for name, code in _COLUMNS}
+
+    def load(self, data):
+        loaded = {}
+        for name, code in _COLUMNS:
+            column = array(code)
+            column.frombytes(base64.b64decode(data[name]))
+            loaded[name] = column[-self.capacity:]
+        for position in range(len(loaded['time'])):
+            self.append({name: loaded[name][position] for name, _ in _COLUMNS})
+
+
+class SignalHistory:
+    """Signal/network samples in raw, 1-minute and 1-hour tiers (path None disables persistence)"""
+
+    def __init__(self, path=SIGNAL_HISTORY_FILE, save_interval=SAVE_INTERVAL):
+        self.path = path
+        self.save_interval = save_interval
+        self._tiers = {name: _Ring(capacity) for name, (_, capacity) in TIERS.items()}
+        self._pending = {}  # tier -> [bucket start, accumulated row]
+        self._networks = []  # Network code table, samples store the index
+        self._network_index = {}
+        self._signal = None
+        self._cell = None  # (network index, lac, cid) of the last network info
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _network(self, code):
+        index = self._network_index.get(code)
+        if index is None:
+            index = len(self._networks)
+            self._networks.append(code)
+            self._network_index[code] = index
+        return index
+
+    def on_event(self, event_type, data):
+        """Gateway event listener: signal events add a sample, a cell change adds one right away"""
+        if event_type == "signal":
+            self._signal = data
+            self.record()
+        elif event_type == "network":
+            with self._lock:
+                network = self._network(data.get("NetworkCode") or "")
+            cell = (network, _hex(data.get("LAC")), _hex(data.get("CID")))
+            changed = self._cell is not None and cell != self._cell
+            self._cell = cell
+            if changed and self._signal is not None:
+                self.record()
+
+    def record(self, now=None):
+        """Add a sample from the last known signal and network state"""
+        now = time.time() if now is None else now
+        signal = self._signal or {}
+        dbm = signal.get("SignalStrength", _MISSING)
+        row = {
+            'time': now,
+            'signal_dbm': dbm,
+            'signal_dbm_min': dbm,
+            'signal_percent': signal.get("SignalPercent", _MISSING),
+            'ber': signal.get("BitErrorRate", _MISSING),
+            'count': 1,
+        }
+        with self._lock:
+            network, lac, cid = self._cell or (self._network(""), _MISSING, _MISSING)
+            row.update(network=network, lac=lac, cid=cid)
+            for name, (bucket, _) in TIERS.items():
+                if not bucket:
+                    self._tiers[name].append(row)
+                    continue
+                start = now - now % bucket
+                pending = self._pending.get(name)
+                if pending is not None and pending[0] != start:
+                    self._tiers[name].append(pending[1])
+                    pending = None
+                if pending is None:
+                    self._pending[name] = [start, dict(row, time=start)]
+                else:
+                    self._merge(pending[1], row)
+            save = self.path and time.monotonic() - self._last_save >= self.save_interval
+        if save:
+            self.save()
+
+    @staticmethod
+    def _merge(bucket, row):
+        """Running averages of signal values, minimum dBm and the latest cell"""
+        count = bucket['count']
+        for name in ('signal_dbm', 'signal_percent', 'ber'):
+            bucket[name] = (bucket[name] * count + row[name]) / (count + 1)
+        bucket['signal_dbm_min'] = min(bucket['signal_dbm_min'], row['signal_dbm'])
+        bucket['network'], bucket['lac'], bucket['cid'] = row['network'], row['lac'], row['cid']
+        bucket['count'] = min(count + 1, 65535)
+
+    def pick_resolution(self, since):
+        """Finest tier that still reaches back to since"""
+        for name in (RESOLUTION_RAW, RESOLUTION_MINUTE):
+            ring = self._tiers[name]
+            if ring.size and (ring.size < ring.capacity or ring[0] <= (since if since is not None else 0)):
+                return name
+        return RESOLUTION_HOUR
+
+    def query(self, since=None, until=None, resolution=None, limit=MAX_HISTORY_POINTS):
+        """Samples between since and until (epoch seconds), oldest first; the newest limit when more match"""
+        if resolution is None:
+            resolution = self.pick_resolution(since)
+        limit = max(1, min(int(limit), MAX_HISTORY_POINTS))
+        with self._lock:
+            ring = self._tiers[resolution]
+            first = bisect.bisect_left(ring, since) if since is not None else 0
+            last = bisect.bisect_right(ring, until) if until is not None else len(ring)
+            first = max(first, last - limit)
+            rows = [ring.row(position) for position in range(first, last)]
+            pending = self._pending.get(resolution)
+            if pending is not None and len(rows) < limit and (until is None or pending[0] <= until) \
+                    and (since is None or pending[0] >= since - TIERS[resolution][0]):
+                rows.append(dict(pending[1]))
+            networks = list(self._networks)
+        return resolution, [self._format(row, networks, resolution) for row in rows]
+
+    @staticmethod
+    def _format(row, networks, resolution):
+        def value(number, digits=1):
+            return None if number == _MISSING else round(number, digits)
+
+        sample = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row['time'])),
+            "timestamp": row['time'],
+            "signal_dbm": value(row['signal_dbm']),
+            "signal_percent": value(row['signal_percent']),
+            "ber": value(row['ber']),
+            "network_code": (networks[row['network']] if row['network'] < len(networks) else None) or None,
+            "lac": None if row['lac'] == _MISSING else format(row['lac'], 'X'),
+            "cid": None if row['cid'] == _MISSING else format(row['cid'], 'X'),
+        }
+        if resolution != RESOLUTION_RAW:
+            sample["signal_dbm_min"] = value(row['signal_dbm_min'])
+            sample["samples"] = row['count']
+        return sample
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as history_file:
+                data = json.load(history_file)
+            self._networks = list(data.get("networks", []))
+            self._network_index = {code: index for index, code in enumerate(self._networks)}
+            for name, ring in self._tiers.items():
+                if name in data.get("tiers", {}):
+                    ring.load(data["tiers"][name])
+            self._pending = {name: [start, row] for name, (start, row) in data.get("pending", {}).items()
+                             if name in self._tiers}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Start empty rather than not at all, the file is overwritten on the next save
+            logger.warning(f"Could not load signal history {self.path}: {e}")
+            self._tiers = {name: _Ring(capacity) for name, (_, capacity) in TIERS.items()}
+            self._pending = {}
+            self._networks, self._network_index = [], {}
+
+    def save(self):
+        """Persist all tiers and the open buckets atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            self._last_save = time.monotonic()
+            data = {
+                "networks": list(self._networks),
+                "tiers": {name: ring.dump() for name, ring in self._tiers.items()},
+                "pending": {name: [start, dict(row)] for name, (start, row) in self._pending.items()},
+            }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as history_file:
+                json.dump(data, history_file)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not save signal history {self.path}: {e}")
@@ -0,0 +1,90 @@
+"""
+SIM storage watermarks for SMS Gammu Gateway
+Turns GetSMSStatus into occupancy per memory (SIM, phone) and decides which
+read SMS to archive and delete when a memory crosses the high watermark, so
+the SIM never fills up and inbox scans stay short
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+SIM_HIGH_WATERMARK = 80  # % used that starts offloading read SMS
+SIM_LOW_WATERMARK = 50  # % used offloading brings a memory down to
+SIM_ALERT_LEVEL = 90  # % used that raises the storage alert
+STORAGE_CHECK_INTERVAL = 300
+
+LEVEL_OK = 'ok'
+LEVEL_HIGH = 'high'
+LEVEL_ALERT = 'alert'
+LEVEL_FULL = 'full'
+
+_MEMORIES = ('SIM', 'Phone')
+
+
+def storage_occupancy(status):
+    """Used/size/percent per memory from a GetSMSStatus result (memories with size 0 are absent)"""
+    occupancy = {}
+    for memory in _MEMORIES:
+        size = status.get(f'{memory}Size') or 0
+        used = status.get(f'{memory}Used') or 0
+        occupancy[f'{memory}Used'] = used
+        occupancy[f'{memory}Size'] = size
+        occupancy[f'{memory}Percent'] = round(used * 100 / size) if size else None
+    return occupancy
+
+
+class StorageWatermarks:
+    """High/low watermark policy over SMS memory occupancy"""
+
+    def __init__(self, high=SIM_HIGH_WATERMARK, low=SIM_LOW_WATERMARK, alert=SIM_ALERT_LEVEL):
+        if not 0 <= low < high <= 100:
+            raise ValueError(f"SIM watermarks need 0 <= low ({low}) < high ({high}) <= 100")
+        self.high = high
+        self.low = low
+        self.alert = alert
+
+    def level(self, occupancy):
+        """Worst level over all memories"""
+        level = LEVEL_OK
+        for memory in _MEMORIES:
+            size, used = occupancy[f'{memory}Size'], occupancy[f'{memory}Used']
+            if not size:
+                continue
+            percent = used * 100 / size
+            if used >= size:
+                return LEVEL_FULL
+            if percent >= self.alert:
+                level = LEVEL_ALERT
+            elif percent >= self.high and level == LEVEL_OK:
+                level = LEVEL_HIGH
+        return level
+
+    def excess(self, occupancy):
+        """Locations to free so every memory over the high mark gets down to the low mark"""
+        excess = 0
+        for memory in _MEMORIES:
+            size, used = occupancy[f'{memory}Size'], occupancy[f'{memory}Used']
+            if size and used * 100 >= self.high * size:
+                excess = max(excess, used - (self.low * size) // 100)
+        return excess
+
+    def select_offload(self, all_sms, occupancy):
+        """Oldest read SMS (retrieveAllSms records) to remove, empty when no memory is over the high mark.
+
+        Unread and incomplete multipart SMS are never chosen; long SMS free one
+        location per part.
+        """
+        excess = self.excess(occupancy)
+        if excess <= 0:
+            return []
+        candidates = [sms for sms in all_sms
+                      if sms.get("State") == "Read" and "Multipart" not in sms and sms.get("Type") != 'Status_Report']
+        candidates.sort(key=lambda sms: sms.get("Date") or "")
+        selected = []
+        for sms in candidates:
+            if excess <= 0:
+                break
+            selected.append(sms)
+            excess -= len(sms.get("Locations") or [None])
+        return selected
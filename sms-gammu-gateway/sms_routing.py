@@ -0,0 +1,320 @@
+"""
+SMS routing for SMS Gammu Gateway
+Sends received SMS to their own MQTT topics or webhooks, answers them or drops
+them by sender and text, following rules from a YAML file. Rules are compiled
+once into an exact-number dict, a prefix trie and one combined text regex.
+"""
+
+import os
+import re
+import math
+import time
+import hashlib
+import logging
+import threading
+
+from webhooks import WebhookDispatcher
+
+logger = logging.getLogger(__name__)
+
+SMS_ROUTING_FILE = '/share/sms_gateway/routing.yaml'
+ROUTING_CHECK_INTERVAL = 5  # Seconds between checks of the rules file for changes
+REPLY_COOLDOWN = 3600  # One auto-reply per sender and rule within this time, keeps two gateways from ping-ponging
+ROUTE_QUEUE_DIR = '/data'
+
+ACTION_MQTT = 'mqtt'
+ACTION_WEBHOOK = 'webhook'
+ACTION_REPLY = 'reply'
+ACTION_DROP = 'drop'
+ACTIONS = (ACTION_MQTT, ACTION_WEBHOOK, ACTION_REPLY, ACTION_DROP)
+
+_TOPIC_PATTERN = re.compile(r'^[A-Za-z0-9_\-]+(/[A-Za-z0-9_\-]+)*$')
+_NUMBER_SEPARATORS = re.compile(r'[\s\-().]')
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def normalize_sender(number):
+    """'+420 123-456' -> '+420123456', alphanumeric senders lower-cased"""
+    return _NUMBER_SEPARATORS.sub('', str(number or '')).lower()
+
+
+class RoutingRule:
+    """One compiled rule with its hit counter"""
+
+    def __init__(self, name, action, senders=(), text=None, ignore_case=True, target=None,
+                 stop=True, reply_cooldown=REPLY_COOLDOWN):
+        self.name = name
+        self.action = action
+        self.senders = tuple(senders)
+        self.text = text
+        self.ignore_case = ignore_case
+        self.regex = re.compile(text, re.IGNORECASE if ignore_case else 0) if text else None
+        self.target = target  # Topic, URL or reply text depending on action
+        self.stop = stop
+        self.reply_cooldown = reply_cooldown
+        self.hits = 0
+        self.last_hit = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "action": self.action,
+            "from": list(self.senders),
+            "text": self.text,
+            "target": self.target,
+            "continue": not self.stop,
+            "hits": self.hits,
+            "last_hit": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_hit)) if self.last_hit else None,
+        }
+
+
+def _reply_cooldown(name, value):
+    """Seconds between auto-replies of a rule, ValueError naming the rule when value isn't a number"""
+    try:
+        cooldown = float(value) if not isinstance(value, bool) else math.nan
+    except (TypeError, ValueError):  # Lists and mappings from YAML, text that isn't a number
+        cooldown = math.nan
+    if not math.isfinite(cooldown) or cooldown < 0:
+        raise ValueError(f"Rule '{name}': reply_cooldown must be a number of seconds, got {value!r}")
+    return cooldown
+
+
+def compile_rules(data):
+    """RoutingRules from the parsed rules file ({"rules": [...]}), raises ValueError naming the bad rule"""
+    if data is not None and not isinstance(data, dict):
+        raise ValueError("Rules file must be a mapping with a 'rules' list")
+    entries = (data or {}).get("rules") or []
+    if not isinstance(entries, list):
+        raise ValueError("'rules' must be a list")
+    rules = []
+    names = set()
+    for position, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Rule {position} must be a mapping")
+        name = str(entry.get("name") or f"rule{position}")
+        if name in names:
+            raise ValueError(f"Rule {position}: duplicate name '{name}'")
+        names.add(name)
+        action = entry.get("action")
+        if action not in ACTIONS:
+            raise ValueError(f"Rule '{name}': action must be one of {', '.join(ACTIONS)}")
+        senders = entry.get("from") or []
+        if not isinstance(senders, list):
+            senders = [senders]
+        senders = [str(sender) for sender in senders]
+        text = entry.get("text")
+        if not senders and not text:
+            raise ValueError(f"Rule '{name}': needs 'from' and/or 'text'")
+        target = {ACTION_MQTT: "topic", ACTION_WEBHOOK: "url", ACTION_REPLY: "reply"}.get(action)
+        value = entry.get(target) if target else None
+        if target and not value:
+            raise ValueError(f"Rule '{name}': action {action} needs '{target}'")
+        if action == ACTION_MQTT and not _TOPIC_PATTERN.match(str(value)):
+            raise ValueError(f"Rule '{name}': topic '{value}' may only contain letters, digits, _ - and /")
+        reply_cooldown = _reply_cooldown(name, entry.get("reply_cooldown", REPLY_COOLDOWN))
+        try:
+            rule = RoutingRule(name, action, senders, str(text) if text else None,
+                               ignore_case=bool(entry.get("ignore_case", True)),
+                               target=str(value) if value else None, stop=not entry.get("continue", False),
+                               reply_cooldown=reply_cooldown)
+        except re.error as e:
+            raise ValueError(f"Rule '{name}': invalid text regex: {e}")
+        rules.append(rule)
+    return rules
+
+
+class PrefixTrie:
+    """Character trie returning every value stored under a prefix of the key"""
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, prefix, value):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(value)
+
+    def matches(self, key):
+        node = self._root
+        values = list(node.get(None, ()))
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                break
+            values.extend(node.get(None, ()))
+        return values
+
+
+class RuleMatcher:
+    """Rules in file order, matched by sender (exact or prefix*) and text regex"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._exact = {}  # normalized number -> rule indexes
+        self._prefixes = PrefixTrie()
+        self._any_sender = []
+        for index, rule in enumerate(rules):
+            if not rule.senders:
+                self._any_sender.append(index)
+            for sender in rule.senders:
+                if sender == '*':
+                    self._any_sender.append(index)
+                elif sender.endswith('*'):
+                    self._prefixes.add(normalize_sender(sender[:-1]), index)
+                else:
+                    self._exact.setdefault(normalize_sender(sender), []).append(index)
+        # One search rules out all text rules for most SMS; inline global flags can't be combined
+        # (numbered backreferences would point at another rule's groups once combined)
+        texts = [rule for rule in rules if rule.regex]
+        patterns = [f"(?{'i' if rule.ignore_case else '-i'}:{rule.text})" for rule in texts]
+        self._any_text = None
+        if patterns and not any(_BACKREFERENCE.search(rule.text) for rule in texts):
+            try:
+                self._any_text = re.compile("|".join(patterns))
+            except re.error:
+                pass
+
+    def match(self, number, text):
+        """Matching rules in file order, up to the first one without continue"""
+        key = normalize_sender(number)
+        candidates = set(self._any_sender)
+        candidates.update(self._exact.get(key, ()))
+        candidates.update(self._prefixes.matches(key))
+        if not candidates:
+            return []
+        text = text or ""
+        text_possible = None
+        matched = []
+        for index in sorted(candidates):
+            rule = self.rules[index]
+            if rule.regex is not None:
+                if text_possible is None:
+                    text_possible = self._any_text is None or self._any_text.search(text) is not None
+                if not text_possible or not rule.regex.search(text):
+                    continue
+            matched.append(rule)
+            if rule.stop:
+                break
+        return matched
+
+
+class SmsRouter:
+    """Rules from a YAML file (reloaded when it changes) plus webhook dispatchers and reply cooldowns"""
+
+    def __init__(self, path=SMS_ROUTING_FILE, webhook_secret='', queue_dir=ROUTE_QUEUE_DIR,
+                 check_interval=ROUTING_CHECK_INTERVAL):
+        self.path = path
+        self.webhook_secret = webhook_secret
+        self.queue_dir = queue_dir
+        self.check_interval = check_interval
+        self.matcher = RuleMatcher([])
+        self.error = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._replies = {}  # (rule, number) -> time of last auto-reply
+        self._dispatchers = {}  # url -> WebhookDispatcher
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _read_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            return None
+
+    def reload(self):
+        """Compile the rules file; a broken file keeps the previous rules. Returns the number of rules."""
+        mtime = self._read_mtime()
+        self._mtime = mtime
+        if mtime is None:
+            rules = []
+        else:
+            import yaml  # Only needed when a rules file exists
+            try:
+                with open(self.path, 'r', encoding='utf-8') as rules_file:
+                    rules = compile_rules(yaml.safe_load(rules_file))
+            except (OSError, ValueError, yaml.YAMLError) as e:
+                self.error = str(e)
+                logger.error(f"SMS routing rules {self.path} not loaded, keeping previous rules: {e}")
+                return len(self.matcher.rules)
+        with self._lock:
+            # Counters survive reloads for rules that keep their name
+            previous = {rule.name: rule for rule in self.matcher.rules}
+            for rule in rules:
+                if rule.name in previous:
+                    rule.hits, rule.last_hit = previous[rule.name].hits, previous[rule.name].last_hit
+            self.matcher = RuleMatcher(rules)
+            self.error = None
+        self._sync_dispatchers({rule.target for rule in rules if rule.action == ACTION_WEBHOOK})
+        if rules:
+            logger.info(f"🔀 SMS routing: {len(rules)} rule(s) from {self.path}")
+        return len(rules)
+
+    def _sync_dispatchers(self, urls):
+        for url in set(self._dispatchers) - urls:
+            self._dispatchers.pop(url).stop()
+        for url in urls - set(self._dispatchers):
+            queue_path = None
+            if self.queue_dir:
+                queue_path = os.path.join(self.queue_dir,
+                                          f"webhook_queue_route_{hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]}.json")
+            dispatcher = WebhookDispatcher([url], secret=self.webhook_secret, queue_path=queue_path)
+            dispatcher.start()
+            self._dispatchers[url] = dispatcher
+
+    def refresh(self):
+        """Reload when the rules file changed (checked at most every check_interval seconds)"""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        if self._read_mtime() != self._mtime:
+            self.reload()
+
+    def route(self, sms):
+        """Rules matching a received SMS, counted as hits"""
+        self.refresh()
+        with self._lock:
+            rules = self.matcher.match(sms.get("Number"), sms.get("Text"))
+            now = time.time()
+            for rule in rules:
+                rule.hits += 1
+                rule.last_hit = now
+        return rules
+
+    def post_webhook(self, rule, sms):
+        """Queue the SMS for the rule's webhook URL (same payload as sms_received webhooks)"""
+        dispatcher = self._dispatchers.get(rule.target)
+        if dispatcher is not None:
+            dispatcher.emit("sms_received", sms)
+
+    def reply_allowed(self, rule, number):
+        """True once per sender and rule within the rule's reply cooldown, never for alphanumeric senders"""
+        if not number or not any(char.isdigit() for char in number) or any(char.isalpha() for char in number):
+            return False
+        now = time.monotonic()
+        key = (rule.name, normalize_sender(number))
+        with self._lock:
+            last = self._replies.get(key)
+            if last is not None and now - last < rule.reply_cooldown:
+                return False
+            if len(self._replies) > 1000:
+                longest = max((rule.reply_cooldown for rule in self.matcher.rules), default=REPLY_COOLDOWN)
+                self._replies = {key: last for key, last in self._replies.items() if now - last < longest}
+            self._replies[key] = now
+        return True
+
+    def needs_polling(self):
+        """Webhook and reply rules act without MQTT, SMS monitoring has to run for them"""
+        return any(rule.action in (ACTION_WEBHOOK, ACTION_REPLY) for rule in self.matcher.rules)
+
+    def rules(self):
+        with self._lock:
+            return [rule.to_dict() for rule in self.matcher.rules]
+
+    def stop(self):
+        """Stop webhook dispatchers (undelivered events stay in their queue files)"""
+        for dispatcher in self._dispatchers.values():
+            dispatcher.stop()
+        self._dispatchers = {}
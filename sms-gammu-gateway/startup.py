@@ -0,0 +1,74 @@
+"""
+Startup timing for SMS Gammu Gateway
+Records how long each startup phase (imports, modem init, MQTT connect, HTTP
+listen...) took relative to process start and logs a summary report
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Phase start/end times relative to process start; phases may overlap"""
+
+    def __init__(self, process_started=None):
+        self.process_started = process_started or time.time()
+        self._phases = {}
+        self._lock = threading.Lock()
+        self._reported = False
+
+    def begin(self, name, started=None):
+        with self._lock:
+            self._phases[name] = {"start": started or time.time(), "end": None, "status": "running"}
+
+    def end(self, name, status="ok"):
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is not None and phase["end"] is None:
+                phase["end"] = time.time()
+                phase["status"] = status
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block, status 'failed' when it raises"""
+        self.begin(name)
+        try:
+            yield
+        except BaseException:
+            self.end(name, "failed")
+            raise
+        self.end(name)
+
+    def snapshot(self):
+        """Phases in start order, times in ms from process start"""
+        with self._lock:
+            phases = sorted(self._phases.items(), key=lambda item: item[1]["start"])
+            result = []
+            for name, phase in phases:
+                item = {
+                    "phase": name,
+                    "status": phase["status"],
+                    "started_ms": int((phase["start"] - self.process_started) * 1000),
+                    "duration_ms": None,
+                }
+                if phase["end"] is not None:
+                    item["duration_ms"] = int((phase["end"] - phase["start"]) * 1000)
+                result.append(item)
+            return result
+
+    def log_report(self, title="Startup"):
+        """Log phase timings once (later calls are ignored)"""
+        with self._lock:
+            if self._reported:
+                return
+            self._reported = True
+        total_ms = int((time.time() - self.process_started) * 1000)
+        lines = [f"⏱️ {title} finished in {total_ms} ms:"]
+        for item in self.snapshot():
+            duration = f"{item['duration_ms']} ms" if item["duration_ms"] is not None else "still running"
+            lines.append(f"   {item['phase']:<16} +{item['started_ms']:>6} ms  {duration} ({item['status']})")
+        logger.info("\n".join(lines))
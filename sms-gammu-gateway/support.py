@@ -13,18 +13,44 @@ import gammu
 GAMMU_DEBUG_LOG = '/data/gammu-debug.log'
 
 
-def init_state_machine(pin, device_path='/dev/ttyUSB0', debug=False):
-    """Initialize gammu state machine with HA add-on config"""
+DUMMY_SMS_FOLDERS = (1, 2, 3, 4, 5)
+
+
+def prepare_dummy_device(directory):
+    """Create directory layout used by gammu dummy driver (SMS folders as files)"""
+    for folder in DUMMY_SMS_FOLDERS:
+        os.makedirs(os.path.join(directory, 'sms', str(folder)), exist_ok=True)
+    for subdir in ('pbk', 'note', 'todo', 'calendar', 'alarm', 'fs'):
+        os.makedirs(os.path.join(directory, subdir), exist_ok=True)
+
+
+def init_state_machine(pin, device_path='/dev/ttyUSB0', debug=False, connection='at', debug_file=None):
+    """Initialize gammu state machine with HA add-on config.
+
+    connection='dummy' is a test mode: device_path is a directory where the
+    gammu dummy driver keeps SMS as files instead of talking to a modem.
+    debug_file (file object) receives the gammu debug trace instead of
+    GAMMU_DEBUG_LOG, also when debug is off.
+    """
     sm = gammu.StateMachine()
 
     # Create gammu config dynamically
     config_lines = [
         "[gammu]",
         f"device = {device_path}",
-        "connection = at",
     ]
+    if connection == 'dummy':
+        prepare_dummy_device(device_path)
+        config_lines.extend([
+            "model = dummy",
+            "connection = none",
+        ])
+    else:
+        config_lines.append(f"connection = {connection}")
 
-    if debug:
+    if debug_file is not None:
+        config_lines.append("logformat = textalldate")
+    elif debug:
         config_lines.extend([
             f"logfile = {GAMMU_DEBUG_LOG}",
             "logformat = textalldate",
@@ -39,9 +65,9 @@ def init_state_machine(pin, device_path='/dev/ttyUSB0', debug=False):
     
     sm.ReadConfig(Filename=config_file)
 
-    if debug:
+    if debug or debug_file is not None:
         try:
-            sm.SetDebugFile(GAMMU_DEBUG_LOG)
+            sm.SetDebugFile(debug_file if debug_file is not None else GAMMU_DEBUG_LOG)
             log_level = getattr(gammu, 'LOG_DEBUG', None)
             if log_level is not None:
                 sm.SetDebugLevel(log_level)
@@ -72,12 +98,11 @@ def init_state_machine(pin, device_path='/dev/ttyUSB0', debug=False):
         print("Warning: SIM card not accessible, but device is connected")
     except Exception as e:
         print(f"Error initializing device: {e}")
-        print("Available devices:")
-        import os
+        print("Available serial ports (set device_path to 'auto' to detect the modem port):")
         try:
-            devices = [d for d in os.listdir('/dev/') if d.startswith('tty')]
-            for device in sorted(devices):
-                print(f"  /dev/{device}")
+            from modem_discovery import candidate_ports
+            for device in candidate_ports():
+                print(f"  {device}")
         except:
             pass
         raise
@@ -115,6 +140,21 @@ def retrieveAllSms(machine):
                 "Locations": [smsPart['Location'] for smsPart in sms],
             }
 
+            udh = smsPart.get('UDH') or {}
+            allParts = udh.get('AllParts') or 0
+            receivedParts = sorted({(part.get('UDH') or {}).get('PartNumber') for part in sms})
+            if allParts > 1 and len(receivedParts) < allParts:
+                # Not all parts arrived yet, DecodeSMS needs the complete set
+                ordered = sorted(sms, key=lambda part: (part.get('UDH') or {}).get('PartNumber', 0))
+                result["Text"] = "".join(part['Text'] or "" for part in ordered)
+                result["Multipart"] = {
+                    "Reference": udh['ID16bit'] if udh.get('ID16bit', -1) != -1 else udh.get('ID8bit'),
+                    "Parts": allParts,
+                    "Received": receivedParts,
+                }
+                results.append(result)
+                continue
+
             decodedSms = gammu.DecodeSMS(sms)
             if decodedSms == None:
                 result["Text"] = smsPart['Text']
@@ -126,6 +166,13 @@ def retrieveAllSms(machine):
 
                 result["Text"] = text
 
+            if smsPart.get('Type') == 'Status_Report':
+                # Delivery report for a message we sent, not an ordinary SMS
+                result["Type"] = 'Status_Report'
+                result["MessageReference"] = smsPart.get('MessageReference')
+                result["DeliveryStatus"] = smsPart.get('DeliveryStatus')
+                result["SMSCDate"] = str(smsPart.get('SMSCDateTime') or '')
+
             results.append(result)
 
         return results
@@ -135,6 +182,11 @@ def retrieveAllSms(machine):
         return []
 
 
+def is_status_report(sms):
+    """Check if record returned by retrieveAllSms is a delivery status report"""
+    return sms.get("Type") == 'Status_Report'
+
+
 def deleteSms(machine, sms):
     """Delete SMS by location"""
     try:
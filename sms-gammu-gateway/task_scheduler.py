@@ -0,0 +1,173 @@
+"""
+Background modem tasks for SMS Gammu Gateway
+One worker thread runs all periodic modem work (inbox poll, signal, network,
+SMS storage, device heartbeat) from a heap of due times with jitter. Tasks that
+fall due together share one modem session instead of racing each other.
+"""
+
+import time
+import heapq
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+TASK_JITTER = 0.1  # Fraction of the interval added or taken at random, keeps tasks from locking into step
+MERGE_WINDOW = 2.0  # Seconds: tasks due this soon after the first one run in the same session
+MACHINE_WAIT_SLICE = 1.0
+
+
+class ModemTask:
+    """Periodic task: func(machine) every interval seconds while enabled and when() allows"""
+
+    def __init__(self, name, func, interval, when=None, needs_modem=True, enabled=True):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.when = when
+        self.needs_modem = needs_modem
+        self.enabled = enabled
+        self.due = 0.0
+        self.generation = 0  # Bumped on reschedule, stale heap entries are skipped
+        self.runs = 0
+        self.failures = 0
+
+
+class ModemTaskScheduler:
+    """Heap-ordered timer for ModemTasks, executed one session at a time by a single worker thread"""
+
+    def __init__(self, get_machine, jitter=TASK_JITTER, merge_window=MERGE_WINDOW, rng=random):
+        self.get_machine = get_machine  # callable(timeout) -> machine or None
+        self.jitter = jitter
+        self.merge_window = merge_window
+        self.rng = rng
+        self._tasks = {}
+        self._heap = []  # (due, sequence, name, generation)
+        self._sequence = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def _push(self, task, due):
+        """Queue task at due (caller holds the condition)"""
+        task.due = due
+        task.generation += 1
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, task.name, task.generation))
+        self._condition.notify()
+
+    def _next_due(self, task, now):
+        spread = task.interval * self.jitter
+        return now + task.interval + (self.rng.uniform(-spread, spread) if spread else 0.0)
+
+    def add(self, name, func, interval, when=None, needs_modem=True, enabled=True, delay=0.0):
+        """Register (or replace) a task, first run after delay seconds"""
+        task = ModemTask(name, func, interval, when=when, needs_modem=needs_modem, enabled=enabled)
+        with self._condition:
+            previous = self._tasks.get(name)
+            if previous is not None:
+                task.generation = previous.generation
+            self._tasks[name] = task
+            self._push(task, time.monotonic() + delay)
+        return task
+
+    def set_interval(self, name, interval):
+        """Change a task's interval; the next run moves earlier when the new interval is shorter"""
+        with self._condition:
+            task = self._tasks.get(name)
+            if task is None or task.interval == interval:
+                return
+            previous, task.interval = task.interval, interval
+            self._push(task, min(task.due, task.due - previous + interval))
+
+    def set_enabled(self, name, enabled):
+        """Pause or resume a task; a resumed task runs right away"""
+        with self._condition:
+            task = self._tasks.get(name)
+            if task is None or task.enabled == bool(enabled):
+                return
+            task.enabled = bool(enabled)
+            if task.enabled:
+                self._push(task, time.monotonic())
+
+    def run_soon(self, name):
+        """Run a task at the next opportunity"""
+        with self._condition:
+            task = self._tasks.get(name)
+            if task is not None:
+                self._push(task, time.monotonic())
+
+    def start(self):
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="modem-tasks", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop after the task running now (if any) finished"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def _next_session(self):
+        """Wait for the next due task, returns it plus all tasks due within the merge window"""
+        with self._condition:
+            while self._running:
+                while self._heap:
+                    due, _, name, generation = self._heap[0]
+                    task = self._tasks.get(name)
+                    if task is not None and task.generation == generation and task.enabled:
+                        break
+                    heapq.heappop(self._heap)  # Rescheduled, replaced or paused
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                now = time.monotonic()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                session = []
+                horizon = now + self.merge_window
+                while self._heap and self._heap[0][0] <= horizon:
+                    _, _, name, generation = heapq.heappop(self._heap)
+                    task = self._tasks.get(name)
+                    if task is not None and task.generation == generation and task.enabled:
+                        session.append(task)
+                return session
+            return []
+
+    def _machine(self):
+        while self._running:
+            machine = self.get_machine(MACHINE_WAIT_SLICE)
+            if machine is not None:
+                return machine
+        return None
+
+    def _run(self):
+        while self._running:
+            session = self._next_session()
+            machine = None
+            for task in session:
+                if not self._running:
+                    break
+                try:
+                    if task.when is None or task.when():
+                        if task.needs_modem and machine is None:
+                            machine = self._machine()
+                            if machine is None:
+                                break
+                        task.func(machine)
+                        task.runs += 1
+                except Exception as e:
+                    task.failures += 1
+                    logger.error(f"Background task {task.name} failed: {e}")
+                finally:
+                    with self._condition:
+                        if self._tasks.get(task.name) is task:
+                            self._push(task, self._next_due(task, time.monotonic()))
@@ -0,0 +1,316 @@
+"""
+Webhooks for SMS Gammu Gateway
+Pushes gateway events (received SMS, send status, delivery status) as signed
+JSON POSTs over persistent pooled HTTP connections, optionally batched, with
+a disk-backed retry queue under /data
+"""
+
+import os
+import ssl
+import hmac
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import http.client
+from collections import deque
+from urllib.parse import urlsplit
+
+from retry_policy import RetryPolicy, ERROR_CLASS_TRANSIENT, ERROR_CLASS_PERMANENT
+from serialization import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_QUEUE_FILE = '/data/webhook_queue.json'
+WEBHOOK_EVENTS = ('sms_received', 'send_status', 'delivery_status')
+
+SIGNATURE_HEADER = 'X-Gateway-Signature'
+TIMESTAMP_HEADER = 'X-Gateway-Timestamp'
+DELIVERY_HEADER = 'X-Gateway-Delivery'
+EVENT_HEADER = 'X-Gateway-Event'
+
+
+def sign_payload(secret, timestamp, body):
+    """HMAC-SHA256 over '<timestamp>.<body>', sent as 'sha256=<hex>'"""
+    mac = hmac.new(secret.encode('utf-8'), f"{timestamp}.".encode('ascii') + body, hashlib.sha256)
+    return f"sha256={mac.hexdigest()}"
+
+
+def verify_signature(secret, timestamp, body, signature, max_age=300):
+    """Check signature and timestamp freshness of a received webhook (receiver side)"""
+    try:
+        if abs(time.time() - int(timestamp)) > max_age:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign_payload(secret, timestamp, body), signature or "")
+
+
+class HTTPConnectionPool:
+    """Keep-alive HTTP(S) connections per scheme/host/port, reused across requests"""
+
+    def __init__(self, timeout=10, max_idle_per_host=2):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _new_connection(self, scheme, host, port):
+        self.connections_opened += 1
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=self.timeout,
+                                               context=ssl.create_default_context())
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def post(self, url, body, headers):
+        """POST body, returns (status, response body); a stale keep-alive connection is retried once"""
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        key = (scheme, parts.hostname, parts.port or (443 if scheme == 'https' else 80))
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+
+        with self._lock:
+            idle = self._idle.get(key)
+            connection = idle.pop() if idle else None
+        reused = connection is not None
+        if connection is None:
+            connection = self._new_connection(*key)
+
+        while True:
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                connection.close()
+                if not reused:
+                    raise
+                # Server closed the idle connection meanwhile, not a delivery failure
+                reused = False
+                connection = self._new_connection(*key)
+            except Exception:
+                connection.close()
+                raise
+
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.max_idle_per_host:
+                    idle.append(connection)
+                    connection = None
+            if connection is not None:
+                connection.close()
+        return response.status, data
+
+    def close(self):
+        with self._lock:
+            connections = [connection for idle in self._idle.values() for connection in idle]
+            self._idle.clear()
+        for connection in connections:
+            connection.close()
+
+
+class WebhookDispatcher:
+    """Delivers events to webhook URLs from a background thread.
+
+    Events are batched up to batch_size (waiting at most batch_interval seconds
+    for a batch to fill). Failed deliveries go to a retry queue persisted in
+    queue_path and are retried with jittered exponential backoff; receivers can
+    de-duplicate retries by the X-Gateway-Delivery header and event ids.
+    """
+
+    def __init__(self, urls, secret='', events=WEBHOOK_EVENTS, batch_size=1, batch_interval=1.0,
+                 timeout=10, policy=None, queue_path=WEBHOOK_QUEUE_FILE, max_queue=1000):
+        self.urls = [url for url in urls if url]
+        self.secret = secret or ''
+        self.events = set(events)
+        self.batch_size = max(1, int(batch_size))
+        self.batch_interval = max(0.0, float(batch_interval))
+        self.policy = policy or RetryPolicy(max_attempts=10, base_delay=5, max_delay=600)
+        self.queue_path = queue_path
+        self.max_queue = max_queue
+        self.pool = HTTPConnectionPool(timeout=timeout)
+        self.stats = {"delivered": 0, "events": 0, "retries": 0, "failed": 0, "dropped": 0}
+        self._pending = deque()
+        self._retry_queue = []
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._load_queue()
+
+    def _load_queue(self):
+        """Restore deliveries that were still waiting for a retry at shutdown"""
+        if not self.queue_path or not os.path.exists(self.queue_path):
+            return
+        try:
+            with open(self.queue_path, 'r', encoding='utf-8') as queue_file:
+                data = json.load(queue_file)
+            deliveries = [entry for entry in data.get("deliveries", []) if entry.get("url") in self.urls]
+            self._retry_queue = deliveries[-self.max_queue:]
+            if self._retry_queue:
+                logger.info(f"Restored {len(self._retry_queue)} queued webhook deliveries")
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"Could not load webhook queue {self.queue_path}: {e}")
+
+    def _save_queue(self):
+        """Persist retry queue atomically (caller holds the condition)"""
+        if not self.queue_path:
+            return
+        tmp_path = f"{self.queue_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as queue_file:
+                json.dump({"deliveries": self._retry_queue}, queue_file, ensure_ascii=False)
+            os.replace(tmp_path, self.queue_path)
+        except OSError as e:
+            logger.warning(f"Could not save webhook queue {self.queue_path}: {e}")
+
+    def start(self):
+        if self._thread is not None or not self.urls:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="webhooks", daemon=True)
+        self._thread.start()
+        logger.info(f"Webhooks enabled for {len(self.urls)} URL(s), batch size {self.batch_size}"
+                    f"{', signed' if self.secret else ''}")
+
+    def stop(self, timeout=5):
+        """Stop worker; events not delivered yet are kept in the persistent queue"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._condition:
+            events = list(self._pending)
+            self._pending.clear()
+            if events:
+                for url in self.urls:
+                    self._queue_delivery({"id": uuid.uuid4().hex, "url": url, "events": events,
+                                          "attempts": 0, "next_at": time.time()})
+            self._save_queue()
+        self.pool.close()
+
+    def emit(self, event_type, data):
+        """Queue an event for delivery (never blocks on the network)"""
+        if not self.urls or event_type not in self.events:
+            return
+        event = {
+            "id": uuid.uuid4().hex,
+            "type": event_type,
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "data": data,
+        }
+        with self._condition:
+            self._pending.append(event)
+            self._condition.notify()
+
+    def queue_length(self):
+        with self._condition:
+            return len(self._retry_queue)
+
+    def _queue_delivery(self, delivery):
+        """Add delivery to retry queue, dropping the oldest when full (caller holds the condition)"""
+        self._retry_queue.append(delivery)
+        while len(self._retry_queue) > self.max_queue:
+            dropped = self._retry_queue.pop(0)
+            self.stats["dropped"] += 1
+            logger.warning(f"Webhook queue full, dropping delivery {dropped['id']} to {dropped['url']}")
+
+    def _next_work(self):
+        """Wait for new events or due retries, returns (batch, due deliveries)"""
+        with self._condition:
+            while self._running:
+                now = time.time()
+                if self._pending or any(entry["next_at"] <= now for entry in self._retry_queue):
+                    break
+                next_retry = min((entry["next_at"] for entry in self._retry_queue), default=None)
+                self._condition.wait(None if next_retry is None else max(0.0, next_retry - now))
+            if not self._running:
+                return [], []
+
+            if self._pending and len(self._pending) < self.batch_size and self.batch_interval:
+                deadline = time.monotonic() + self.batch_interval
+                while self._running and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+            batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+            now = time.time()
+            due = [entry for entry in self._retry_queue if entry["next_at"] <= now]
+            if due:
+                self._retry_queue = [entry for entry in self._retry_queue if entry["next_at"] > now]
+            return batch, due
+
+    def _run(self):
+        while self._running:
+            batch, due = self._next_work()
+            failed = []
+            if batch:
+                for url in self.urls:
+                    delivery = {"id": uuid.uuid4().hex, "url": url, "events": batch, "attempts": 0}
+                    if not self._deliver(delivery):
+                        failed.append(delivery)
+            for delivery in due:
+                if not self._deliver(delivery):
+                    failed.append(delivery)
+            retried = [delivery for delivery in failed if "next_at" in delivery]
+            if due or retried:
+                with self._condition:
+                    for delivery in retried:
+                        self._queue_delivery(delivery)
+                    self._save_queue()
+
+    def _deliver(self, delivery):
+        """POST one delivery; on failure sets next_at when it should be retried"""
+        delivery.pop("next_at", None)
+        delivery["attempts"] += 1
+        events = delivery["events"]
+        body = dumps_bytes({"delivery_id": delivery["id"], "events": events})
+        event_types = {event["type"] for event in events}
+        headers = {
+            "Content-Type": "application/json; charset=utf-8",
+            "User-Agent": "sms-gammu-gateway",
+            DELIVERY_HEADER: delivery["id"],
+            EVENT_HEADER: event_types.pop() if len(event_types) == 1 else "batch",
+        }
+        if self.secret:
+            timestamp = str(int(time.time()))
+            headers[TIMESTAMP_HEADER] = timestamp
+            headers[SIGNATURE_HEADER] = sign_payload(self.secret, timestamp, body)
+
+        try:
+            status, _ = self.pool.post(delivery["url"], body, headers)
+            if 200 <= status < 300:
+                self.stats["delivered"] += 1
+                self.stats["events"] += len(events)
+                return True
+            error = f"HTTP {status}"
+            # Timeouts, rate limits and server errors may pass, other client errors won't
+            error_class = ERROR_CLASS_TRANSIENT if status in (408, 429) or status >= 500 else ERROR_CLASS_PERMANENT
+        except (OSError, http.client.HTTPException) as e:
+            error = str(e) or type(e).__name__
+            error_class = ERROR_CLASS_TRANSIENT
+
+        delivery["last_error"] = error
+        if self.policy.should_retry(error_class, delivery["attempts"]):
+            delay = self.policy.backoff(delivery["attempts"])
+            delivery["next_at"] = time.time() + delay
+            self.stats["retries"] += 1
+            logger.warning(f"Webhook delivery to {delivery['url']} failed ({error}), "
+                           f"retry {delivery['attempts']} in {delay:.1f}s")
+        else:
+            self.stats["failed"] += 1
+            logger.error(f"Webhook delivery to {delivery['url']} failed ({error}) after "
+                         f"{delivery['attempts']} attempt(s), {len(events)} event(s) dropped")
+        return False
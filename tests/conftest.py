@@ -0,0 +1,55 @@
+"""
+Shared fixtures for the gateway tests
+The gateway modules are imported from sms-gammu-gateway/ against the
+simulated gammu module of the benchmark suite, no modem or broker needed.
+"""
+
+import os
+import sys
+import base64
+import logging
+import contextlib
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, 'benchmarks'))
+sys.path.insert(0, os.path.join(ROOT_DIR, 'sms-gammu-gateway'))
+
+import fake_gammu  # noqa: E402
+
+fake_gammu.install()
+
+AUTH_HEADERS = {'Authorization': 'Basic ' + base64.b64encode(b'admin:password').decode()}
+
+
+@pytest.fixture(scope='session')
+def gateway():
+    """run.py imported once with MQTT disabled and nothing written to /data"""
+    with contextlib.redirect_stdout(sys.stderr):
+        import run
+    logging.getLogger().setLevel(logging.WARNING)
+    run.idempotency_store.path = None
+    run.delivery_tracker.path = None
+    run.send_scheduler.path = None
+    run.message_store.path = None
+    run.sms_router.queue_dir = None
+    if run.signal_history is not None:
+        run.signal_history.path = None
+    if run.gammu_debug_capture is not None:
+        run.gammu_debug_capture.dump_dir = None
+    return run
+
+
+@pytest.fixture
+def client(gateway):
+    return gateway.app.test_client()
+
+
+@pytest.fixture
+def machine(gateway):
+    """Fresh simulated modem without latency wired into the gateway"""
+    gammu_machine = fake_gammu.StateMachine(latency_scale=0.0)
+    gateway.attach_machine(gammu_machine)
+    return gammu_machine
@@ -0,0 +1,197 @@
+import json
+import asyncio
+import threading
+import contextlib
+import importlib.util
+
+import pytest
+
+from conftest import AUTH_HEADERS
+from async_runtime import AsgiGateway, ModemWorker, asyncio_runtime_available
+
+AUTHORIZATION = [(b'authorization', AUTH_HEADERS['Authorization'].encode('latin-1'))]
+
+
+@pytest.fixture
+def asgi(gateway, machine):
+    """ASGI app over the imported gateway, driven without uvicorn"""
+    return AsgiGateway(gateway.app, gateway.event_broadcaster, gateway.inbox_queue, gateway._authorized,
+                       gateway._getsms_wait, gateway._render_sms)
+
+
+def scope(method, path, query=b'', headers=()):
+    return {"type": "http", "method": method, "path": path, "query_string": query, "headers": list(headers),
+            "http_version": "1.1", "scheme": "http", "server": ("localhost", 5000), "client": ("127.0.0.1", 40000)}
+
+
+class Client:
+    """Feeds one ASGI request and records what the app sends"""
+
+    def __init__(self, body=b''):
+        self.incoming = asyncio.Queue()
+        self.incoming.put_nowait({"type": "http.request", "body": body})
+        self.sent = []
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, message):
+        self.sent.append(message)
+
+    @property
+    def status(self):
+        return self.sent[0]["status"]
+
+    @property
+    def headers(self):
+        return {name.decode(): value.decode() for name, value in self.sent[0]["headers"]}
+
+    @property
+    def body(self):
+        return b"".join(message.get("body", b"") for message in self.sent[1:])
+
+
+async def lifespan(app, *messages):
+    """Run the lifespan protocol through messages, returns what the app answered"""
+    incoming = asyncio.Queue()
+    sent = []
+    for message in messages:
+        incoming.put_nowait({"type": message})
+
+    async def send(message):
+        sent.append(message["type"])
+
+    await app({"type": "lifespan"}, incoming.get, send)
+    return sent
+
+
+@contextlib.asynccontextmanager
+async def serving(app):
+    """App started through lifespan for the duration of the block, then shut down"""
+    incoming = asyncio.Queue()
+    started = asyncio.Event()
+
+    async def send(message):
+        started.set()
+
+    task = asyncio.ensure_future(app({"type": "lifespan"}, incoming.get, send))
+    incoming.put_nowait({"type": "lifespan.startup"})
+    await started.wait()
+    try:
+        yield
+    finally:
+        incoming.put_nowait({"type": "lifespan.shutdown"})
+        await asyncio.wait_for(task, 5)
+
+
+def call(app, *requests):
+    """Clients for (scope, body) requests made one after another while the app is served"""
+    async def run():
+        clients = []
+        async with serving(app):
+            for request_scope, body in requests:
+                client = Client(body)
+                await asyncio.wait_for(app(request_scope, client.receive, client.send), 10)
+                clients.append(client)
+        return clients
+    return asyncio.run(run())
+
+
+def test_runtime_available_matches_uvicorn():
+    if importlib.util.find_spec("uvicorn") is None:
+        assert not asyncio_runtime_available()
+    else:
+        assert isinstance(asyncio_runtime_available(), bool)
+
+
+def test_modem_worker_runs_calls_on_one_thread():
+    worker = ModemWorker()
+    try:
+        idents = {worker.call(threading.get_ident) for _ in range(3)}
+        assert len(idents) == 1 and threading.get_ident() not in idents
+        # Nested calls from the modem thread run inline instead of deadlocking
+        assert worker.call(worker.call, lambda: 42) == 42
+    finally:
+        worker.shutdown()
+
+
+def test_lifespan_runs_hooks(gateway):
+    started, stopped = [], []
+    app = AsgiGateway(gateway.app, gateway.event_broadcaster, gateway.inbox_queue, gateway._authorized,
+                      gateway._getsms_wait, gateway._render_sms,
+                      on_startup=started.append, on_shutdown=lambda: stopped.append(True))
+    sent = asyncio.run(lifespan(app, "lifespan.startup", "lifespan.shutdown"))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert len(started) == 1 and stopped == [True]
+
+
+def test_other_requests_run_flask(asgi):
+    denied, client = call(asgi, (scope("GET", "/sms/history"), b''),
+                          (scope("GET", "/sms/history", headers=AUTHORIZATION), b''))
+    assert denied.status == 401
+    assert client.status == 200
+    assert json.loads(client.body) == []
+
+
+def test_post_body_reaches_flask(asgi, machine):
+    body = json.dumps({"text": "Hello", "number": "+420111222333"}).encode()
+    headers = AUTHORIZATION + [(b'content-type', b'application/json')]
+    client, = call(asgi, (scope("POST", "/sms", headers=headers), body))
+    assert client.status == 200
+    assert machine.sent[-1]["Number"] == "+420111222333"
+
+
+def test_getsms_without_wait_or_auth_is_answered_by_flask(asgi):
+    denied, client = call(asgi, (scope("GET", "/sms/getsms", b"wait=5"), b''),
+                          (scope("GET", "/sms/getsms", headers=AUTHORIZATION), b''))
+    assert denied.status == 401
+    assert client.status == 200
+    assert json.loads(client.body)["Number"] == ""
+
+
+def test_getsms_long_poll_is_woken_by_the_queue(asgi, gateway):
+    async def run():
+        async with serving(asgi):
+            client = Client()
+            request = asyncio.ensure_future(
+                asgi(scope("GET", "/sms/getsms", b"wait=5", AUTHORIZATION), client.receive, client.send))
+            while not gateway.inbox_queue.has_waiters():
+                await asyncio.sleep(0.01)
+            gateway.inbox_queue.put({"Number": "+420600000001", "Text": "Woken", "Date": "2025-01-19 08:00:00",
+                                     "State": "UnRead"})
+            await asyncio.wait_for(request, 5)
+            return client
+
+    client = asyncio.run(run())
+    assert client.status == 200
+    assert json.loads(client.body)["Text"] == "Woken"
+    assert not gateway.inbox_queue.has_waiters()
+
+
+def test_events_require_auth(asgi):
+    client, = call(asgi, (scope("GET", "/events"), b''))
+    assert client.status == 401
+
+
+def test_events_stream_until_disconnect(asgi, gateway):
+    async def run():
+        async with serving(asgi):
+            client = Client()
+            stream = asyncio.ensure_future(
+                asgi(scope("GET", "/events", headers=AUTHORIZATION), client.receive, client.send))
+            while len(client.sent) < 2:
+                await asyncio.sleep(0.01)
+            gateway.event_broadcaster.publish("signal", {"SignalPercent": 77})
+            while b"SignalPercent" not in client.body:
+                await asyncio.sleep(0.01)
+            client.incoming.put_nowait({"type": "http.disconnect"})
+            await asyncio.wait_for(stream, 5)
+            return client
+
+    subscribers = gateway.event_broadcaster.subscriber_count
+    client = asyncio.run(run())
+    assert client.status == 200
+    assert client.headers["content-type"].startswith("text/event-stream")
+    assert client.body.startswith(b"retry:")
+    assert b'event: signal\ndata: {"SignalPercent":77}' in client.body
+    assert gateway.event_broadcaster.subscriber_count == subscribers
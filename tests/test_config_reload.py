@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+import pytest
+
+from conftest import AUTH_HEADERS
+from config_reload import ConfigReloader, changed_keys
+
+
+def test_changed_keys():
+    assert changed_keys({"a": 1, "b": 2, "c": 3}, {"a": 1, "b": 5, "d": 4}) == ["b", "c", "d"]
+    assert changed_keys({"a": [1]}, {"a": [1]}) == []
+
+
+def test_reload_applies_only_changes():
+    applied = []
+    options = {"debug": False, "port": 5000}
+
+    def apply(old, new, changed):
+        applied.append((old, new, changed))
+        return {"restart_required": ["port"] if "port" in changed else [], "modem_reinit": False}
+
+    reloader = ConfigReloader(dict(options), lambda: dict(options), apply)
+    assert reloader.reload() == {"changed": [], "restart_required": [], "modem_reinit": False}
+    assert applied == []
+    options.update(debug=True, port=8080)
+    result = reloader.reload()
+    assert result == {"changed": ["debug", "port"], "restart_required": ["port"], "modem_reinit": False}
+    assert applied[0][2] == ["debug", "port"]
+    assert reloader.current == options
+    assert reloader.reload()["changed"] == []
+
+
+def test_failed_load_keeps_current_settings():
+    def load():
+        raise ValueError("broken options")
+
+    reloader = ConfigReloader({"debug": False}, load, lambda old, new, changed: {})
+    with pytest.raises(ValueError):
+        reloader.reload()
+    assert reloader.current == {"debug": False}
+
+
+def test_watcher_reloads_on_file_change(tmp_path):
+    path = tmp_path / 'options.json'
+    path.write_text(json.dumps({"debug": False}), encoding='utf-8')
+    reloaded = threading.Event()
+
+    def apply(old, new, changed):
+        reloaded.set()
+        return {"restart_required": [], "modem_reinit": False}
+
+    reloader = ConfigReloader({"debug": False}, lambda: json.loads(path.read_text(encoding='utf-8')), apply,
+                              watch_paths=(str(path),), interval=0.05)
+    reloader.start()
+    try:
+        path.write_text(json.dumps({"debug": True}), encoding='utf-8')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert reloaded.wait(5)
+        assert reloader.current == {"debug": True}
+    finally:
+        reloader.stop()
+
+
+def test_reload_endpoint_requires_auth(client):
+    assert client.post('/config/reload').status_code == 401
+
+
+def test_reload_endpoint(client, gateway, monkeypatch):
+    monkeypatch.setattr(gateway.config_reloader, 'load', lambda: dict(gateway.config_reloader.current))
+    response = client.post('/config/reload', headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert response.get_json()["changed"] == []
+
+
+def test_reload_endpoint_reports_load_errors(client, gateway, monkeypatch):
+    def load():
+        raise ValueError("options.json: Expecting value")
+
+    monkeypatch.setattr(gateway.config_reloader, 'load', load)
+    response = client.post('/config/reload', headers=AUTH_HEADERS)
+    assert response.status_code == 400
+    assert "current settings kept" in response.get_json()["message"]
@@ -0,0 +1,75 @@
+from conftest import AUTH_HEADERS
+from delivery_reports import (DeliveryReportTracker, delivery_state_from_status, STATE_PENDING, STATE_DELIVERED,
+                              STATE_FAILED, STATE_EXPIRED, TP_STATUS_VALIDITY_EXPIRED)
+
+
+def test_delivery_endpoints_require_auth(client):
+    assert client.get('/sms/delivery').status_code == 401
+    assert client.get('/sms/delivery/unknown').status_code == 401
+
+
+def test_delivery_endpoints_with_auth(client):
+    response = client.get('/sms/delivery', headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert isinstance(response.get_json(), list)
+    assert client.get('/sms/delivery/unknown', headers=AUTH_HEADERS).status_code == 404
+
+
+def _report(reference, status, number='+420600000001', **extra):
+    return dict({"MessageReference": reference, "DeliveryStatus": status, "Number": number}, **extra)
+
+
+def test_delivery_state_from_status():
+    assert delivery_state_from_status(0x00) == STATE_DELIVERED
+    assert delivery_state_from_status(0x20) == STATE_PENDING
+    assert delivery_state_from_status(TP_STATUS_VALIDITY_EXPIRED) == STATE_EXPIRED
+    assert delivery_state_from_status(0x41) == STATE_FAILED
+    assert delivery_state_from_status(None) == STATE_PENDING
+
+
+def test_job_is_delivered_when_all_parts_are():
+    tracker = DeliveryReportTracker(path=None)
+    job_id = tracker.register('+420600000001', [10, 11])
+    assert tracker.process_report(_report(10, 0))["state"] == STATE_PENDING
+    job = tracker.process_report(_report(11, 0, SMSCDate='2025-01-01 08:00:00', Date='2025-01-01 08:00:05'))
+    assert job["state"] == STATE_DELIVERED
+    assert job["latency_seconds"] >= 5
+    assert tracker.get(job_id)["state"] == STATE_DELIVERED
+
+
+def test_failed_part_fails_the_job():
+    tracker = DeliveryReportTracker(path=None)
+    tracker.register('+420600000001', [20, 21])
+    tracker.process_report(_report(20, 0))
+    assert tracker.process_report(_report(21, 0x41))["state"] == STATE_FAILED
+
+
+def test_report_matches_the_number_of_the_job():
+    tracker = DeliveryReportTracker(path=None)
+    first = tracker.register('+420600000001', [30])
+    second = tracker.register('+420600000002', [30])
+    # 00420... and +420... are the same number
+    assert tracker.process_report(_report(30, 0, number='00420600000001'))["id"] == first
+    assert tracker.get(second)["state"] == STATE_PENDING
+
+
+def test_unknown_reference_is_ignored():
+    tracker = DeliveryReportTracker(path=None)
+    assert tracker.process_report(_report(99, 0)) is None
+
+
+def test_returned_jobs_are_copies():
+    tracker = DeliveryReportTracker(path=None)
+    job_id = tracker.register('+420600000001', [40])
+    intermediate = tracker.process_report(_report(40, 0x20))
+    intermediate["parts"][0]["state"] = STATE_DELIVERED
+    tracker.get(job_id)["parts"][0]["state"] = STATE_DELIVERED
+    tracker.recent()[0]["parts"][0]["state"] = STATE_DELIVERED
+    assert tracker.get(job_id)["parts"][0]["state"] == STATE_PENDING
+    assert tracker.process_report(_report(40, 0))["state"] == STATE_DELIVERED
+
+
+def test_jobs_persist(tmp_path):
+    path = str(tmp_path / 'delivery.json')
+    job_id = DeliveryReportTracker(path=path).register('+420600000001', [50])
+    assert DeliveryReportTracker(path=path).get(job_id)["number"] == '+420600000001'
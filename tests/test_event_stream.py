@@ -0,0 +1,71 @@
+import json
+
+from conftest import AUTH_HEADERS
+from event_stream import EventBroadcaster, format_sse, parse_last_event_id
+
+
+def _data(chunk):
+    return [json.loads(line[len("data: "):]) for line in chunk.splitlines() if line.startswith("data: ")]
+
+
+def test_format_sse():
+    assert format_sse(3, "signal", {"SignalPercent": 80}) == 'id: 3\nevent: signal\ndata: {"SignalPercent":80}\n\n'
+    assert not format_sse(None, "gap", {}).startswith("id:")
+
+
+def test_parse_last_event_id():
+    assert parse_last_event_id(" 12 ") == 12
+    assert parse_last_event_id("abc") is None
+    assert parse_last_event_id(None) is None
+
+
+def test_stream_sends_only_new_events_without_last_event_id():
+    broadcaster = EventBroadcaster()
+    broadcaster.publish("signal", {"n": 1})
+    stream = broadcaster.stream(keepalive=0.01)
+    assert next(stream).startswith("retry:")
+    broadcaster.publish("signal", {"n": 2})
+    assert _data(next(stream)) == [{"n": 2}]
+
+
+def test_stream_resumes_after_last_event_id():
+    broadcaster = EventBroadcaster()
+    for n in range(1, 4):
+        broadcaster.publish("signal", {"n": n})
+    stream = broadcaster.stream(last_event_id=1, keepalive=0.01)
+    next(stream)
+    assert _data(next(stream)) == [{"n": 2}, {"n": 3}]
+    assert next(stream).startswith(": keepalive")
+
+
+def test_gap_is_reported_when_the_buffer_no_longer_reaches_back():
+    broadcaster = EventBroadcaster(max_events=2)
+    for n in range(1, 6):
+        broadcaster.publish("signal", {"n": n})
+    stream = broadcaster.stream(last_event_id=1, keepalive=0.01)
+    next(stream)
+    assert _data(next(stream)) == [{"missed_events": 2}]
+    assert _data(next(stream)) == [{"n": 4}, {"n": 5}]
+
+
+def test_subscriber_limit():
+    broadcaster = EventBroadcaster(max_subscribers=1)
+    assert broadcaster.try_subscribe()
+    assert not broadcaster.try_subscribe()
+    broadcaster.unsubscribe()
+    assert broadcaster.try_subscribe()
+
+
+def test_events_endpoint_requires_auth(client):
+    assert client.get('/events').status_code == 401
+
+
+def test_events_endpoint_streams(client):
+    response = client.get('/events', headers=AUTH_HEADERS, buffered=False)
+    try:
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        first = next(iter(response.response))
+        assert (first.decode() if isinstance(first, bytes) else first).startswith("retry:")
+    finally:
+        response.close()
@@ -0,0 +1,51 @@
+from conftest import AUTH_HEADERS
+from gammu_debug import DebugRingBuffer, GammuDebugCapture
+
+
+def test_ring_buffer_keeps_newest_bytes():
+    buffer = DebugRingBuffer(16)
+    for index in range(10):
+        buffer.write(f"line {index}\n".encode())
+    snapshot = buffer.snapshot()
+    assert len(snapshot) <= 16
+    assert snapshot.endswith(b"line 9\n")
+    # Cut at a line start, never in the middle of a line
+    assert snapshot.startswith(b"line ")
+
+
+def test_dumps_are_listed_newest_first_and_pruned(tmp_path):
+    capture = GammuDebugCapture(1024, dump_dir=str(tmp_path), max_dumps=2)
+    capture.buffer.write(b"AT+CMGS\n")
+    for index in range(3):
+        name = capture.dump(f"failure {index}")
+        assert name is not None
+        # Dump names have second resolution
+        (tmp_path / name).rename(tmp_path / f"gammu-debug-2020010{index}-000000.log")
+    capture.dump("failure 3")
+    listed = [dump["name"] for dump in capture.dumps()]
+    assert len(listed) == 2
+    assert listed == sorted(listed, reverse=True)
+    assert b"AT+CMGS" in capture.read_dump(listed[0])
+    assert capture.read_dump("../etc/passwd") is None
+
+
+def test_dump_endpoints_require_auth(client):
+    assert client.get('/debug/gammu').status_code == 401
+    assert client.get('/debug/gammu/dumps').status_code == 401
+    assert client.get('/debug/gammu/dumps/gammu-debug-x.log').status_code == 401
+
+
+def test_dump_list_with_auth(client, gateway, monkeypatch, tmp_path):
+    capture = GammuDebugCapture(1024, dump_dir=str(tmp_path))
+    capture.buffer.write(b"AT+CSQ\n")
+    name = capture.dump("test")
+    monkeypatch.setattr(gateway, 'gammu_debug_capture', capture)
+    response = client.get('/debug/gammu/dumps', headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert [dump["name"] for dump in response.get_json()] == [name]
+    assert client.get(f'/debug/gammu/dumps/{name}', headers=AUTH_HEADERS).status_code == 200
+
+
+def test_dump_list_when_capture_is_off(client, gateway, monkeypatch):
+    monkeypatch.setattr(gateway, 'gammu_debug_capture', None)
+    assert client.get('/debug/gammu/dumps', headers=AUTH_HEADERS).status_code == 404
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+import pytest
+
+import fake_gammu
+from gammu_trace import (GammuTraceRecorder, GammuTraceReplayer, ReplayStateMachine, ReplayExhausted,
+                         encode_value, decode_value, load_trace)
+from retry_policy import classify_gammu_error, ERROR_CLASS_TRANSIENT
+
+
+def test_values_round_trip():
+    value = {"DateTime": datetime(2025, 1, 1, 8, 0), "Text": b"\x00\x01", "Parts": [(1, "a")]}
+    assert decode_value(encode_value(value)) == {"DateTime": datetime(2025, 1, 1, 8, 0), "Text": b"\x00\x01",
+                                                 "Parts": [[1, "a"]]}
+    assert decode_value(encode_value(object())) is None
+
+
+def _record(path):
+    recorder = GammuTraceRecorder(str(path))
+    recorder.record("GetSignalQuality", (), {}, 0, 0.01, result={"SignalPercent": 80})
+    recorder.record("SendSMS", ({"Number": "+420600000001"},), {}, 0, 0.5,
+                    error=fake_gammu.make_error("ERR_TIMEOUT", "SendSMS"))
+    recorder.record("SendSMS", ({"Number": "+420600000001"},), {}, 0, 0.5, result=7)
+    recorder.close()
+
+
+def test_replay_returns_recorded_outcomes_in_order(tmp_path):
+    path = tmp_path / 'trace.jsonl.gz'
+    _record(path)
+    machine = ReplayStateMachine(GammuTraceReplayer(str(path), speed=0))
+    assert machine.GetSignalQuality() == {"SignalPercent": 80}
+    with pytest.raises(Exception) as error:
+        machine.SendSMS({"Number": "+420600000001"})
+    # Same gammu exception type, so retries classify it like in production
+    assert classify_gammu_error(error.value) == ERROR_CLASS_TRANSIENT
+    assert machine.SendSMS({"Number": "+420600000001"}) == 7
+    with pytest.raises(ReplayExhausted):
+        machine.SendSMS({"Number": "+420600000001"})
+    assert machine.Init() is None  # Never recorded
+
+
+def test_replay_loops(tmp_path):
+    path = tmp_path / 'trace.jsonl.gz'
+    _record(path)
+    replayer = GammuTraceReplayer(str(path), speed=0, loop=True)
+    assert [replayer.play("GetSignalQuality") for _ in range(3)] == [{"SignalPercent": 80}] * 3
+
+
+def test_truncated_trace_is_read_up_to_the_damage(tmp_path):
+    path = tmp_path / 'trace.jsonl.gz'
+    _record(path)
+    # A crash leaves the gzip stream without its trailer
+    path.write_bytes(path.read_bytes()[:-8])
+    assert [entry["op"] for entry in load_trace(str(path))] == ["GetSignalQuality", "SendSMS", "SendSMS"]
+
+
+def test_recorder_rotates(tmp_path):
+    path = tmp_path / 'trace.jsonl.gz'
+    recorder = GammuTraceRecorder(str(path), max_bytes=1)
+    recorder.record("GetSignalQuality", (), {}, 0, 0.01, result={"SignalPercent": 80})
+    recorder.close()
+    assert (tmp_path / 'trace.jsonl.gz.1').exists()
+    assert len(load_trace(str(tmp_path / 'trace.jsonl.gz.1'))) == 1
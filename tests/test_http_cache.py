@@ -0,0 +1,64 @@
+import gzip
+
+from flask import Flask, request
+
+from http_cache import CachedBody, ResourceVersion, conditional, compress_response
+
+app = Flask(__name__)
+BODY = b'{"paths": "' + b'x' * 4096 + b'"}'
+
+
+def _cached_response(cached, headers=None):
+    with app.test_request_context('/', headers=headers or {}):
+        return cached.response(request)
+
+
+def test_cached_body_etag_differs_per_encoding():
+    cached = CachedBody(BODY, 'application/json')
+    plain = _cached_response(cached)
+    zipped = _cached_response(cached, {'Accept-Encoding': 'gzip'})
+    assert plain.get_data() == BODY
+    assert gzip.decompress(zipped.get_data()) == BODY
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert plain.get_etag() != zipped.get_etag()
+    assert plain.get_etag()[1] is False  # Strong
+    assert 'Accept-Encoding' in plain.vary and 'Accept-Encoding' in zipped.vary
+
+
+def test_cached_body_not_modified_only_for_the_same_encoding():
+    cached = CachedBody(BODY, 'application/json')
+    zipped_etag = f'"{cached.gzip_etag}"'
+    assert _cached_response(cached, {'Accept-Encoding': 'gzip', 'If-None-Match': zipped_etag}).status_code == 304
+    # A gzip ETag must not validate the identity bytes
+    assert _cached_response(cached, {'If-None-Match': zipped_etag}).status_code == 200
+    assert _cached_response(cached, {'If-None-Match': f'"{cached.etag}"'}).status_code == 304
+
+
+def test_small_body_is_not_compressed():
+    cached = CachedBody(b'{}', 'application/json')
+    response = _cached_response(cached, {'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_etag()[0] == cached.etag
+
+
+def test_resource_version_changes_only_with_content():
+    version = ResourceVersion('sms')
+    first = version.update([{"id": 1}])
+    assert version.update([{"id": 1}]) == first
+    assert version.update([{"id": 2}]) != first
+
+
+def test_conditional_returns_304_for_current_version():
+    version = ResourceVersion('sms')
+    etag = version.update([{"id": 1}])
+    with app.test_request_context('/', headers={'If-None-Match': f'W/"{etag}"'}):
+        assert conditional([{"id": 1}], version, request).status_code == 304
+        assert version.not_modified(request)
+
+
+def test_compress_response_adds_vary():
+    with app.test_request_context('/', headers={'Accept-Encoding': 'gzip'}):
+        response = app.response_class(BODY, mimetype='application/json')
+        response = compress_response(response, request)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.vary
@@ -0,0 +1,73 @@
+import uuid
+
+from conftest import AUTH_HEADERS
+from idempotency import IdempotencyStore, request_fingerprint, STATUS_IN_PROGRESS, STATUS_COMPLETED
+
+
+def test_begin_reserves_key_once():
+    store = IdempotencyStore(path=None)
+    fingerprint = request_fingerprint('+420600000001', 'Hello')
+    assert store.begin('key', fingerprint) is None
+    assert store.begin('key', fingerprint)["status"] == STATUS_IN_PROGRESS
+    store.complete('key', {"status": 200, "message": "[1]"})
+    entry = store.begin('key', fingerprint)
+    assert entry["status"] == STATUS_COMPLETED
+    assert entry["result"] == {"status": 200, "message": "[1]"}
+
+
+def test_release_allows_retry():
+    store = IdempotencyStore(path=None)
+    store.begin('key')
+    store.release('key')
+    assert store.begin('key') is None
+
+
+def test_fingerprint_separates_number_and_text():
+    assert request_fingerprint('1', '23') != request_fingerprint('12', '3')
+
+
+def test_store_is_bounded():
+    store = IdempotencyStore(path=None, max_entries=2)
+    for key in ('a', 'b', 'c'):
+        store.begin(key)
+    assert len(store) == 2
+    assert store.begin('a') is None  # Oldest was evicted
+
+
+def test_expired_keys_are_forgotten():
+    store = IdempotencyStore(path=None, ttl_seconds=-1)
+    store.begin('key')
+    assert store.begin('key') is None
+
+
+def test_only_completed_keys_survive_restart(tmp_path):
+    path = str(tmp_path / 'keys.json')
+    store = IdempotencyStore(path=path)
+    store.begin('done')
+    store.complete('done', {"status": 200, "message": "[1]"})
+    store.begin('interrupted')
+    restarted = IdempotencyStore(path=path)
+    assert restarted.begin('done')["status"] == STATUS_COMPLETED
+    assert restarted.begin('interrupted') is None
+
+
+def _post(client, key, text='Hello'):
+    return client.post('/sms', headers=dict(AUTH_HEADERS, **{'Idempotency-Key': key}),
+                       json={'number': '+420600000001', 'text': text})
+
+
+def test_rest_retry_is_replayed_without_sending_again(client, machine):
+    key = uuid.uuid4().hex
+    first = _post(client, key)
+    second = _post(client, key)
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert len(machine.sent) == 1
+
+
+def test_rest_key_reused_for_other_request(client, machine):
+    key = uuid.uuid4().hex
+    _post(client, key)
+    assert _post(client, key, text='Something else').status_code == 422
+    assert len(machine.sent) == 1
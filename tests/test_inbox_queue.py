@@ -0,0 +1,84 @@
+import threading
+import time
+
+from conftest import AUTH_HEADERS
+from inbox_queue import InboxQueue
+
+
+def _sms(text):
+    return {"Number": "+420600000001", "Text": text}
+
+
+def test_nothing_is_kept_while_no_client_polls():
+    queue = InboxQueue()
+    assert queue.put(_sms("Hello")) is False
+    assert len(queue) == 0
+
+
+def test_sms_is_kept_for_a_recent_client():
+    queue = InboxQueue()
+    assert queue.get() is None  # Client polls
+    assert queue.put(_sms("Hello"))
+    assert queue.get() == _sms("Hello")
+    assert queue.get() is None
+
+
+def test_waiting_client_is_woken():
+    queue = InboxQueue()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(queue.get(timeout=5)))
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while not queue.has_waiters():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    queue.put(_sms("Hello"))
+    waiter.join(5)
+    assert result == [_sms("Hello")]
+
+
+def test_each_sms_goes_to_one_client_only():
+    queue = InboxQueue()
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(queue.get(timeout=0.5))) for _ in range(2)]
+    for waiter in waiters:
+        waiter.start()
+    time.sleep(0.1)
+    queue.put(_sms("Hello"))
+    for waiter in waiters:
+        waiter.join(5)
+    assert sorted(results, key=lambda sms: sms is None) == [_sms("Hello"), None]
+
+
+def test_queue_is_bounded_and_expires():
+    queue = InboxQueue(max_messages=2, ttl=0.05)
+    queue.get()
+    for text in ("a", "b", "c"):
+        queue.put(_sms(text))
+    assert [sms["Text"] for sms in (queue.get(), queue.get())] == ["b", "c"]
+    queue.put(_sms("old"))
+    time.sleep(0.1)
+    assert queue.get() is None
+
+
+def test_waker_is_called_on_put():
+    queue = InboxQueue()
+    woken = []
+    wake = lambda: woken.append(True)  # noqa: E731
+    queue.add_waker(wake)
+    assert queue.put(_sms("Hello"))
+    queue.remove_waker(wake)
+    assert woken == [True]
+    assert not queue.has_waiters()
+
+
+def test_getsms_rejects_invalid_wait(client, machine):
+    assert client.get('/sms/getsms?wait=soon', headers=AUTH_HEADERS).status_code == 400
+
+
+def test_getsms_returns_and_deletes_the_first_sms(client, machine):
+    machine.deliver('+420600000009', 'From the SIM')
+    response = client.get('/sms/getsms', headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert response.get_json()["Text"] == 'From the SIM'
+    assert not machine.inbox
@@ -0,0 +1,81 @@
+import queue
+import logging
+
+import pytest
+
+import log_queue
+from log_queue import Body, NonBlockingQueueHandler, Phone, RateLimitFilter, mask_number, set_redaction
+
+
+@pytest.fixture
+def redaction():
+    set_redaction(True)
+    yield
+    set_redaction(False)
+
+
+def make_record(msg, args=(), level=logging.INFO, created=1000.0, name='test'):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    record.created = created
+    return record
+
+
+def test_mask_number():
+    assert mask_number('+420123456789') == '+*********789'
+    assert mask_number('123') == '***'
+    assert mask_number(None) == ''
+
+
+def test_arguments_unchanged_without_redaction():
+    assert str(Phone('+420123456789')) == '+420123456789'
+    assert str(Body('Your code is 4821')) == 'Your code is 4821'
+
+
+def test_arguments_redacted(redaction):
+    record = make_record("SMS from %s: %s", (Phone('+420123456789'), Body('Your code is 4821')))
+    assert record.getMessage() == "SMS from +*********789: <17 chars>"
+    assert str(Body(None)) == "<0 chars>"
+
+
+def test_rate_limit_per_template():
+    limiter = RateLimitFilter(limit=2, window=60)
+    passed = [limiter.filter(make_record("Polled %s", (index,), created=1000 + index)) for index in range(5)]
+    assert passed == [True, True, False, False, False]
+    assert limiter.filter(make_record("Other message", created=1005))
+    assert limiter.filter(make_record("Polled %s", (9,), level=logging.WARNING, created=1006))
+    record = make_record("Polled %s", (10,), created=1061)
+    assert limiter.filter(record)
+    assert record.getMessage() == "Polled 10 [3 similar messages suppressed]"
+
+
+def test_rate_limit_disabled():
+    limiter = RateLimitFilter(limit=0)
+    assert all(limiter.filter(make_record("Polled")) for _ in range(100))
+
+
+def test_tracked_templates_are_bounded(monkeypatch):
+    monkeypatch.setattr(log_queue, '_MAX_TRACKED_TEMPLATES', 3)
+    limiter = RateLimitFilter(limit=1)
+    for index in range(10):
+        assert limiter.filter(make_record(f"Message {index}"))
+    assert len(limiter._windows) <= 3
+
+
+def test_handler_defers_immutable_arguments_only():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    deferred = make_record("SMS from %s", (Phone('+420111'),))
+    assert handler.prepare(deferred) is deferred
+    payload = {"Text": "before"}
+    record = make_record("Payload %s", (payload,))
+    prepared = handler.prepare(record)
+    payload["Text"] = "after"
+    assert prepared.getMessage() == "Payload {'Text': 'before'}"
+
+
+def test_handler_drops_when_queue_full():
+    records = queue.Queue(1)
+    handler = NonBlockingQueueHandler(records)
+    handler.emit(make_record("first"))
+    handler.emit(make_record("second"))
+    assert handler.dropped == 1
+    assert records.get_nowait().getMessage() == "first"
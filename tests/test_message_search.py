@@ -0,0 +1,70 @@
+import sqlite3
+
+import pytest
+
+from conftest import AUTH_HEADERS
+from message_store import MessageStore, build_match_query
+
+
+def test_build_match_query_quotes_every_term():
+    assert build_match_query('code 48*') == '"code" "48"*'
+    assert build_match_query('"your code is" +420') == '"your code is" "+420"'
+    assert build_match_query('a"b *') == '"ab"'
+    assert build_match_query('  ') == ''
+
+
+@pytest.fixture
+def store(tmp_path):
+    message_store = MessageStore(path=str(tmp_path / 'messages.db'))
+    message_store.start()
+    message_store.record_received([
+        {"Number": "+420111", "Text": "Your code is 4821", "Date": "2025-01-19 08:00:00", "State": "UnRead"},
+        {"Number": "+420222", "Text": "Meeting moved to Friday", "Date": "2025-01-19 09:00:00", "State": "Read"},
+    ])
+    message_store.record_sent({"Number": "+420111", "Text": "Thanks for the code"}, 3)
+    yield message_store
+    message_store.close()
+
+
+def test_search_words_phrases_and_prefixes(store):
+    assert store.search_available
+    assert [row['text'] for row in store.search('"code is" 48*')] == ['Your code is 4821']
+    assert {row['text'] for row in store.search('code')} == {'Your code is 4821', 'Thanks for the code'}
+    assert store.search('code friday') == []
+
+
+def test_search_filters_and_snippet(store):
+    results = store.search('code', direction='out')
+    assert [row['number'] for row in results] == ['+420111']
+    assert '[code]' in results[0]['snippet']
+    assert results[0]['score'] > 0
+
+
+def test_search_rejects_empty_query(store):
+    with pytest.raises(ValueError):
+        store.search('"" *')
+
+
+def test_index_is_built_for_existing_archive(tmp_path):
+    path = str(tmp_path / 'messages.db')
+    store = MessageStore(path=path)
+    store.start()
+    store.record_received([{"Number": "+420111", "Text": "Archived before search", "Date": "2025-01-19"}])
+    store.close()
+    with sqlite3.connect(path) as connection:
+        connection.executescript("DROP TABLE messages_fts; DROP TRIGGER messages_fts_insert; "
+                                 "DROP TRIGGER messages_fts_delete; DROP TRIGGER messages_fts_update;")
+    reopened = MessageStore(path=path)
+    reopened.start()
+    try:
+        assert [row['text'] for row in reopened.search('archived')] == ['Archived before search']
+    finally:
+        reopened.close()
+
+
+def test_search_endpoint(client):
+    assert client.get('/sms/search?q=code').status_code == 401
+    assert client.get('/sms/search?q=%22%22', headers=AUTH_HEADERS).status_code == 400
+    response = client.get('/sms/search?q=code', headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert response.get_json() == []
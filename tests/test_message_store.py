@@ -0,0 +1,87 @@
+import sqlite3
+
+from conftest import AUTH_HEADERS
+from message_store import MessageStore, normalize_date
+
+
+def make_store(tmp_path, **options):
+    store = MessageStore(path=str(tmp_path / 'messages.db'), **options)
+    store.start()
+    return store
+
+
+def received(number, text, date, state='UnRead', locations=(1,)):
+    return {"Number": number, "Text": text, "Date": date, "State": state, "Locations": list(locations)}
+
+
+def test_disabled_without_path():
+    store = MessageStore(path=None)
+    store.start()
+    store.record_received([received('+420111', 'Hi', '2025-01-19 08:00:00')])
+    assert not store.enabled
+    assert store.history() == []
+
+
+def test_received_messages_are_archived_once(tmp_path):
+    store = make_store(tmp_path)
+    try:
+        sms = received('+420111', 'Hello', '2025-01-19 08:00:00', locations=(1, 2))
+        store.record_received([sms])
+        store.record_received([dict(sms, State='Read')])  # Read again from the SIM
+        history = store.history()
+        assert len(history) == 1
+        assert history[0]['direction'] == 'in'
+        assert history[0]['state'] == 'Read'
+        assert history[0]['parts'] == 2
+    finally:
+        store.close()
+
+
+def test_sent_parts_and_filters(tmp_path):
+    store = make_store(tmp_path)
+    try:
+        store.record_received([received('+420111', 'Morning', '2025-01-18 08:00:00'),
+                               received('+420222', 'Evening', '2025-01-19 20:00:00')])
+        store.record_sent({"Number": "+420333", "Text": "Part two", "UDH": {"AllParts": 2, "PartNumber": 2}}, 7)
+        sent = store.history(direction='out')
+        assert [(row['number'], row['part'], row['parts'], row['reference']) for row in sent] == [('+420333', 2, 2, 7)]
+        assert [row['text'] for row in store.history(direction='in')] == ['Evening', 'Morning']
+        assert [row['text'] for row in store.history(number='+420111')] == ['Morning']
+        assert [row['text'] for row in store.history(direction='in', until='2025-01-18')] == ['Morning']
+        assert [row['text'] for row in store.history(direction='in', since='2025-01-19T00:00')] == ['Evening']
+        assert len(store.history(limit=1)) == 1
+        assert [row['text'] for row in store.history(direction='in', limit=1, offset=1)] == ['Morning']
+    finally:
+        store.close()
+
+
+def test_prune_removes_old_messages(tmp_path):
+    store = make_store(tmp_path, retention_days=1)
+    try:
+        store.record_received([received('+420111', 'Old', '2025-01-19 08:00:00')])
+        store.flush()
+        assert store.prune(now=0) == 0
+        assert store.prune(now=10 ** 10) == 1
+        assert store.history() == []
+    finally:
+        store.close()
+
+
+def test_batches_survive_reopen(tmp_path):
+    store = make_store(tmp_path, flush_interval=60)
+    store.record_received([received('+420111', 'Kept', '2025-01-19 08:00:00')])
+    store.close()  # Pending rows are written on stop
+    with sqlite3.connect(str(tmp_path / 'messages.db')) as connection:
+        assert connection.execute("SELECT text FROM messages").fetchall() == [('Kept',)]
+
+
+def test_normalize_date():
+    assert normalize_date(' 2025-01-19T08:00 ') == '2025-01-19 08:00'
+    assert normalize_date('') is None
+
+
+def test_history_endpoint_requires_auth(client):
+    assert client.get('/sms/history').status_code == 401
+    response = client.get('/sms/history', headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert response.get_json() == []
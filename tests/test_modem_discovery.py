@@ -0,0 +1,94 @@
+import os
+import pty
+import threading
+
+import pytest
+
+import modem_discovery
+from modem_discovery import candidate_ports, discover_modem, is_modem_usb_id, save_cached_port
+
+
+def _usb_tty(root, name, vendor, product):
+    """Fake /dev/<name> with sysfs usb device dir holding idVendor/idProduct"""
+    interface = root / 'devices' / f'usb-{name}' / '1-1:1.0' / name
+    interface.mkdir(parents=True)
+    (interface.parent.parent / 'idVendor').write_text(vendor + '\n')
+    (interface.parent.parent / 'idProduct').write_text(product + '\n')
+    tty_dir = root / 'sys' / name
+    tty_dir.mkdir(parents=True)
+    os.symlink(interface, tty_dir / 'device')
+    dev = root / 'dev' / name
+    dev.parent.mkdir(exist_ok=True)
+    dev.write_text('')
+    return str(dev)
+
+
+@pytest.fixture
+def fake_ports(tmp_path, monkeypatch):
+    monkeypatch.setattr(modem_discovery, 'SYS_TTY_DIR', str(tmp_path / 'sys'))
+    monkeypatch.setattr(modem_discovery, 'CANDIDATE_PATTERNS',
+                        (str(tmp_path / 'dev' / 'ttyUSB*'), str(tmp_path / 'dev' / 'ttyACM*')))
+    return tmp_path
+
+
+def test_only_known_modem_ids_are_candidates(fake_ports):
+    huawei = _usb_tty(fake_ports, 'ttyUSB2', '12d1', '1001')
+    _usb_tty(fake_ports, 'ttyUSB0', '10c4', 'ea60')  # CP210x Zigbee coordinator
+    _usb_tty(fake_ports, 'ttyACM0', '1cf1', '0030')  # ConBee
+    quectel = _usb_tty(fake_ports, 'ttyUSB10', '05c6', '9215')
+    _usb_tty(fake_ports, 'ttyUSB3', '05c6', '0000')
+    assert candidate_ports() == [huawei, quectel]
+
+
+def test_modem_usb_ids():
+    assert is_modem_usb_id('2c7c', '0125')
+    assert not is_modem_usb_id('1a86', '7523')  # CH340
+    assert not is_modem_usb_id(None, None)
+
+
+class FakeModem:
+    """Answers AT commands on a pty like a GSM modem"""
+
+    REPLIES = {"AT+CGSN": "123456789012345", "AT+CGMI": "huawei", "AT+CGMM": "E1750", "AT+CPMS?": "+CPMS: 0,50"}
+
+    def __init__(self):
+        # The slave end stays open, reading the master fails with EIO while no one has it open
+        self.master, self.slave = pty.openpty()
+        self.path = os.ttyname(self.slave)
+        self.commands = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        buffer = b""
+        while True:
+            try:
+                data = os.read(self.master, 256)
+            except OSError:
+                return
+            buffer += data
+            while b"\r" in buffer:
+                line, buffer = buffer.split(b"\r", 1)
+                command = line.decode().strip()
+                if not command:
+                    continue
+                self.commands.append(command)
+                reply = self.REPLIES.get(command)
+                os.write(self.master, ((reply + "\r\n") if reply else "").encode() + b"OK\r\n")
+
+
+def test_discover_probes_listed_ports_only(tmp_path):
+    modem = FakeModem()
+    found = discover_modem([modem.path], cache_path=str(tmp_path / 'port.json'), timeout=1)
+    assert found["port"] == modem.path
+    assert found["imei"] == "123456789012345"
+    assert found["sms"] is True
+
+
+def test_cached_port_outside_candidates_is_not_probed(tmp_path):
+    cached = FakeModem()
+    listed = FakeModem()
+    cache_path = str(tmp_path / 'port.json')
+    save_cached_port({"port": cached.path, "imei": "123456789012345"}, cache_path)
+    found = discover_modem([listed.path], cache_path=cache_path, timeout=1)
+    assert found["port"] == listed.path
+    assert not cached.commands
@@ -0,0 +1,44 @@
+import json
+import time
+from types import SimpleNamespace
+
+import fake_gammu
+from mqtt_publisher import MQTTPublisher
+
+PREFIX = 'homeassistant/sensor/sms_gateway'
+
+
+def _message(topic, payload):
+    return SimpleNamespace(topic=f"{PREFIX}/{topic}", payload=payload.encode())
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_send_command_does_not_block_the_network_thread():
+    publisher = MQTTPublisher({})
+    payload = json.dumps({'number': '+420600000001', 'text': 'Hello'})
+    started = time.monotonic()
+    # Modem isn't ready yet, the command waits for it on the command thread
+    publisher._queue_message(None, None, _message('send', payload))
+    assert time.monotonic() - started < 1
+    machine = fake_gammu.StateMachine(latency_scale=0.0)
+    publisher.set_gammu_machine(machine)
+    _wait_for(lambda: len(machine.sent) == 1)
+    assert machine.sent[0]["Number"] == '+420600000001'
+
+
+def test_messages_are_handled_in_arrival_order():
+    publisher = MQTTPublisher({})
+    machine = fake_gammu.StateMachine(latency_scale=0.0)
+    publisher.set_gammu_machine(machine)
+    publisher._queue_message(None, None, _message('phone_number/set', '+420600000002'))
+    publisher._queue_message(None, None, _message('message_text/set', 'From the button'))
+    publisher._queue_message(None, None, _message('send_button', 'PRESS'))
+    publisher._queue_message(None, None, _message('phone_number/set', '+420600000003'))
+    _wait_for(lambda: len(machine.sent) == 1)
+    assert machine.sent[0]["Number"] == '+420600000002'
@@ -0,0 +1,54 @@
+import fake_gammu
+from reassembly import ReassemblyBuffer, merge_fragments, multipart_key
+from support import retrieveAllSms
+
+
+def _fragment(reference, received, text, location, number='+420600000001', parts=3):
+    return {"Number": number, "Text": text, "Locations": [location],
+            "Multipart": {"Reference": reference, "Parts": parts, "Received": received}}
+
+
+def test_complete_sms_pass_through_and_fragments_are_held():
+    buffer = ReassemblyBuffer(timeout=60)
+    complete = {"Number": "+420600000002", "Text": "Hi", "Locations": [9]}
+    assert buffer.ready([complete, _fragment(7, [1], "Part one ", 1)], now=0) == [complete]
+    assert buffer.pending_count() == 1
+
+
+def test_fragments_are_released_as_partial_after_the_timeout():
+    buffer = ReassemblyBuffer(timeout=60)
+    fragments = [_fragment(7, [3], "three", 3), _fragment(7, [1], "one ", 1)]
+    assert buffer.ready(fragments, now=0) == []
+    assert buffer.ready(fragments, now=59) == []
+    released = buffer.ready(fragments, now=60)
+    assert released == [{"Number": "+420600000001", "Text": "one three", "Locations": [1, 3],
+                         "Partial": True, "MissingParts": [2]}]
+
+
+def test_oldest_fragments_are_released_when_too_many_wait():
+    buffer = ReassemblyBuffer(timeout=600, max_pending=1)
+    buffer.ready([_fragment(1, [1], "old", 1)], now=0)
+    released = buffer.ready([_fragment(1, [1], "old", 1), _fragment(2, [1], "new", 2)], now=1)
+    assert [sms["Text"] for sms in released] == ["old"]
+
+
+def test_wait_ends_when_the_message_is_complete():
+    buffer = ReassemblyBuffer(timeout=60)
+    buffer.ready([_fragment(7, [1], "one", 1)], now=0)
+    buffer.ready([], now=10)
+    assert buffer.pending_count() == 0
+
+
+def test_key_and_merge():
+    assert multipart_key({"Number": "+1", "Text": "x"}) is None
+    assert multipart_key(_fragment(7, [1], "x", 1)) == ("+420600000001", 7, 3)
+    assert merge_fragments([_fragment(7, [2], "b", 2), _fragment(7, [1], "a", 1)])["Text"] == "ab"
+
+
+def test_incomplete_sms_read_from_the_sim_are_marked():
+    machine = fake_gammu.StateMachine(latency_scale=0.0)
+    machine.deliver('+420600000001', 'a' * 30, parts=3, reference=5)
+    del machine.inbox[1]  # Second part hasn't arrived yet
+    sms, = retrieveAllSms(machine)
+    assert sms["Multipart"] == {"Reference": 5, "Parts": 3, "Received": [1, 3]}
+    assert sms["Locations"] == [1, 3]
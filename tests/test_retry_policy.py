@@ -0,0 +1,87 @@
+import pytest
+
+import fake_gammu
+from mqtt_publisher import DeviceConnectivityTracker
+from retry_policy import (RetryPolicy, RetryingSender, SmsSendError, classify_gammu_error,
+                          ERROR_CLASS_TRANSIENT, ERROR_CLASS_PERMANENT)
+
+
+class FlakyPart:
+    """send_part raising the given errors in turn, then returning references"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, message):
+        self.calls += 1
+        if self.errors:
+            raise fake_gammu.make_error(self.errors.pop(0))
+        return self.calls
+
+
+def _sender(max_attempts=3):
+    tracker = DeviceConnectivityTracker()
+    sleeps = []
+    sender = RetryingSender(RetryPolicy(max_attempts=max_attempts, base_delay=1, max_delay=4), tracker,
+                            sleep=sleeps.append)
+    return sender, tracker, sleeps
+
+
+def test_classification():
+    assert classify_gammu_error(fake_gammu.make_error("ERR_TIMEOUT")) == ERROR_CLASS_TRANSIENT
+    assert classify_gammu_error(fake_gammu.make_error("ERR_GETTING_SMSC")) == ERROR_CLASS_PERMANENT
+    assert classify_gammu_error(TimeoutError()) == ERROR_CLASS_TRANSIENT
+    assert classify_gammu_error(ValueError()) == ERROR_CLASS_PERMANENT
+
+
+def test_backoff_is_capped():
+    policy = RetryPolicy(base_delay=2, max_delay=5)
+    assert all(0 <= policy.backoff(attempt) <= 5 for attempt in range(1, 10))
+
+
+def test_transient_error_is_retried_until_sent():
+    sender, tracker, sleeps = _sender()
+    send_part = FlakyPart("ERR_TIMEOUT", "ERR_DEVICEBUSY")
+    assert sender.send_parts([{}], send_part) == [3]
+    assert len(sleeps) == 2
+    status = tracker.get_status_data()
+    assert status["send_retries"] == 2
+    assert status["send_retries_by_outcome"] == {"sent": 2, "transient": 0, "permanent": 0}
+
+
+def test_permanent_error_fails_fast():
+    sender, tracker, sleeps = _sender()
+    with pytest.raises(SmsSendError) as error:
+        sender.send_parts([{}], FlakyPart("ERR_GETTING_SMSC"))
+    assert error.value.error_class == ERROR_CLASS_PERMANENT
+    assert error.value.attempts == 1
+    assert not sleeps
+    assert tracker.get_status_data()["send_failures"]["permanent"] == 1
+
+
+def test_retries_end_with_the_class_of_the_last_error():
+    sender, tracker, _ = _sender(max_attempts=3)
+    with pytest.raises(SmsSendError):
+        sender.send_parts([{}], FlakyPart("ERR_TIMEOUT", "ERR_TIMEOUT", "ERR_TIMEOUT"))
+    sender.send_parts([{}], FlakyPart())
+    with pytest.raises(SmsSendError):
+        sender.send_parts([{}], FlakyPart("ERR_TIMEOUT", "ERR_NOSIM"))
+    assert tracker.get_status_data()["send_retries_by_outcome"] == {"sent": 0, "transient": 2, "permanent": 1}
+
+
+def test_sent_parts_are_not_resent():
+    sender, _, _ = _sender(max_attempts=1)
+    calls = []
+
+    def send_part(message):
+        calls.append(message["part"])
+        if message["part"] == 2:
+            raise fake_gammu.make_error("ERR_TIMEOUT")
+        return message["part"]
+
+    with pytest.raises(SmsSendError) as error:
+        sender.send_parts([{"part": 1}, {"part": 2}, {"part": 3}], send_part)
+    assert calls == [1, 2]
+    assert error.value.sent_references == [1]
+    assert error.value.failed_part == 2
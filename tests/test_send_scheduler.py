@@ -0,0 +1,130 @@
+import json
+import math
+import random
+import threading
+import time
+
+import pytest
+
+from conftest import AUTH_HEADERS
+from send_scheduler import SendScheduler, TimerWheel, parse_send_at, parse_window, spread, STATE_SENDING
+
+
+def test_scheduled_list_requires_auth(client):
+    assert client.get('/sms/scheduled').status_code == 401
+
+
+def test_scheduled_list_with_auth(client):
+    response = client.get('/sms/scheduled', headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert isinstance(response.get_json(), list)
+
+
+def test_parse_send_at_accepts_timestamps_and_iso():
+    assert parse_send_at(None) is None
+    assert parse_send_at('') is None
+    assert parse_send_at(1700000000) == 1700000000.0
+    assert parse_send_at('1700000000.5') == 1700000000.5
+    assert parse_send_at('2023-11-14T22:13:20Z') == 1700000000.0
+
+
+@pytest.mark.parametrize('value', [math.inf, math.nan, '1e400', 'nan', 'tomorrow'])
+def test_parse_send_at_rejects_unusable_values(value):
+    with pytest.raises(ValueError):
+        parse_send_at(value)
+
+
+def test_parse_window_bounds():
+    assert parse_window(None) == 0
+    assert parse_window('90') == 90
+    for value in ('-1', 'soon', 8 * 86400):
+        with pytest.raises(ValueError):
+            parse_window(value)
+
+
+def test_spread_over_window():
+    assert spread(100, 0, 3) == [100, 100, 100]
+    assert spread(100, 60, 3) == [100, 120, 140]
+    single = spread(100, 60, 1, rng=random.Random(1))[0]
+    assert 100 <= single <= 160
+
+
+def test_timer_wheel_fires_in_due_order():
+    wheel = TimerWheel(tick=1.0, slots=8, now=1000)
+    wheel.add('late', 1005)
+    wheel.add('early', 1002)
+    wheel.add('far', 1020)  # Shares a slot with 1004 two rotations ahead
+    assert wheel.next_due() == 1002
+    assert wheel.pop_due(1001) == []
+    assert wheel.pop_due(1006) == ['early', 'late']
+    assert len(wheel) == 1
+    assert wheel.pop_due(1012) == []
+    assert wheel.pop_due(1020) == ['far']
+    assert len(wheel) == 0 and wheel.next_due() is None
+
+
+def test_timer_wheel_remove_and_catch_up():
+    wheel = TimerWheel(tick=1.0, slots=8, now=1000)
+    wheel.add('gone', 1003)
+    wheel.add('kept', 1004)
+    assert wheel.remove('gone')
+    assert not wheel.remove('gone')
+    # More than a rotation behind: every slot is checked
+    assert wheel.pop_due(1100) == ['kept']
+
+
+def test_past_due_time_fires_on_next_tick():
+    wheel = TimerWheel(tick=1.0, slots=8, now=1000)
+    wheel.add('overdue', 900)
+    assert wheel.pop_due(1001) == ['overdue']
+
+
+def test_schedule_persists_and_cancels(tmp_path):
+    path = tmp_path / 'scheduled.json'
+    scheduler = SendScheduler(lambda job: None, path=str(path))
+    jobs = scheduler.schedule(['+420111', '+420222'], 'Hi', send_at=4000000000, window=60, unicode=True)
+    assert [job['due_at'] for job in jobs] == [4000000000, 4000000030]
+    assert jobs[0]['unicode'] is True
+    saved = json.loads(path.read_text(encoding='utf-8'))['jobs']
+    assert {job['id'] for job in saved} == {job['id'] for job in jobs}
+    assert scheduler.cancel(jobs[0]['id'])
+    assert not scheduler.cancel(jobs[0]['id'])
+    assert [job['id'] for job in scheduler.jobs()] == [jobs[1]['id']]
+    restored = SendScheduler(lambda job: None, path=str(path))
+    assert [job['id'] for job in restored.jobs()] == [jobs[1]['id']]
+
+
+def test_interrupted_send_is_dropped_on_load(tmp_path):
+    path = tmp_path / 'scheduled.json'
+    job = {"id": "a1", "number": "+420111", "text": "Hi", "due_at": 1.0, "state": STATE_SENDING}
+    path.write_text(json.dumps({"jobs": [job]}), encoding='utf-8')
+    assert len(SendScheduler(lambda job: None, path=str(path))) == 0
+
+
+def test_schedule_limit():
+    scheduler = SendScheduler(lambda job: None, path=None, max_jobs=2)
+    with pytest.raises(OverflowError):
+        scheduler.schedule(['1', '2', '3'], 'Hi', send_at=4000000000)
+    assert len(scheduler) == 0
+
+
+def test_worker_sends_due_jobs_in_order():
+    sent = []
+    done = threading.Event()
+
+    def send_job(job):
+        sent.append(job['number'])
+        if len(sent) == 2:
+            done.set()
+
+    scheduler = SendScheduler(send_job, path=None, min_interval=0)
+    now = time.time()
+    scheduler.schedule(['+420222'], 'Second', send_at=now + 1.5)
+    scheduler.schedule(['+420111'], 'First', send_at=now)
+    scheduler.start()
+    try:
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert sent == ['+420111', '+420222']
+    assert len(scheduler) == 0
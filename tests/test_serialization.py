@@ -0,0 +1,37 @@
+import json
+
+import pytest
+from flask_restx import Model, fields, marshal
+
+from serialization import Projection, dumps, dumps_bytes
+
+MODEL = Model('Test SMS', {
+    'Date': fields.String(),
+    'Number': fields.String(attribute='Sender'),
+    'Location': fields.Integer(),
+    'Signal': fields.Float(),
+    'Read': fields.Boolean(default=False),
+    'Extra': fields.Raw(),
+    'State': fields.String(default='UnRead'),
+})
+
+
+def test_dumps_keeps_unicode_and_is_compact():
+    assert dumps({"Text": "Příliš žluťoučký"}) == '{"Text":"Příliš žluťoučký"}'
+    assert dumps_bytes({"a": [1, 2]}) == b'{"a":[1,2]}'
+
+
+@pytest.mark.parametrize("record", [
+    {"Date": "2025-01-01 08:00:00", "Sender": "+420600000001", "Location": "3", "Signal": 7, "Read": 1,
+     "Extra": {"x": [1]}, "State": "Read", "Ignored": True},
+    {},
+    {"Sender": None, "Location": None, "Read": None},
+])
+def test_projection_matches_marshal(record):
+    assert Projection(MODEL)(record) == json.loads(json.dumps(marshal(record, MODEL)))
+
+
+def test_projection_rejects_nested_models():
+    nested = Model('Nested', {'Parts': fields.List(fields.Integer)})
+    with pytest.raises(ValueError):
+        Projection(nested)
@@ -0,0 +1,114 @@
+import pytest
+
+from signal_history import SignalHistory, parse_time, RESOLUTION_HOUR, RESOLUTION_MINUTE, RESOLUTION_RAW
+
+NETWORK = {"NetworkCode": "230 01", "LAC": "1A2B", "CID": "00C0FFEE"}
+
+
+def signal(dbm, percent=50, ber=0):
+    return {"SignalStrength": dbm, "SignalPercent": percent, "BitErrorRate": ber}
+
+
+def filled(path=None):
+    history = SignalHistory(path=path)
+    history.on_event("network", NETWORK)
+    for index, dbm in enumerate((-70, -80, -90)):
+        history._signal = signal(dbm, percent=60 - 10 * index)
+        history.record(now=1_000_020 + index * 10)  # 1000020 is 20s into a minute bucket
+    return history
+
+
+def test_parse_time():
+    assert parse_time(None) is None
+    assert parse_time('1700000000') == 1700000000.0
+    assert parse_time('2023-11-14T22:13:20Z') == 1700000000.0
+    with pytest.raises(ValueError):
+        parse_time('yesterday')
+
+
+def test_raw_samples_keep_cell():
+    resolution, samples = filled().query(resolution=RESOLUTION_RAW)
+    assert resolution == RESOLUTION_RAW
+    assert [sample["signal_dbm"] for sample in samples] == [-70, -80, -90]
+    assert samples[0]["network_code"] == "230 01"
+    assert (samples[0]["lac"], samples[0]["cid"]) == ("1A2B", "C0FFEE")
+
+
+def test_minute_bucket_averages():
+    _, samples = filled().query(resolution=RESOLUTION_MINUTE)
+    assert len(samples) == 1
+    assert samples[0]["timestamp"] == 1_000_020 - 1_000_020 % 60
+    assert samples[0]["signal_dbm"] == -80
+    assert samples[0]["signal_dbm_min"] == -90
+    assert samples[0]["signal_percent"] == 50
+    assert samples[0]["samples"] == 3
+
+
+def test_range_and_limit():
+    history = filled()
+    _, samples = history.query(since=1_000_025, until=1_000_035, resolution=RESOLUTION_RAW)
+    assert [sample["timestamp"] for sample in samples] == [1_000_030]
+    _, samples = history.query(resolution=RESOLUTION_RAW, limit=2)
+    assert [sample["signal_dbm"] for sample in samples] == [-80, -90]
+
+
+def test_cell_change_records_sample():
+    history = filled()
+    history.on_event("network", dict(NETWORK, CID="BEEF"))
+    _, samples = history.query(resolution=RESOLUTION_RAW)
+    assert len(samples) == 4
+    assert samples[-1]["cid"] == "BEEF"
+
+
+def test_missing_values_are_none():
+    history = SignalHistory(path=None)
+    history.record(now=1_000_000)
+    sample = history.query(resolution=RESOLUTION_RAW)[1][0]
+    assert sample["signal_dbm"] is None and sample["lac"] is None and sample["network_code"] is None
+
+
+def test_ring_overwrites_oldest():
+    history = SignalHistory(path=None)
+    ring = history._tiers[RESOLUTION_RAW]
+    for index in range(ring.capacity + 5):
+        history.record(now=float(index))
+    assert len(ring) == ring.capacity
+    assert ring[0] == 5.0
+
+
+def test_auto_resolution():
+    history = filled()
+    assert history.pick_resolution(None) == RESOLUTION_RAW
+    empty = SignalHistory(path=None)
+    assert empty.pick_resolution(0) == RESOLUTION_HOUR
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'signal_history.json')
+    history = filled(path)
+    history.save()
+    restored = SignalHistory(path=path)
+    for resolution in (RESOLUTION_RAW, RESOLUTION_MINUTE):
+        assert restored.query(resolution=resolution) == history.query(resolution=resolution)
+
+
+def test_corrupt_file_starts_empty(tmp_path):
+    path = tmp_path / 'signal_history.json'
+    path.write_text('{"tiers": {"raw": {"time": "not base64!"}}}', encoding='utf-8')
+    history = SignalHistory(path=str(path))
+    assert history.query(resolution=RESOLUTION_RAW)[1] == []
+
+
+def test_history_endpoint(client, gateway, monkeypatch):
+    monkeypatch.setattr(gateway, 'signal_history', filled())
+    assert client.get('/status/history?since=yesterday').status_code == 400
+    response = client.get('/status/history?resolution=raw&since=1000025')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["resolution"] == RESOLUTION_RAW
+    assert [sample["signal_dbm"] for sample in body["samples"]] == [-80, -90]
+
+
+def test_history_endpoint_disabled(client, gateway, monkeypatch):
+    monkeypatch.setattr(gateway, 'signal_history', None)
+    assert client.get('/status/history').status_code == 404
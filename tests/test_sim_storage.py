@@ -0,0 +1,85 @@
+import pytest
+
+import fake_gammu
+from message_store import MessageStore
+from mqtt_publisher import MQTTPublisher
+from sim_storage import (StorageWatermarks, storage_occupancy, LEVEL_OK, LEVEL_HIGH, LEVEL_ALERT, LEVEL_FULL)
+
+
+def occupancy(sim_used, sim_size=50, phone_used=0, phone_size=0):
+    return storage_occupancy({"SIMUsed": sim_used, "SIMSize": sim_size, "PhoneUsed": phone_used, "PhoneSize": phone_size})
+
+
+def test_storage_occupancy():
+    assert occupancy(20) == {"SIMUsed": 20, "SIMSize": 50, "SIMPercent": 40,
+                             "PhoneUsed": 0, "PhoneSize": 0, "PhonePercent": None}
+
+
+def test_watermarks_validation():
+    with pytest.raises(ValueError):
+        StorageWatermarks(high=50, low=50)
+    with pytest.raises(ValueError):
+        StorageWatermarks(high=101, low=10)
+
+
+@pytest.mark.parametrize('used, level', [(39, LEVEL_OK), (40, LEVEL_HIGH), (45, LEVEL_ALERT), (50, LEVEL_FULL)])
+def test_level(used, level):
+    assert StorageWatermarks(high=80, low=50, alert=90).level(occupancy(used)) == level
+
+
+def test_level_is_worst_memory():
+    watermarks = StorageWatermarks(high=80, low=50, alert=90)
+    assert watermarks.level(occupancy(10, phone_used=100, phone_size=100)) == LEVEL_FULL
+
+
+def test_excess_down_to_low_watermark():
+    watermarks = StorageWatermarks(high=80, low=50)
+    assert watermarks.excess(occupancy(39)) == 0
+    assert watermarks.excess(occupancy(40)) == 15
+    assert watermarks.excess(occupancy(40, phone_used=90, phone_size=100)) == 40
+
+
+def test_select_offload_oldest_read_first():
+    watermarks = StorageWatermarks(high=80, low=50)
+    all_sms = [
+        {"State": "Read", "Date": "2025-01-03", "Locations": [5]},
+        {"State": "UnRead", "Date": "2025-01-01", "Locations": [1]},
+        {"State": "Read", "Date": "2025-01-02", "Locations": [2, 3, 4]},
+        {"State": "Read", "Date": "2025-01-01", "Locations": [6], "Multipart": {"missing": [2]}},
+        {"State": "Read", "Date": "2025-01-01", "Locations": [7], "Type": "Status_Report"},
+    ]
+    # 10 of 12 used: 4 locations to free, the long SMS frees 3
+    selected = watermarks.select_offload(all_sms, occupancy(10, sim_size=12))
+    assert [sms["Date"] for sms in selected] == ["2025-01-02", "2025-01-03"]
+    assert watermarks.select_offload(all_sms, occupancy(1, sim_size=12)) == []
+
+
+def test_check_sim_storage_archives_before_deleting(tmp_path):
+    machine = fake_gammu.StateMachine(latency_scale=0.0, sim_size=10)
+    machine.populate_inbox(9)
+    machine.deliver('+420999', 'Not read yet')
+    store = MessageStore(path=str(tmp_path / 'messages.db'))
+    store.start()
+    publisher = MQTTPublisher({})
+    publisher.set_message_store(store)
+    publisher.set_storage_watermarks(StorageWatermarks(high=80, low=50, alert=90))
+    try:
+        result = publisher.check_sim_storage(machine)
+        assert result["offloaded"] == 5
+        assert result["SIMUsed"] == 5
+        assert result["level"] == LEVEL_OK
+        assert len(store.history(direction='in')) == 5
+        assert any(sms["Text"] == 'Not read yet' for sms in machine.inbox)
+    finally:
+        store.close()
+
+
+def test_nothing_deleted_without_message_history():
+    machine = fake_gammu.StateMachine(latency_scale=0.0, sim_size=10)
+    machine.populate_inbox(10)
+    publisher = MQTTPublisher({})
+    publisher.set_storage_watermarks(StorageWatermarks())
+    result = publisher.check_sim_storage(machine)
+    assert result["offloaded"] == 0
+    assert result["level"] == LEVEL_FULL
+    assert len(machine.inbox) == 10
@@ -0,0 +1,92 @@
+import pytest
+
+from sms_routing import (SmsRouter, RuleMatcher, PrefixTrie, compile_rules, normalize_sender,
+                         ACTION_MQTT, ACTION_REPLY)
+
+
+def _rules(*entries):
+    return compile_rules({"rules": list(entries)})
+
+
+def _names(matcher, number, text):
+    return [rule.name for rule in matcher.match(number, text)]
+
+
+def test_normalize_sender():
+    assert normalize_sender('+420 600-000 (001)') == '+420600000001'
+    assert normalize_sender('MyBank') == 'mybank'
+
+
+def test_prefix_trie_returns_all_prefixes():
+    trie = PrefixTrie()
+    trie.add('+420', 'cz')
+    trie.add('+4206', 'cz-mobile')
+    trie.add('+421', 'sk')
+    assert trie.matches('+420600000001') == ['cz', 'cz-mobile']
+
+
+def test_rules_match_by_sender_and_text_in_file_order():
+    matcher = RuleMatcher(_rules(
+        {"name": "bank", "from": "MyBank", "action": "mqtt", "topic": "bank", "continue": True},
+        {"name": "otp", "text": r"code \d{6}", "action": "mqtt", "topic": "otp"},
+        {"name": "czech", "from": "+420*", "action": "drop"},
+    ))
+    assert _names(matcher, 'MyBank', 'Your code 123456') == ['bank', 'otp']
+    assert _names(matcher, '+420600000001', 'CODE 654321') == ['otp']
+    assert _names(matcher, '+420 600 000 001', 'hello') == ['czech']
+    assert _names(matcher, '+421600000001', 'hello') == []
+
+
+def test_text_rules_with_backreferences():
+    matcher = RuleMatcher(_rules(
+        {"name": "repeat", "text": r"(\w+) \1", "action": "drop"},
+        {"name": "hello", "text": "hello", "ignore_case": False, "action": "drop"},
+    ))
+    assert _names(matcher, '+420600000001', 'bye bye') == ['repeat']
+    assert _names(matcher, '+420600000001', 'HELLO') == []
+
+
+@pytest.mark.parametrize("entry, message", [
+    ({"from": "+420*", "action": "forward"}, "action must be one of"),
+    ({"action": "drop"}, "needs 'from' and/or 'text'"),
+    ({"from": "+420*", "action": "mqtt"}, "needs 'topic'"),
+    ({"from": "+420*", "action": "mqtt", "topic": "a b"}, "may only contain"),
+    ({"text": "(", "action": "drop"}, "invalid text regex"),
+    ({"from": "+420*", "action": "reply", "reply": "Hi", "reply_cooldown": [60]}, "reply_cooldown"),
+    ({"from": "+420*", "action": "reply", "reply": "Hi", "reply_cooldown": {"s": 60}}, "reply_cooldown"),
+    ({"from": "+420*", "action": "reply", "reply": "Hi", "reply_cooldown": "soon"}, "reply_cooldown"),
+    ({"from": "+420*", "action": "reply", "reply": "Hi", "reply_cooldown": -1}, "reply_cooldown"),
+    ({"from": "+420*", "action": "reply", "reply": "Hi", "reply_cooldown": True}, "reply_cooldown"),
+])
+def test_invalid_rules_name_the_rule(entry, message):
+    with pytest.raises(ValueError, match=f"Rule 'x': .*{message}"):
+        _rules(dict(entry, name="x"))
+
+
+def test_rules_file_must_be_a_mapping():
+    with pytest.raises(ValueError):
+        compile_rules(["rules"])
+    assert compile_rules(None) == []
+
+
+def test_reply_cooldown_per_sender(tmp_path):
+    rules_file = tmp_path / 'routing.yaml'
+    rules_file.write_text("rules:\n  - {name: auto, from: '+420*', action: reply, reply: Hi, reply_cooldown: 60}\n")
+    router = SmsRouter(path=str(rules_file), queue_dir=None)
+    rule = router.route({"Number": "+420600000001", "Text": "hello"})[0]
+    assert rule.action == ACTION_REPLY and rule.reply_cooldown == 60
+    assert router.reply_allowed(rule, '+420600000001')
+    assert not router.reply_allowed(rule, '+420 600 000 001')
+    assert router.reply_allowed(rule, '+420600000002')
+    assert not router.reply_allowed(rule, 'MyBank')
+    assert router.rules()[0]["hits"] == 1
+
+
+def test_broken_rules_file_keeps_previous_rules(tmp_path):
+    rules_file = tmp_path / 'routing.yaml'
+    rules_file.write_text("rules:\n  - {name: bank, from: MyBank, action: mqtt, topic: bank}\n")
+    router = SmsRouter(path=str(rules_file), queue_dir=None)
+    rules_file.write_text("rules:\n  - {name: bank, from: MyBank, action: reply, reply: Hi, reply_cooldown: [1]}\n")
+    assert router.reload() == 1
+    assert "reply_cooldown" in router.error
+    assert router.matcher.rules[0].action == ACTION_MQTT
@@ -0,0 +1,16 @@
+from conftest import AUTH_HEADERS
+
+
+def test_send_requires_auth(client, machine):
+    response = client.post('/sms', json={'number': '+420600000001', 'text': 'Hello'})
+    assert response.status_code == 401
+    assert not machine.sent
+
+
+def test_send_with_auth(client, machine):
+    response = client.post('/sms', headers=AUTH_HEADERS, json={'number': '+420600000001', 'text': 'Hello'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["status"] == 200
+    # skip_none keeps fields of other outcomes out of the response
+    assert "delivery_ids" not in body
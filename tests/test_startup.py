@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from startup import StartupTimer
+
+
+def test_phases_are_reported_in_start_order():
+    timer = StartupTimer(process_started=time.time())
+    timer.begin("mqtt_connect")
+    with timer.phase("modem_init"):
+        pass
+    with pytest.raises(RuntimeError):
+        with timer.phase("modem_discovery"):
+            raise RuntimeError("no modem")
+    phases = timer.snapshot()
+    assert [phase["phase"] for phase in phases] == ["mqtt_connect", "modem_init", "modem_discovery"]
+    assert phases[0]["status"] == "running" and phases[0]["duration_ms"] is None
+    assert phases[1]["status"] == "ok" and phases[1]["duration_ms"] >= 0
+    assert phases[2]["status"] == "failed"
+
+
+def test_modem_reads_answer_503_until_the_modem_is_ready(client, gateway, monkeypatch):
+    monkeypatch.setattr(gateway, 'machine', None)
+    response = client.get('/status/signal')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+def test_modem_reads_work_once_ready(client, machine):
+    assert client.get('/status/signal').status_code == 200
@@ -0,0 +1,98 @@
+import time
+import random
+import threading
+
+import pytest
+
+from task_scheduler import ModemTaskScheduler
+
+
+def noop(machine):
+    pass
+
+
+@pytest.fixture
+def scheduler():
+    """Scheduler driven by hand: _next_session is called without the worker thread"""
+    task_scheduler = ModemTaskScheduler(lambda timeout: 'machine', jitter=0.0, merge_window=2.0)
+    task_scheduler._running = True
+    return task_scheduler
+
+
+def names(session):
+    return [task.name for task in session]
+
+
+def test_tasks_due_together_share_a_session(scheduler):
+    scheduler.add('signal', noop, 60)
+    scheduler.add('network', noop, 60, delay=0.5)
+    scheduler.add('storage', noop, 60, delay=30)
+    assert names(scheduler._next_session()) == ['signal', 'network']
+    assert [due for due, _, _, _ in scheduler._heap] == [scheduler._tasks['storage'].due]
+
+
+def test_replaced_and_paused_tasks_are_skipped(scheduler):
+    scheduler.add('inbox', noop, 60, delay=30)
+    scheduler.add('inbox', noop, 60)  # Replaces the first registration
+    scheduler.add('signal', noop, 60)
+    scheduler.set_enabled('signal', False)
+    assert names(scheduler._next_session()) == ['inbox']
+    scheduler.set_enabled('signal', True)
+    assert names(scheduler._next_session()) == ['signal']
+
+
+def test_shorter_interval_moves_next_run_earlier(scheduler):
+    task = scheduler.add('inbox', noop, 600, delay=600)
+    due = task.due
+    scheduler.set_interval('inbox', 60)
+    assert task.due == pytest.approx(due - 540)
+    scheduler.set_interval('inbox', 120)
+    assert task.due == pytest.approx(due - 540)
+
+
+def test_run_soon(scheduler):
+    scheduler.add('storage', noop, 300, delay=300)
+    scheduler.run_soon('storage')
+    assert names(scheduler._next_session()) == ['storage']
+
+
+def test_jitter_stays_within_bounds():
+    scheduler = ModemTaskScheduler(lambda timeout: None, jitter=0.1, rng=random.Random(1))
+    task = scheduler.add('signal', noop, 100)
+    dues = [scheduler._next_due(task, 0.0) for _ in range(200)]
+    assert all(90 <= due <= 110 for due in dues)
+    assert len(set(dues)) > 1
+
+
+def test_worker_runs_sessions_with_one_machine():
+    machines = []
+    calls = []
+    done = threading.Event()
+
+    def get_machine(timeout):
+        machines.append(timeout)
+        return 'machine'
+
+    def record(name):
+        def run(machine):
+            calls.append((name, machine))
+            if name == 'broken':
+                raise RuntimeError("modem went away")
+            if len(calls) >= 3:
+                done.set()
+        return run
+
+    scheduler = ModemTaskScheduler(get_machine, jitter=0.0)
+    skipped = scheduler.add('skipped', record('skipped'), 60, when=lambda: False)
+    broken = scheduler.add('broken', record('broken'), 60)
+    scheduler.add('heartbeat', record('heartbeat'), 60, needs_modem=False)
+    scheduler.add('signal', record('signal'), 60)
+    scheduler.start()
+    try:
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    assert calls == [('broken', 'machine'), ('heartbeat', 'machine'), ('signal', 'machine')]
+    assert len(machines) == 1
+    assert (broken.failures, broken.runs, skipped.runs) == (1, 0, 0)
+    assert all(task.due > time.monotonic() + 50 for task in scheduler._tasks.values())
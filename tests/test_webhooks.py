@@ -0,0 +1,100 @@
+import json
+import time
+
+import pytest
+
+from retry_policy import RetryPolicy
+from webhook_receiver import WebhookReceiver
+from webhooks import WebhookDispatcher, sign_payload, verify_signature
+
+
+@pytest.fixture
+def receiver():
+    receivers = []
+
+    def start(**kwargs):
+        receivers.append(WebhookReceiver(**kwargs).start())
+        return receivers[-1]
+
+    yield start
+    for item in receivers:
+        item.stop()
+
+
+def _dispatcher(url, **kwargs):
+    kwargs.setdefault('queue_path', None)
+    kwargs.setdefault('batch_interval', 0)
+    kwargs.setdefault('policy', RetryPolicy(max_attempts=5, base_delay=0.01, max_delay=0.05))
+    dispatcher = WebhookDispatcher([url], **kwargs)
+    dispatcher.start()
+    return dispatcher
+
+
+def test_signature():
+    body = b'{"events": []}'
+    now = str(int(time.time()))
+    signature = sign_payload('s3cret', now, body)
+    assert verify_signature('s3cret', now, body, signature)
+    assert not verify_signature('other', now, body, signature)
+    assert not verify_signature('s3cret', str(int(time.time()) - 3600), body, sign_payload('s3cret', '0', body))
+
+
+def test_events_are_signed_and_share_a_connection(receiver):
+    hook = receiver(secret='s3cret')
+    dispatcher = _dispatcher(hook.url, secret='s3cret')
+    try:
+        for index in range(5):
+            dispatcher.emit('sms_received', {"Number": "+420600000001", "Text": f"Hello {index}"})
+        assert hook.wait_for_events(5)
+    finally:
+        dispatcher.stop()
+    assert all(delivery["signature_valid"] for delivery in hook.deliveries)
+    assert hook.connections == 1
+
+
+def test_other_events_are_not_sent(receiver):
+    hook = receiver()
+    dispatcher = _dispatcher(hook.url, events=('send_status',))
+    try:
+        dispatcher.emit('sms_received', {})
+        dispatcher.emit('send_status', {"status": "success"})
+        assert hook.wait_for_events(1)
+    finally:
+        dispatcher.stop()
+    assert [event["type"] for event in hook.events()] == ['send_status']
+
+
+def test_failed_deliveries_are_retried(receiver):
+    hook = receiver(fail_first=2)
+    dispatcher = _dispatcher(hook.url)
+    try:
+        dispatcher.emit('sms_received', {"Text": "Hello"})
+        assert hook.wait_for_events(1)
+    finally:
+        dispatcher.stop()
+    assert dispatcher.stats["retries"] == 2
+    assert dispatcher.stats["delivered"] == 1
+
+
+def test_client_errors_are_not_retried(receiver):
+    hook = receiver(fail_first=1, fail_status=404)
+    dispatcher = _dispatcher(hook.url)
+    try:
+        dispatcher.emit('sms_received', {"Text": "Hello"})
+        deadline = time.monotonic() + 5
+        while dispatcher.stats["failed"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        dispatcher.stop()
+    assert dispatcher.stats == dict(dispatcher.stats, failed=1, retries=0, delivered=0)
+
+
+def test_undelivered_events_survive_restart(tmp_path):
+    queue_path = str(tmp_path / 'queue.json')
+    # Nothing listens on port 9 of localhost
+    dispatcher = WebhookDispatcher(['http://127.0.0.1:9/hook'], queue_path=queue_path)
+    dispatcher.emit('sms_received', {"Text": "Hello"})
+    dispatcher.stop()
+    with open(queue_path, encoding='utf-8') as queue_file:
+        assert json.load(queue_file)["deliveries"][0]["events"][0]["data"] == {"Text": "Hello"}
+    assert WebhookDispatcher(['http://127.0.0.1:9/hook'], queue_path=queue_path).queue_length() == 1